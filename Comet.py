@@ -4,7 +4,25 @@ from datetime import datetime, timezone
 DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
 
 
+def parseDateTime(val: str) -> datetime:
+    """Parse a DATETIME_FORMAT string as UTC.
+
+    fromisoformat reads this format far faster than strptime, which is
+    only used for anything it rejects.
+    """
+    try:
+        parsed = datetime.fromisoformat(val)
+    except ValueError:
+        parsed = datetime.strptime(val, DATETIME_FORMAT)
+
+    return parsed.replace(tzinfo=timezone.utc)
+
+
 class Comet:
+    # No per-instance __dict__, a large catalogue holds a lot of these
+    __slots__ = ('designation', 'permid', 'name', 'discoverer', 'mag2davg', 'mag1davg',
+                 'lastobs', 'lastupdate', 'lastchecked', 'archive', 'lightcurve')
+
     designation: str
     name: str
     permid: str
@@ -13,7 +31,10 @@ class Comet:
     mag1davg: float
     lastobs: datetime
     lastupdate: datetime
+    lastchecked: datetime
     archive: bool
+    # LightCurve.encode() text, decoded only when observations are processed
+    lightcurve: str
 
     def __init__(self, comet: dict):
         self.designation = comet['designation']
@@ -24,7 +45,9 @@ class Comet:
         self.mag1davg = self.getFloat(comet.get('mag1davg', None))
         self.lastobs = self.getDateTime(comet.get('lastobs', None))
         self.lastupdate = self.getDateTime(comet.get('lastupdate', None))
-        self.archive = comet.get('archive', False)
+        self.lastchecked = self.getDateTime(comet.get('lastchecked', None))
+        self.archive = self.getBool(comet.get('archive', False))
+        self.lightcurve = comet.get('lightcurve', None) or ''
 
     def toDict(self) -> dict:
         return {
@@ -34,9 +57,11 @@ class Comet:
             'discoverer': self.discoverer,
             'mag2davg': self.mag2davg,
             'mag1davg': self.mag1davg,
-            'lastobs': self.lastobs.strftime(DATETIME_FORMAT),
-            'lastupdate': self.lastupdate.strftime(DATETIME_FORMAT),
-            'archive': self.archive
+            'lastobs': self.formatDateTime(self.lastobs),
+            'lastupdate': self.formatDateTime(self.lastupdate),
+            'lastchecked': self.formatDateTime(self.lastchecked),
+            'archive': self.archive,
+            'lightcurve': self.lightcurve
         }
 
     def getFriendlyName(self) -> str:
@@ -53,11 +78,22 @@ class Comet:
             return float(val)
         return None
 
-    def getDateTime(self, val) -> float:
+    @staticmethod
+    def getBool(val) -> bool:
+        if isinstance(val, str):
+            return val.strip().lower() in ('true', '1', 'yes')
+        return bool(val)
+
+    def getDateTime(self, val) -> datetime:
+        if isinstance(val, datetime):
+            return val if val.tzinfo else val.replace(tzinfo=timezone.utc)
+        if val:
+            return parseDateTime(val)
+        return None
+
+    def formatDateTime(self, val: datetime) -> str:
         if val:
-            parsed = datetime.strptime(val, DATETIME_FORMAT)
-            if parsed:
-                return parsed.replace(tzinfo=timezone.utc)
+            return val.strftime(DATETIME_FORMAT)
         return None
 
 
@@ -3,16 +3,114 @@
 Comet Discovery Tracker
 Monitors MPC for new comet discoveries and sends Discord notifications
 """
-import requests
 import argparse
+import os
 from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, List
 from dotenv import load_dotenv
 from Comet import Comet
-from CometList import CometList
-from Discord import Discord
+from CometList import OBS_FORMAT, OBS_FORMATS, CometList
+from CometStorage import CometStorage, CsvCometStorage, SqliteCometStorage
+from Metrics import Metrics
+from RefreshScheduler import RefreshScheduler
+from Subscribers import DEFAULT_SUBSCRIBER, SubscriberRegistry
+
+# Each command imports the network and pandas-backed modules it needs when it
+# runs, so --summarize --skipsend and --exportcsv start without them
+if TYPE_CHECKING:
+    from DesignationProbe import DesignationProbe
+    from HttpTransport import HttpTransport
+    from NotificationOutbox import NotificationOutbox
+    from ResolutionCache import ResolutionCache
+    from ResponseCache import ResponseCache
 
 # Configuration
 CSV_FILE = "known_comets.csv"
+COMETS_DB = "comets.db"
+OUTBOX_DB = "outbox.db"
+# Webhooks and what each wants to hear about, without it everything goes to
+# DISCORD_WEBHOOK_URL.  Not checked in, subscribers.example.json shows the layout
+SUBSCRIBERS_FILE = "subscribers.json"
+RESPONSE_CACHE_DIR = ".mpc_cache"
+# What discovery learnt about designations, kept apart from the response
+# cache so its eviction and clear() never count or remove it
+IDENTITY_CACHE_DIR = ".mpc_identities"
+# Response cache TTLs in seconds for each MPC endpoint.  Identifier lookups
+# do not go through the response cache, discovery has to see new names at once
+OBSERVATIONS_CACHE_TTL = 30 * 60
+# Designations MPC did not know are not probed again for this many seconds
+NEGATIVE_DESIGNATIONS_FILE = f"{IDENTITY_CACHE_DIR}/negative_designations.json"
+NEGATIVE_DESIGNATION_TTL = 3 * 60 * 60
+# Identities resolved for designations, comets not yet final are looked up
+# again after the TTL, kept below the default discovery interval so a comet
+# being named or numbered shows up on the next discovery
+RESOLUTIONS_DB = f"{IDENTITY_CACHE_DIR}/resolutions.db"
+RESOLUTION_TTL = 45 * 60
+
+# Comet list events counted in the run metrics
+EVENT_KINDS = ['added', 'updated', 'spectacular', 'nakedeye', 'binoc', 'suddenincrease', 'archived', 'changed']
+# Notifications for the comet list events that are not magnitude changes
+EVENT_NOTIFICATIONS = { 'added': 'discovery', 'updated': 'update' }
+
+def create_transport(metrics: Metrics = None) -> 'HttpTransport':
+    from HttpTransport import HttpTransport
+
+    return HttpTransport(metrics=metrics)
+
+def create_refresh_scheduler(inactiveDays: float) -> RefreshScheduler:
+    return RefreshScheduler(inactivityWindow=timedelta(days=inactiveDays))
+
+def create_response_cache(metrics: Metrics = None) -> 'ResponseCache':
+    from MinorPlanetaryCenter import ObservationsApi
+    from ResponseCache import ResponseCache
+
+    ttls = {
+        ObservationsApi.baseUrl: OBSERVATIONS_CACHE_TTL
+    }
+    return ResponseCache(RESPONSE_CACHE_DIR, ttls=ttls, metrics=metrics)
+
+def create_designation_probe() -> 'DesignationProbe':
+    from DesignationProbe import DesignationProbe, NegativeDesignationCache
+
+    return DesignationProbe(NegativeDesignationCache(NEGATIVE_DESIGNATIONS_FILE, ttl=NEGATIVE_DESIGNATION_TTL))
+
+def create_resolution_cache() -> 'ResolutionCache':
+    from ResolutionCache import ResolutionCache
+
+    os.makedirs(IDENTITY_CACHE_DIR, exist_ok=True)
+    return ResolutionCache(RESOLUTIONS_DB, ttl=RESOLUTION_TTL)
+
+def create_outbox() -> 'NotificationOutbox':
+    from NotificationOutbox import NotificationOutbox
+
+    return NotificationOutbox(OUTBOX_DB)
+
+def create_subscribers(transport: 'HttpTransport' = None) -> SubscriberRegistry:
+    return SubscriberRegistry.load(SUBSCRIBERS_FILE, transport)
+
+def count_events(cometList: CometList, metrics: Metrics):
+    for kind in EVENT_KINDS:
+        metrics.increment('events', len(getattr(cometList, kind)), kind=kind)
+
+def write_metrics(metrics: Metrics, jsonPath: str = None, prometheusPath: str = None):
+    try:
+        if jsonPath:
+            metrics.writeJson(jsonPath)
+        if prometheusPath:
+            metrics.writePrometheus(prometheusPath)
+    except OSError as e:
+        print(f"Error writing metrics: {e}")
+
+def create_storage(kind: str) -> CometStorage:
+    if kind == 'csv':
+        return CsvCometStorage(CSV_FILE)
+
+    storage = SqliteCometStorage(COMETS_DB)
+    if storage.isEmpty():
+        # First run against the database, so carry over the existing CSV
+        storage.importCsv(CSV_FILE)
+
+    return storage
 
 def get_recent_comets() -> CometList:
     recentComets = CometList()
@@ -28,9 +126,7 @@ def load_known_comets() -> CometList:
 
     return knownComets
 
-def send_discord_comet_notification(title: str, description: str, color, comet_data: Comet):
-    discord = Discord()
-    
+def send_discord_comet_notification(title: str, description: str, color, comet_data: Comet, outbox: 'NotificationOutbox', kind: str, value: str = '', subscribers: List[str] = None) -> bool:
     # Create Discord embed
     embed = {
         "title": title,
@@ -55,21 +151,19 @@ def send_discord_comet_notification(title: str, description: str, color, comet_d
             "inline": True
         })
     
-    try:
-        discord.SendEmbed(embed)
-        print(f"Discord notification sent for {comet_data.designation}")
-    except requests.RequestException as e:
-        print(f"Error sending Discord notification: {e}")
+    # Recorded in the outbox for each subscriber and delivered when it is
+    # drained, an event already recorded for a subscriber is not sent again
+    recorded = [name for name in subscribers or [DEFAULT_SUBSCRIBER] if outbox.add(comet_data.designation, kind, value, embed, name)]
 
+    if recorded:
+        print(f"Discord notification queued for {comet_data.designation} to {', '.join(recorded)}")
+        return True
 
-def summarize(send: bool):
-    _ = load_dotenv()
+    print(f"Discord notification for {comet_data.designation} ({kind} {value}) was already recorded")
+    return False
 
-    cometList = CometList()
-    discord = Discord()
-
-    cometList.loadCsv(CSV_FILE)
 
+def build_summary_embed(cometList: CometList) -> dict:
     embed = {
         "title": "Comet summary",
         "description": "Summary of currently tracked comets.",
@@ -78,81 +172,205 @@ def summarize(send: bool):
         "timestamp": datetime.now().isoformat(),
     }
 
-    for comet in cometList.comets:
-        if comet.archive is True:
-            continue
-
+    for comet in cometList.activeComets():
         embed["fields"].append({
             "name": comet.getFriendlyName(),
             "value": f"Last observation: {comet.lastobs} at an average magnitude of {comet.mag1davg}",
             "inline": True
         })
 
+    return embed
+
+def summarize(send: bool, storage: CometStorage, columnar: bool = False):
+    _ = load_dotenv()
+
+    cometList = CometList(columnar=columnar)
+
+    cometList.load(storage)
+
+    embed = build_summary_embed(cometList)
+
     if send:
+        from Discord import Discord
+
+        discord = Discord()
         discord.SendEmbed(embed)
     else:
         print(embed)
 
-def updateAndCheckNotifications():
-    print(f"Checking for new comets at {datetime.now()}")
-    cometList = CometList()
+def notify_event(kind: str, event, outbox: 'NotificationOutbox', subscribers: SubscriberRegistry) -> bool:
+    """Record the notifications for one comet list event, True if a new one was recorded.
 
-    cometList.loadCsv(CSV_FILE)
-    print(f"Loaded {len(cometList.comets)} previously known comets")
+    event is the comet, or the MagnitudeChange of a 'changed' event, and is
+    matched against every subscriber.  Events without a notification, such
+    as 'archived', are ignored.
+    """
+    if kind == 'changed':
+        recorded = [notify_comet(notification, event.comet, outbox, names) for notification, names in subscribers.matchChange(event).items()]
+        return any(recorded)
 
-    cometList.loadRecentComets()
-    print(f"Found {len(cometList.added)} new comets")
-    print(f"Updated {len(cometList.updated)} comets")
-    print(f"Total of {len(cometList.comets)} comets")
+    notification = EVENT_NOTIFICATIONS.get(kind)
+    if notification is None:
+        return False
+
+    return notify_comet(notification, event, outbox, subscribers.match(notification, event))
 
-    for newComet in cometList.added:
-        print(f"New discovery found: {newComet.designation}")
+def notify_comet(kind: str, comet: Comet, outbox: 'NotificationOutbox', subscribers: List[str]) -> bool:
+    if not subscribers:
+        return False
 
-        title = f"🌟 New Comet Discovery: {newComet.getFriendlyName()}"
+    if kind == 'discovery':
+        print(f"New discovery found: {comet.designation}")
+
+        title = f"🌟 New Comet Discovery: {comet.getFriendlyName()}"
         description = "A new comet has been discovered!"
         color = 0x00FF00
-        send_discord_comet_notification(title, description, color, newComet)
-
-    for updatedComet in cometList.added:
-        print(f"Updated comet: {updatedComet.designation} - PermId:{updatedComet.permid}, Name:{updatedComet.name}")
+        return send_discord_comet_notification(title, description, color, comet, outbox, 'discovery', subscribers=subscribers)
+    elif kind == 'update':
+        print(f"Updated comet: {comet.designation} - PermId:{comet.permid}, Name:{comet.name}")
 
-        title = f"🌟 Comet update: {updatedComet.getFriendlyName()}"
+        title = f"🌟 Comet update: {comet.getFriendlyName()}"
         description = "A comet has been named or given a permanent id!"
         color = 0x0000FF
-        send_discord_comet_notification(title,
-                                        description,
-                                        color,
-                                        updatedComet)
-
-    # Update the observation data and check for comets reaching certain
-    # thresholds
-    cometList.updateObservationData()
-
-    for comet in cometList.spectacular:
+        return send_discord_comet_notification(title,
+                                               description,
+                                               color,
+                                               comet,
+                                               outbox,
+                                               'update',
+                                               f"{comet.permid or ''}|{comet.name or ''}",
+                                               subscribers)
+    elif kind == 'spectacular':
         print(f"Spectacular comet found: {comet.designation}, 2 day Mag average: {comet.mag2davg}")
 
         title = f"🌟 Comet magnitude change: {comet.getFriendlyName()}"
         description = f"The comet's magnitude has a 2 day average of {comet.mag2davg} and should be easily visible!"
         color = 0xFFFF00
-        send_discord_comet_notification(title, description, color, comet)
-
-    for comet in cometList.nakedeye:
+        return send_discord_comet_notification(title, description, color, comet, outbox, 'spectacular', f"{comet.mag2davg:.2f}", subscribers)
+    elif kind == 'nakedeye':
         print(f"Naked eye comet found: {comet.designation}, 2 day Mag average: {comet.mag2davg}")
 
         title = f"🌟 Comet magnitude change: {comet.getFriendlyName()}"
         description = f"The comet's magnitude has a 2 day average of {comet.mag2davg} and may be nearly visible with the naked eye!"
         color = 0xFFFF00
-        send_discord_comet_notification(title, description, color, comet)
-
-    for comet in cometList.binoc:
+        return send_discord_comet_notification(title, description, color, comet, outbox, 'nakedeye', f"{comet.mag2davg:.2f}", subscribers)
+    elif kind == 'binoc':
         print(f"Binocular comet found: {comet.designation}, 2 day Mag average: {comet.mag2davg}")
 
         title = f"🌟 Comet magnitude change: {comet.getFriendlyName()}"
         description = f"The comet's magnitude has a 2 day average of {comet.mag2davg} and may be visible with binoculars."
         color = 0xABAB00
-        send_discord_comet_notification(title, description, color, comet)
+        return send_discord_comet_notification(title, description, color, comet, outbox, 'binoc', f"{comet.mag2davg:.2f}", subscribers)
+    elif kind == 'suddenincrease':
+        print(f"Sudden brightening found: {comet.designation}, 2 day Mag average: {comet.mag2davg}")
+
+        title = f"🌟 Comet brightening: {comet.getFriendlyName()}"
+        description = f"The comet has suddenly brightened to a 2 day average magnitude of {comet.mag2davg}."
+        color = 0xFF8800
+        return send_discord_comet_notification(title, description, color, comet, outbox, 'suddenincrease', f"{comet.mag2davg:.2f}", subscribers)
+
+    return False
+
+def notify_discoveries(cometList: CometList, outbox: 'NotificationOutbox', subscribers: SubscriberRegistry):
+    for kind in ['added', 'updated']:
+        for comet in getattr(cometList, kind):
+            notify_event(kind, comet, outbox, subscribers)
+
+def notify_magnitude_changes(cometList: CometList, outbox: 'NotificationOutbox', subscribers: SubscriberRegistry):
+    for change in cometList.changed:
+        notify_event('changed', change, outbox, subscribers)
+
+def drain_outbox(outbox: 'NotificationOutbox', subscribers: SubscriberRegistry, metrics: Metrics = None):
+    sent, failed = outbox.drain(subscribers, metrics)
+    counts = outbox.counts()
+    print(f"Sent {sent} Discord notifications, {failed} failed, {counts['pending']} pending, {counts['givenUp']} given up")
+
+def updateAndCheckNotifications(storage: CometStorage, refreshScheduler: RefreshScheduler = None, metrics: Metrics = None, columnar: bool = False, pipelined: bool = True, observationFormat: str = OBS_FORMAT):
+    """One update run: discovery, the observation refresh and notifications.
+
+    By default the steps overlap as an UpdatePipeline, so notifications go
+    out while the refresh is still running.  pipelined=False runs them one
+    after the other and delivers once the comets are saved.
+    """
+
+    metrics = metrics or Metrics()
+
+    print(f"Checking for new comets at {datetime.now()}")
+    transport = create_transport(metrics)
+    designationProbe = create_designation_probe()
+    outbox = create_outbox()
+    resolutionCache = create_resolution_cache()
+    try:
+        cometList = CometList(create_response_cache(metrics), transport, refreshScheduler, designationProbe, metrics, columnar, resolutionCache, observationFormat)
+
+        subscribers = create_subscribers(transport)
+
+        with metrics.phase('load'):
+            cometList.load(storage)
+        print(f"Loaded {len(cometList.registry)} previously known comets")
+
+        if pipelined:
+            run_pipeline(storage, cometList, outbox, subscribers, metrics)
+        else:
+            run_phases(storage, cometList, outbox, subscribers, metrics)
+    finally:
+        outbox.close()
+        resolutionCache.close()
 
-    cometList.saveCsv(CSV_FILE)
+    metrics.setGauge('comets', len(cometList.activeComets()), state='active')
+    metrics.setGauge('comets', len(cometList.registry) - len(cometList.activeComets()), state='archived')
+
+    for host, stats in transport.stats().items():
+        print(f"{host}: {stats}")
+
+def run_pipeline(storage: CometStorage, cometList: CometList, outbox: 'NotificationOutbox', subscribers: SubscriberRegistry, metrics: Metrics):
+    from Pipeline import UpdatePipeline
+
+    pipeline = UpdatePipeline(cometList, outbox, subscribers, metrics)
+
+    try:
+        try:
+            with metrics.phase('pipeline'):
+                pipeline.run()
+        finally:
+            # Saved even when a stage failed, discovery say, since the refresh's
+            # notifications are already recorded and a later run must not find
+            # the same crossings again
+            count_events(cometList, metrics)
+
+            with metrics.phase('save'):
+                cometList.save(storage)
+    finally:
+        # Whatever was recorded is delivered even if the run failed part way,
+        # the outbox keeps a later run from sending it again
+        with metrics.phase('notify'):
+            pipeline.finish()
+
+def run_phases(storage: CometStorage, cometList: CometList, outbox: 'NotificationOutbox', subscribers: SubscriberRegistry, metrics: Metrics):
+    with metrics.phase('discovery'):
+        cometList.loadRecentComets()
+        cometList.designationProbe.negativeCache.save()
+    print(f"Found {len(cometList.added)} new comets")
+    print(f"Updated {len(cometList.updated)} comets")
+    print(f"Total of {len(cometList.registry)} comets")
+
+    notify_discoveries(cometList, outbox, subscribers)
+
+    # Update the observation data and check for comets reaching certain
+    # thresholds
+    with metrics.phase('observations'):
+        cometList.updateObservationData()
+
+    notify_magnitude_changes(cometList, outbox, subscribers)
+    count_events(cometList, metrics)
+
+    with metrics.phase('save'):
+        cometList.save(storage)
+
+    # Delivered only once the results are saved, whatever Discord does the
+    # notifications stay in the outbox for the next drain
+    with metrics.phase('notify'):
+        drain_outbox(outbox, subscribers, metrics)
 
 def main():
     load_dotenv()
@@ -160,13 +378,99 @@ def main():
 
     parser.add_argument('--summarize', action='store_true', help='If set, the output will be summarized')
     parser.add_argument('--skipsend', action='store_true', help='If set skip sending to Discord')
+    parser.add_argument('--storage', choices=['csv', 'sqlite'], default='csv', help=f'Where comets are kept, {CSV_FILE} or {COMETS_DB}, which is seeded from {CSV_FILE} on first use')
+    parser.add_argument('--exportcsv', metavar='PATH', help='Export the comet database to a CSV file and exit')
+    parser.add_argument('--inactivedays', type=float, default=60, help='Archive comets with no observations for this many days')
+    parser.add_argument('--refreshall', action='store_true', help='Refresh every active comet instead of only those due')
+    parser.add_argument('--daemon', action='store_true', help='Keep running, checking for updates on the intervals below')
+    parser.add_argument('--discoveryinterval', type=float, default=60, help='Daemon minutes between checks for new comets')
+    parser.add_argument('--refreshinterval', type=float, default=30, help='Daemon minutes between observation refreshes')
+    parser.add_argument('--summaryinterval', type=float, default=24 * 60, help='Daemon minutes between summaries, 0 to disable')
+    parser.add_argument('--checkpointinterval', type=float, default=10, help='Daemon minutes between saves of the comet state')
+    parser.add_argument('--drain', action='store_true', help='Deliver the notifications waiting in the outbox and exit')
+    parser.add_argument('--draininterval', type=float, default=1, help='Daemon minutes between outbox deliveries')
+    parser.add_argument('--serve', type=int, metavar='PORT', help='With --daemon, serve the comet state as JSON over HTTP on this port')
+    parser.add_argument('--servehost', default='127.0.0.1', help='Address the --serve HTTP service listens on')
+    parser.add_argument('--worker', action='store_true', help='Refresh observations for the shards this process can lease, alongside other workers')
+    parser.add_argument('--shards', type=int, default=8, help='Shards the catalogue is split into, the same for every worker')
+    parser.add_argument('--workerid', help='Name this worker holds its leases under, host:pid by default')
+    parser.add_argument('--leaseminutes', type=float, default=10, help='Minutes a shard lease lasts without being renewed')
+    parser.add_argument('--phased', action='store_true', help='Run discovery, refresh and notifications one after the other instead of overlapping them')
+    parser.add_argument('--columnar', action='store_true', help='Hold the comets in compact columns, for large catalogues')
+    parser.add_argument('--obsformat', choices=OBS_FORMATS, default=OBS_FORMAT, help='Format observations are fetched from MPC in, OBS80 is much smaller for large catalogues')
+    parser.add_argument('--metricsjson', metavar='PATH', help='Write a JSON report of phase timings and counters after each run')
+    parser.add_argument('--metricsprom', metavar='PATH', help='Write the run metrics as a Prometheus textfile')
+    parser.add_argument('--profile', action='store_true', help='Capture cProfile and tracemalloc data for each phase in the JSON report')
+    parser.add_argument('--profiledir', metavar='DIR', help='Also save each phase profile as a .prof file in this directory')
 
     args = parser.parse_args()
 
-    if args.summarize:
-        summarize(not args.skipsend)
-    else:
-        updateAndCheckNotifications()
+    storage = create_storage(args.storage)
+    refreshScheduler = None if args.refreshall else create_refresh_scheduler(args.inactivedays)
+    metrics = Metrics(profile=args.profile or bool(args.profiledir), profileDir=args.profiledir)
+
+    try:
+        if args.exportcsv:
+            if isinstance(storage, SqliteCometStorage):
+                storage.exportCsv(args.exportcsv)
+            else:
+                print("--exportcsv requires --storage sqlite")
+        elif args.drain:
+            outbox = create_outbox()
+            try:
+                drain_outbox(outbox, create_subscribers(), metrics)
+            finally:
+                outbox.close()
+                write_metrics(metrics, args.metricsjson, args.metricsprom)
+        elif args.worker:
+            if not isinstance(storage, SqliteCometStorage):
+                print("--worker requires --storage sqlite")
+                return
+
+            from ShardWorker import ShardWorker
+
+            worker = ShardWorker(storage, args.shards, args.workerid, args.leaseminutes * 60, refreshScheduler, metrics, args.obsformat)
+            try:
+                worker.run()
+            finally:
+                worker.close()
+                write_metrics(metrics, args.metricsjson, args.metricsprom)
+        elif args.daemon:
+            from Daemon import Daemon
+
+            queryService = None
+            if args.serve:
+                from QueryService import QueryService
+
+                queryService = QueryService(args.servehost, args.serve)
+                queryService.start()
+
+            daemon = Daemon(storage,
+                            discoveryInterval=args.discoveryinterval * 60,
+                            refreshInterval=args.refreshinterval * 60,
+                            summaryInterval=args.summaryinterval * 60,
+                            checkpointInterval=args.checkpointinterval * 60,
+                            drainInterval=args.draininterval * 60,
+                            sendSummary=not args.skipsend,
+                            refreshScheduler=refreshScheduler,
+                            metrics=metrics,
+                            metricsJson=args.metricsjson,
+                            metricsPrometheus=args.metricsprom,
+                            columnar=args.columnar,
+                            queryService=queryService,
+                            observationFormat=args.obsformat)
+            daemon.run()
+        elif args.serve:
+            print("--serve requires --daemon")
+        elif args.summarize:
+            summarize(not args.skipsend, storage, args.columnar)
+        else:
+            try:
+                updateAndCheckNotifications(storage, refreshScheduler, metrics, args.columnar, not args.phased, args.obsformat)
+            finally:
+                write_metrics(metrics, args.metricsjson, args.metricsprom)
+    finally:
+        storage.close()
 
 
 if __name__ == "__main__":
@@ -1,95 +1,229 @@
-import csv
-import os
-import time
-from datetime import datetime, timedelta, timezone
-from typing import List
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, List, Tuple
 
-import pandas as pd
 from Comet import Comet
-from MinorPlanetaryCenter import DesignationIdentifierApi, DesignationBuilder, ObservationsApi
+from CometRegistry import CometRegistry
+from CometStorage import CometStorage, CsvCometStorage
+from CometTable import ColumnarCometRegistry
+from Metrics import Metrics
+from RefreshScheduler import RefreshScheduler
+from ShardLeases import shardOf
+
+# pandas and the HTTP clients are only imported by the methods that use them,
+# so loading and summarizing the comet list stays cheap
+if TYPE_CHECKING:
+    import pandas as pd
+    from DesignationProbe import DesignationProbe
+    from HttpTransport import HttpTransport
+    from ResolutionCache import ResolutionCache
+    from ResponseCache import ResponseCache
 
 BINOC_MAGNITUDE=8
 NAKED_EYE_MAGNITUDE=6
 SPECTACULAR_MAGNITUDE=2
 SUDDEN_INCREASE_MAGNITUDE=1.5
 
+# Checked brightest first, the first threshold crossed is the one reported
+THRESHOLDS = [
+    ('spectacular', SPECTACULAR_MAGNITUDE),
+    ('nakedeye', NAKED_EYE_MAGNITUDE),
+    ('binoc', BINOC_MAGNITUDE)
+]
 
-class CometList:
-    comets: List[Comet] = []
-    added: List[Comet] = []
-    updated: List[Comet] = []
-    binoc: List[Comet] = []
-    nakedeye: List[Comet] = []
-    spectacular: List[Comet] = []
-    suddenincrease: List[Comet] = []
+# Rolling light curve windows in days, 1 and 2 give mag1davg and mag2davg
+LIGHT_CURVE_WINDOWS=(1, 2, 7)
 
-    def loadCsv(self, filePath: str):
-        if os.path.exists(filePath):
-            try:
-                self.comets = []
+# Limits for concurrent observation fetching, to stay polite to MPC
+OBS_REQUESTS_PER_SECOND=2
+OBS_MAX_IN_FLIGHT=4
+OBS_CHUNK_SIZE=25
+# Chunks fetched or waiting for analysis at once when the designations are streamed in
+OBS_MAX_PENDING=8
+# Decode get-obs responses incrementally, keeping only the columns used here
+OBS_STREAMING=True
+# 'ADES_DF', or the much smaller 'OBS80' with only the fields the refresh uses
+OBS_FORMATS=('ADES_DF', 'OBS80')
+OBS_FORMAT='ADES_DF'
 
-                with open(filePath, 'r', newline='') as f:
-                    reader = csv.DictReader(f)
-                    for row in reader:
-                        self.comets.append(Comet(row))
-            except Exception as e:
-                print(f"Error reading CSV: {e}")
 
-    def saveCsv(self, filePath: str):
-        fieldnames = ['designation',
-                      'permid',
-                      'name',
-                      'discoverer',
-                      'mag1davg',
-                      'mag2davg',
-                      'lastobs',
-                      'lastupdate',
-                      'archive'
-                      ]
+class MagnitudeChange:
+    """A comet's 2 day average moving from prior to current in one refresh.
+
+    prior is None when there was no average to compare against.
+    """
+    __slots__ = ('comet', 'prior', 'current')
+
+    def __init__(self, comet: Comet, prior: float, current: float):
+        self.comet = comet
+        self.prior = float(prior) if prior and prior == prior else None
+        self.current = float(current) if current == current else None
+
+    @property
+    def increase(self) -> float:
+        """How much brighter the comet got, in magnitudes, or None without both averages."""
+        if self.prior is None or self.current is None:
+            return None
+        return self.prior - self.current
+
+
+def refreshPriority(comet: Comet) -> float:
+    """Sort key putting the brightest comets first and those without a magnitude last."""
+    magnitude = comet.mag2davg or comet.mag1davg
+    return magnitude if magnitude and magnitude == magnitude else float('inf')
+
 
+class CometList:
+    registry: CometRegistry
+    added: List[Comet]
+    updated: List[Comet]
+    binoc: List[Comet]
+    nakedeye: List[Comet]
+    spectacular: List[Comet]
+    suddenincrease: List[Comet]
+    archived: List[Comet]
+    changed: List[MagnitudeChange]
+
+    def __init__(self, responseCache: 'ResponseCache' = None, transport: 'HttpTransport' = None, refreshScheduler: RefreshScheduler = None, designationProbe: 'DesignationProbe' = None, metrics: Metrics = None, columnar: bool = False, resolutionCache: 'ResolutionCache' = None, observationFormat: str = OBS_FORMAT):
+        """columnar=True keeps the comets in a CometTable, for large catalogues
+        where most comets are archived and rarely touched.
+
+        resolutionCache keeps the identities discovery resolved between runs.
+        observationFormat is the get-obs output format, one of OBS_FORMATS.
+        """
+        self.responseCache = responseCache
+        self.transport = transport
+        # Without a scheduler every active comet is refreshed on every update
+        self.refreshScheduler = refreshScheduler
+        self.designationProbe = designationProbe
+        self.resolutionCache = resolutionCache
+        self.metrics = metrics or Metrics()
+        self.columnar = columnar
+        self.observationFormat = observationFormat
+        self.registry = ColumnarCometRegistry() if columnar else CometRegistry()
+        # Called with (kind, comet) as each event happens, for a pipeline that
+        # acts on events before the run is over.  'changed' events pass a
+        # MagnitudeChange instead of the comet
+        self.listener: Callable[[str, object], None] = None
+        self.clearEvents()
+
+    @property
+    def comets(self) -> List[Comet]:
+        return list(self.registry)
+
+    def getTransport(self) -> 'HttpTransport':
+        if self.transport is None:
+            from HttpTransport import HttpTransport
+            self.transport = HttpTransport()
+
+        return self.transport
+
+    def activeComets(self) -> List[Comet]:
+        return self.registry.activeComets()
+
+    def clearEvents(self):
+        self.added = []
+        self.updated = []
+        self.binoc = []
+        self.nakedeye = []
+        self.spectacular = []
+        self.suddenincrease = []
+        self.archived = []
+        self.changed = []
+
+    def recordEvent(self, kind: str, comet: Comet):
+        """Add comet to the event list for kind and pass it straight on to the listener."""
+        getattr(self, kind).append(comet)
+
+        if self.listener:
+            self.listener(kind, comet)
+
+    def recordChange(self, change: MagnitudeChange):
+        self.changed.append(change)
+
+        if self.listener:
+            self.listener('changed', change)
+
+    def load(self, storage: CometStorage):
         try:
-            with open(filePath, 'w', newline='') as f:
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writeheader()
+            if self.columnar:
+                self.registry = ColumnarCometRegistry(storage.loadTable())
+                return
 
-                for comet in self.comets:
-                    writer.writerow(comet.toDict())
+            comets = storage.load()
         except Exception as e:
-            print(f"Error writing CSV: {e}")
-
-    def loadRecentComets(self):
-        designationBuilder = DesignationBuilder()
+            print(f"Error loading comets: {e}")
+            return
 
-        saved_designations = [c.designation for c in self.comets]
-        previous_designations = designationBuilder.GetCometDesignationRange(datetime.now() - timedelta(days=15), 1, 5)
-        current_designations = designationBuilder.GetCometDesignationRange(datetime.now(), 1, 5)
+        self.registry.clear()
+        for comet in comets:
+            self.registry.add(comet)
 
-        designations = saved_designations + previous_designations + current_designations
-        unique_designations = list(dict.fromkeys(designations))
+    def save(self, storage: CometStorage):
+        try:
+            if self.columnar:
+                storage.saveTable(self.registry.table)
+            else:
+                storage.save(self.registry)
+        except Exception as e:
+            print(f"Error saving comets: {e}")
 
-        designationApi = DesignationIdentifierApi()
+    def loadCsv(self, filePath: str):
+        self.load(CsvCometStorage(filePath))
 
-        data = designationApi.queryMultiple(unique_designations)
+    def saveCsv(self, filePath: str):
+        self.save(CsvCometStorage(filePath))
 
-        if not self.comets:
-            self.comets = []
+    def loadRecentComets(self):
+        from DesignationProbe import DesignationProbe
+        from MinorPlanetaryCenter import IDENTIFIER_MAX_IN_FLIGHT, IDENTIFIER_REQUESTS_PER_SECOND, DesignationIdentifierApi
+        from RateLimiter import RateLimiter
+
+        if self.designationProbe is None:
+            self.designationProbe = DesignationProbe()
+
+        # The known comets' lookups and the probe share one budget with MPC
+        rateLimiter = RateLimiter(IDENTIFIER_REQUESTS_PER_SECOND, IDENTIFIER_MAX_IN_FLIGHT, burst=IDENTIFIER_MAX_IN_FLIGHT)
+
+        # Not through the response cache, which would answer with the same
+        # unnamed or not found reply until it expired
+        designationApi = DesignationIdentifierApi(transport=self.getTransport(), resolutionCache=self.resolutionCache, rateLimiter=rateLimiter)
+
+        # Archived comets are no longer looked up, nor are those with both a
+        # permid and a name, which do not change again
+        saved_designations = [designation for designation, comet in self.registry.active.items() if not (comet.permid and comet.name)]
+        final = len(self.registry.active) - len(saved_designations)
+        with self.metrics.span('identifier_lookup', kind='known'):
+            data = designationApi.queryMultiple(saved_designations) if saved_designations else []
+
+        # Recent half-months are probed until the designations run out, known
+        # comets count as hits without another lookup.  The probe's lookups
+        # bypass every cache, its negative cache alone decides when to ask again
+        with self.metrics.span('identifier_lookup', kind='probe'):
+            data += self.designationProbe.probe(DesignationIdentifierApi(transport=self.getTransport(), rateLimiter=rateLimiter), set(self.registry.byDesignation))
+
+        print(f"Probed {self.designationProbe.queried} new designations, {self.designationProbe.skipped} skipped as recently not found")
+        print(f"Sent {designationApi.requested} designations to MPC, {designationApi.cacheHits} answered from the resolution cache, {final} final comets skipped")
+        self.metrics.increment('designations_probed', self.designationProbe.queried)
+        self.metrics.increment('designations_skipped', self.designationProbe.skipped)
+        self.metrics.increment('designations_requested', designationApi.requested)
+        self.metrics.increment('designations_resolved_cached', designationApi.cacheHits)
+        self.metrics.increment('designations_final_skipped', final)
 
         for row in data:
             if row.found == 0:
                 continue
 
-            existingComets = self.findCometByDesignation(row.designation)
-
-            if existingComets and len(existingComets) > 0:
-                existingComet = existingComets[0]
+            existingComet = self.registry.findByDesignation(row.designation)
 
+            if existingComet:
                 if existingComet.name != (row.name or '') or existingComet.permid != (row.permId or ''):
                     existingComet.name = row.name
                     existingComet.permid = row.permId
                     existingComet.lastupdate = datetime.now()
+                    self.registry.reindex(existingComet)
 
-                    self.updated.append(existingComet)
-            elif not existingComets or len(existingComets) == 0:
+                    self.recordEvent('updated', existingComet)
+            else:
                 comet = Comet({
                     'designation': row.designation,
                     'name': row.name,
@@ -99,101 +233,219 @@ class CometList:
                     'lastupdated': datetime.now(timezone.utc)
                 })
 
-                self.comets.append(comet)
-                self.added.append(comet)
+                self.registry.add(comet)
+                self.recordEvent('added', comet)
 
-    def updateObservationData(self):
+    def updateObservationData(self, requestsPerSecond: float = OBS_REQUESTS_PER_SECOND, maxInFlight: int = OBS_MAX_IN_FLIGHT, shard: Tuple[int, int] = None):
+        """Refresh the active comets that are due.
+
+        shard=(index, count) limits the refresh to the comets shardOf puts in
+        that shard, for a worker sharing the catalogue with others.
+        """
+        comets = self.planRefresh(shard)
+        self.refreshObservations([c.designation for c in comets], requestsPerSecond, maxInFlight)
+
+    def planRefresh(self, shard: Tuple[int, int] = None) -> List[Comet]:
+        """The active comets due for a refresh, brightest first, archiving those gone quiet."""
         print("Updating observation data for known comets")
 
-        obsApi = ObservationsApi()
-        for comet in self.comets:
-            try:
-                obs = obsApi.query(comet.designation)
+        now = datetime.now(timezone.utc)
+
+        # Archived comets are not refreshed
+        comets = self.registry.activeComets()
+
+        if shard:
+            comets = self.shardComets(comets, shard)
 
-                obs['obstime'] = pd.to_datetime(obs['obstime'], format='ISO8601')
+        if self.refreshScheduler:
+            candidates = len(comets)
+            comets, inactive = self.refreshScheduler.plan(comets, now)
 
-                lastObservation = obs['obstime'].max()
-                lastObservation = lastObservation.replace(microsecond=0)
+            for comet in inactive:
+                print(f"Archiving {comet.getFriendlyName()}, no observations since {comet.lastobs}")
+                self.archiveComet(comet)
+                self.recordEvent('archived', comet)
 
-                twoDays = lastObservation - timedelta(days=2)
-                oneDay = lastObservation - timedelta(days=1)
+            self.metrics.increment('comets_archived', len(inactive))
+            print(f"{len(comets)} of {candidates} active comets are due for a refresh")
 
-                if comet.lastobs and lastObservation <= comet.lastobs:
-                    print(f"No new observations for {comet.getFriendlyName()} since {lastObservation}")
-                    continue
+        # The comets most likely to cross a threshold are fetched first, so
+        # their notifications are not held up behind the faint ones
+        return sorted(comets, key=refreshPriority)
 
-                comet.lastobs = lastObservation
+    def refreshObservations(self, designations: Iterable[str], requestsPerSecond: float = OBS_REQUESTS_PER_SECOND, maxInFlight: int = OBS_MAX_IN_FLIGHT):
+        """Fetch and analyse the observations of the comets with these designations.
 
-                twoDayData = obs[obs['obstime'] >= twoDays].copy()
-                twoDayData['mag'] = pd.to_numeric(twoDayData['mag'], errors='coerce')
+        designations may be a generator still being fed by another stage, such
+        as a discovery running alongside, in which case the comets are fetched
+        as they arrive.
+        """
+        from MinorPlanetaryCenter import ObservationsApi
+        from RateLimiter import RateLimiter
 
-                # print(twoDayData['mag'])
+        now = datetime.now(timezone.utc)
+        requested = []
 
-                twoDayAvg = twoDayData['mag'].dropna().mean().round(2)
+        def track(designations: Iterable[str]) -> Iterator[str]:
+            for designation in designations:
+                requested.append(designation)
+                yield designation
 
-                self.checkMagnitudes(comet, comet.mag2davg, twoDayAvg)
+        if maxInFlight > 1:
+            # Concurrent mode: chunks are fetched in parallel under a shared
+            # rate limiter and analysed as soon as each one arrives
+            obsApi = ObservationsApi(RateLimiter(requestsPerSecond, maxInFlight), self.responseCache, streaming=OBS_STREAMING, outputFormat=self.observationFormat, transport=self.getTransport())
+            batches = self.timedBatches(obsApi.iterQueryStream(track(designations), chunk_size=OBS_CHUNK_SIZE, maxWorkers=maxInFlight, maxPending=OBS_MAX_PENDING))
+        else:
+            obsApi = ObservationsApi(cache=self.responseCache, streaming=OBS_STREAMING, outputFormat=self.observationFormat, transport=self.getTransport())
+            with self.metrics.span('observation_download'):
+                batches = [obsApi.queryMany(list(track(designations)), chunk_size=OBS_CHUNK_SIZE)]
 
-                if comet.mag2davg:
-                    mag2delta = comet.mag2davg - twoDayAvg
-                else:
-                    mag2delta = twoDayAvg
+        received = set()
+        for batch in batches:
+            received.update(batch)
 
-                if mag2delta != 0:
-                    comet.mag2davg = twoDayAvg
+            for designation in batch:
+                self.registry.findByDesignation(designation).lastchecked = now
 
-                if mag2delta >= SUDDEN_INCREASE_MAGNITUDE:
-                    self.suddenincrease.append(comet)
+            try:
+                with self.metrics.span('observation_processing'):
+                    self.processObservationBatch(batch)
+            except Exception as ex:
+                print(f"Error processing observations for {', '.join(batch)}: {ex}")
+                self.metrics.increment('observation_errors')
+
+        missing = [d for d in requested if d not in received]
+        for designation in missing:
+            print(f"No observations returned for {self.registry.findByDesignation(designation).getFriendlyName()}")
+
+        self.metrics.increment('comets_refreshed', len(received))
+        self.metrics.increment('comets_missing_observations', len(missing))
+
+    def shardComets(self, comets: List[Comet], shard: Tuple[int, int]) -> List[Comet]:
+        index, count = shard
+        return [comet for comet in comets if shardOf(comet.designation, count) == index]
+
+    def timedBatches(self, batches: Iterator[Dict[str, 'pd.DataFrame']]) -> Iterator[Dict[str, 'pd.DataFrame']]:
+        # Time spent waiting for the next chunk from MPC, apart from analysing it
+        batches = iter(batches)
+        while True:
+            with self.metrics.span('observation_download'):
+                batch = next(batches, None)
+
+            if batch is None:
+                return
+
+            yield batch
+
+    def processObservationBatch(self, batch: Dict[str, 'pd.DataFrame']):
+        """Append each comet's new observations to the ObservationStore, then
+        evaluate the new averages of the whole batch in one vectorized pass.
+        """
+        import numpy as np
+        import pandas as pd
+        from MagnitudeAnalysis import evaluateMagnitudes
+        from ObservationStore import ObservationStore
+
+        store = ObservationStore(self.registry, LIGHT_CURVE_WINDOWS)
+        comets = []
+        curves = []
+        newObservations = []
+
+        for designation, obs in batch.items():
+            comet = self.registry.findByDesignation(designation)
+
+            if obs is None or obs.empty or 'obstime' not in obs:
+                print(f"No observations returned for {comet.getFriendlyName()}")
+                continue
 
-                oneDayData = obs[obs['obstime'] >= oneDay].copy()
-                oneDayData['mag'] = pd.to_numeric(oneDayData['mag'], errors='coerce')
+            new = store.append(designation, obs)
+            if new == 0 and comet.lastobs:
+                print(f"No new observations for {comet.getFriendlyName()} since {comet.lastobs}")
+                continue
 
-                oneDayAvg = oneDayData['mag'].dropna().mean().round(2)
+            comets.append(comet)
+            curves.append(store.curve(designation))
+            newObservations.append(new)
 
-                if comet.mag1davg:
-                    mag1delta = comet.mag1davg - oneDayAvg
-                else:
-                    mag1delta = oneDayAvg
+        if not comets:
+            return
 
-                if mag1delta != 0:
-                    comet.mag1davg = oneDayAvg
+        results = pd.DataFrame({
+            # Stored to the second, like the comet's own lastobs
+            'lastobs': pd.to_datetime([curve.lastobs for curve in curves], unit='s', utc=True).floor('s'),
+            'mag2davg': [curve.mean(2) for curve in curves],
+            'mag1davg': [curve.mean(1) for curve in curves],
+            'priorLastobs': pd.to_datetime([c.lastobs for c in comets], utc=True),
+            'priorMag2davg': np.array([c.mag2davg for c in comets], dtype='float64'),
+            'priorMag1davg': np.array([c.mag1davg for c in comets], dtype='float64'),
+            # Observations reported late change the averages without moving lastobs
+            'newObservations': newObservations
+        }, index=[c.designation for c in comets])
 
-                if mag1delta != 0 or mag2delta != 0:
-                    comet.lastupdate = datetime.now()
+        results = evaluateMagnitudes(results, THRESHOLDS, SUDDEN_INCREASE_MAGNITUDE)
 
-                # Pause before the next comet to avoid spamming the API
-                time.sleep(0.5)
-            except Exception as ex:
-                print(f"Error getting observations for {comet.designation}: {ex}")
+        for comet, row in zip(comets, results.itertuples()):
+            self.applyMagnitudes(comet, row)
 
+    def applyMagnitudes(self, comet: Comet, row):
+        if not row.isNew:
+            print(f"No new observations for {comet.getFriendlyName()} since {row.lastobs}")
+            return
 
-    def checkMagnitudes(self, comet: Comet, priorMagnitude: float, newMagnitude: float):
-        if self.checkThreshold(SPECTACULAR_MAGNITUDE, priorMagnitude, newMagnitude):
-            self.binoc.append(comet)
-        elif self.checkThreshold(NAKED_EYE_MAGNITUDE, priorMagnitude, newMagnitude):
-            self.nakedeye.append(comet)
-        elif self.checkThreshold(BINOC_MAGNITUDE, priorMagnitude, newMagnitude):
-            self.binoc.append(comet)
+        comet.lastobs = row.lastobs.to_pydatetime()
 
-    
-    def checkThreshold(self, threshold: float, priorMagnitude: float, newMagnitude: float) -> bool:
-        return priorMagnitude and newMagnitude and priorMagnitude > threshold and newMagnitude <= threshold
+        if row.mag2delta != 0:
+            comet.mag2davg = float(row.mag2davg)
+
+        if row.mag1delta != 0:
+            comet.mag1davg = float(row.mag1davg)
+
+        if row.mag1delta != 0 or row.mag2delta != 0:
+            comet.lastupdate = datetime.now()
+
+        # Recorded once the comet holds its new averages, a listener may
+        # report them straight away
+        if row.threshold:
+            self.checkMagnitudes(comet, row.threshold)
+
+        if row.suddenIncrease:
+            self.recordEvent('suddenincrease', comet)
+
+        # The raw change, for subscribers judging it against their own thresholds
+        if row.mag2delta != 0:
+            self.recordChange(MagnitudeChange(comet, row.priorMag2davg, row.mag2davg))
+
+    def checkMagnitudes(self, comet: Comet, threshold: str):
+        if threshold in ('spectacular', 'nakedeye', 'binoc'):
+            self.recordEvent(threshold, comet)
 
     def addComet(self, comet: Comet):
-        self.comets.append(comet)
+        self.registry.add(comet)
+
+    def archiveComet(self, comet: Comet):
+        comet.archive = True
+        self.registry.reindex(comet)
 
     def findCometByDesignation(self, designation: str) -> List[Comet]:
-        matches = [ c for c in self.comets if c.designation == designation ]
-        return matches
+        comet = self.registry.findByDesignation(designation)
+        return [comet] if comet else []
+
+    def findCometByPermid(self, permid: str) -> Comet:
+        return self.registry.findByPermid(permid)
+
+    def findCometsByName(self, name: str) -> List[Comet]:
+        return self.registry.findByName(name)
 
 
 if __name__ == '__main__':
     cometList = CometList()
 
     cometList.loadCsv('test.csv')
-    print(f"{len(cometList.comets)} comets loaded from csv")
+    print(f"{len(cometList.registry)} comets loaded from csv")
 
     cometList.loadRecentComets()
-    print(f"{len(cometList.comets)} comets loaded from recent")
+    print(f"{len(cometList.registry)} comets loaded from recent")
 
     cometList.updateObservationData()
 
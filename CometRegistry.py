@@ -0,0 +1,104 @@
+from typing import Dict, Iterator, List
+
+from Comet import Comet
+
+
+class CometRegistry:
+    """Comets indexed by designation, permid and name.
+
+    Active and archived comets are kept in separate partitions so the refresh
+    loop can walk the active ones without touching the archive.  Call reindex()
+    after changing a comet's permid, name or archive flag.
+    """
+
+    def __init__(self):
+        self.byDesignation: Dict[str, Comet] = {}
+        self.byPermid: Dict[str, Comet] = {}
+        self.byName: Dict[str, Dict[str, Comet]] = {}
+        self.active: Dict[str, Comet] = {}
+        self.archived: Dict[str, Comet] = {}
+        # The keys each comet is currently indexed under, so reindex can remove stale ones
+        self.indexedKeys: Dict[str, tuple] = {}
+
+    def __len__(self) -> int:
+        return len(self.byDesignation)
+
+    def __iter__(self) -> Iterator[Comet]:
+        return iter(list(self.byDesignation.values()))
+
+    def __contains__(self, designation: str) -> bool:
+        return designation in self.byDesignation
+
+    def clear(self):
+        self.byDesignation.clear()
+        self.byPermid.clear()
+        self.byName.clear()
+        self.active.clear()
+        self.archived.clear()
+        self.indexedKeys.clear()
+
+    def add(self, comet: Comet):
+        if comet.designation in self.byDesignation:
+            self.remove(self.byDesignation[comet.designation])
+
+        self.byDesignation[comet.designation] = comet
+        self.index(comet)
+
+    def remove(self, comet: Comet):
+        self.unindex(comet.designation)
+        self.byDesignation.pop(comet.designation, None)
+
+    def reindex(self, comet: Comet):
+        self.unindex(comet.designation)
+        self.index(comet)
+
+    def findByDesignation(self, designation: str) -> Comet:
+        return self.byDesignation.get(designation)
+
+    def findByPermid(self, permid: str) -> Comet:
+        return self.byPermid.get(permid)
+
+    def findByName(self, name: str) -> List[Comet]:
+        # Names such as ATLAS or PANSTARRS are shared by many comets
+        return list(self.byName.get(name, {}).values())
+
+    def activeComets(self) -> List[Comet]:
+        return list(self.active.values())
+
+    def archivedComets(self) -> List[Comet]:
+        return list(self.archived.values())
+
+    def index(self, comet: Comet):
+        permid = comet.permid or ''
+        name = comet.name or ''
+
+        if permid:
+            self.byPermid[permid] = comet
+        if name:
+            self.byName.setdefault(name, {})[comet.designation] = comet
+
+        if comet.archive:
+            self.archived[comet.designation] = comet
+        else:
+            self.active[comet.designation] = comet
+
+        self.indexedKeys[comet.designation] = (permid, name)
+
+    def unindex(self, designation: str):
+        keys = self.indexedKeys.pop(designation, None)
+        if keys is None:
+            return
+
+        permid, name = keys
+        comet = self.byDesignation.get(designation)
+
+        if permid and self.byPermid.get(permid) is comet:
+            del self.byPermid[permid]
+
+        if name and name in self.byName:
+            self.byName[name].pop(designation, None)
+            if not self.byName[name]:
+                del self.byName[name]
+
+        self.active.pop(designation, None)
+        self.archived.pop(designation, None)
@@ -0,0 +1,277 @@
+import csv
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from Comet import Comet
+from CometTable import CometTable
+
+# Seconds to wait for another process's write lock
+BUSY_TIMEOUT = 30
+
+FIELDNAMES = ['designation',
+              'permid',
+              'name',
+              'discoverer',
+              'mag1davg',
+              'mag2davg',
+              'lastobs',
+              'lastupdate',
+              'lastchecked',
+              'archive',
+              'lightcurve'
+              ]
+
+
+class CometStorage(ABC):
+    """Where a CometList loads its comets from and saves them back to."""
+
+    @abstractmethod
+    def load(self) -> List[Comet]:
+        pass
+
+    @abstractmethod
+    def save(self, comets: Iterable[Comet]):
+        pass
+
+    def loadTable(self) -> CometTable:
+        """Load straight into columns, without a Comet object per row."""
+        comets = self.load()
+        return CometTable.fromRows(FIELDNAMES, [tuple(comet.toDict()[field] for field in FIELDNAMES) for comet in comets])
+
+    def saveTable(self, table: CometTable):
+        self.save(table.comet(row) for row in table.iterRows())
+        table.dirty.clear()
+
+    def close(self):
+        pass
+
+
+class CsvCometStorage(CometStorage):
+    def __init__(self, filePath: str):
+        self.filePath = filePath
+
+    def load(self) -> List[Comet]:
+        if not os.path.exists(self.filePath):
+            return []
+
+        with open(self.filePath, 'r', newline='') as f:
+            reader = csv.DictReader(f)
+            return [Comet(row) for row in reader]
+
+    def save(self, comets: Iterable[Comet]):
+        # Write a temp file and swap it in so a failed write never leaves a
+        # truncated CSV behind
+        tempPath = f"{self.filePath}.tmp"
+
+        with open(tempPath, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
+            writer.writeheader()
+
+            for comet in comets:
+                writer.writerow(comet.toDict())
+
+        os.replace(tempPath, self.filePath)
+
+    def loadTable(self) -> CometTable:
+        if not os.path.exists(self.filePath):
+            return CometTable()
+
+        with open(self.filePath, 'r', newline='') as f:
+            reader = csv.reader(f)
+            fieldnames = next(reader, [])
+            return CometTable.fromRows(fieldnames, reader)
+
+    def saveTable(self, table: CometTable):
+        tempPath = f"{self.filePath}.tmp"
+
+        with open(tempPath, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
+            writer.writeheader()
+            writer.writerows(table.toDict(row) for row in table.iterRows())
+
+        os.replace(tempPath, self.filePath)
+        table.dirty.clear()
+
+
+class SqliteCometStorage(CometStorage):
+    """Comets stored in SQLite, one row per designation.
+
+    save() only writes the fields that changed since each comet was last
+    loaded or saved, all inside a single transaction.  Sharded workers and
+    the daemon write the same rows, so leaving the other fields alone keeps
+    one process's stale copy from overwriting another's newer values.
+    """
+
+    def __init__(self, filePath: str):
+        self.filePath = filePath
+        # Sharded workers share the database, so wait out each other's writes
+        self.connection = sqlite3.connect(filePath, timeout=BUSY_TIMEOUT)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS comets (
+                designation TEXT PRIMARY KEY,
+                permid TEXT NOT NULL DEFAULT '',
+                name TEXT NOT NULL DEFAULT '',
+                discoverer TEXT NOT NULL DEFAULT '',
+                mag1davg REAL,
+                mag2davg REAL,
+                lastobs TEXT,
+                lastupdate TEXT,
+                lastchecked TEXT,
+                archive INTEGER NOT NULL DEFAULT 0,
+                lightcurve TEXT NOT NULL DEFAULT ''
+            );
+            CREATE INDEX IF NOT EXISTS comets_permid ON comets (permid);
+            CREATE INDEX IF NOT EXISTS comets_name ON comets (name);
+            CREATE INDEX IF NOT EXISTS comets_active_mag ON comets (archive, mag1davg);
+        ''')
+        self.migrate()
+        self.connection.commit()
+
+        # The last saved values for each designation, used to skip unchanged comets
+        self.savedRows: Dict[str, tuple] = {}
+
+    def close(self):
+        self.connection.close()
+
+    def migrate(self):
+        # Add columns introduced after the database was created
+        columns = { row['name'] for row in self.connection.execute('PRAGMA table_info(comets)') }
+
+        if 'lastchecked' not in columns:
+            self.connection.execute('ALTER TABLE comets ADD COLUMN lastchecked TEXT')
+
+        if 'lightcurve' not in columns:
+            self.connection.execute("ALTER TABLE comets ADD COLUMN lightcurve TEXT NOT NULL DEFAULT ''")
+
+    def isEmpty(self) -> bool:
+        return self.connection.execute('SELECT 1 FROM comets LIMIT 1').fetchone() is None
+
+    def load(self) -> List[Comet]:
+        return self.queryComets('SELECT * FROM comets ORDER BY rowid')
+
+    def queryActiveBrighterThan(self, magnitude: float) -> List[Comet]:
+        return self.queryComets(
+            'SELECT * FROM comets WHERE archive = 0 AND mag1davg <= ? ORDER BY mag1davg',
+            (magnitude,)
+        )
+
+    def queryComets(self, sql: str, params: tuple = ()) -> List[Comet]:
+        comets = []
+
+        for row in self.connection.execute(sql, params):
+            comet = Comet(dict(row))
+            self.savedRows[comet.designation] = self.toRow(comet)
+            comets.append(comet)
+
+        return comets
+
+    def save(self, comets: Iterable[Comet]):
+        changes = self.changes(comets)
+
+        if not changes:
+            return
+
+        with self.connection:
+            self.writeChanges(self.connection, changes)
+
+        self.markSaved(changes)
+
+    def changes(self, comets: Iterable[Comet]) -> List[Tuple[tuple, Tuple[str, ...]]]:
+        """(row, changed fields) for the comets that differ from what was last loaded or saved.
+
+        Comets that were never loaded from here have all their fields changed.
+        """
+        changes = []
+
+        for comet in comets:
+            row = self.toRow(comet)
+            saved = self.savedRows.get(comet.designation)
+
+            if saved is None:
+                changes.append((row, tuple(FIELDNAMES[1:])))
+                continue
+
+            fields = tuple(field for field, old, new in zip(FIELDNAMES[1:], saved[1:], row[1:]) if old != new)
+            if fields:
+                changes.append((row, fields))
+
+        return changes
+
+    def writeChanges(self, connection: sqlite3.Connection, changes: List[Tuple[tuple, Tuple[str, ...]]]):
+        """Upsert only the changed fields of each row, one statement per set of fields."""
+        byFields: Dict[Tuple[str, ...], List[tuple]] = {}
+
+        for row, fields in changes:
+            indexes = [0] + [FIELDNAMES.index(field) for field in fields]
+            byFields.setdefault(fields, []).append(tuple(row[index] for index in indexes))
+
+        for fields, rows in byFields.items():
+            connection.executemany(self.upsertSql(fields), rows)
+
+    def markSaved(self, changes: List[Tuple[tuple, Tuple[str, ...]]]):
+        for row, _ in changes:
+            self.savedRows[row[0]] = row
+
+    def loadTable(self) -> CometTable:
+        cursor = self.connection.cursor()
+        # Plain tuples are cheaper than sqlite3.Row for a whole catalogue
+        cursor.row_factory = None
+        cursor.execute(f"SELECT {', '.join(FIELDNAMES)} FROM comets ORDER BY rowid")
+        return CometTable.fromRows(FIELDNAMES, cursor)
+
+    def saveTable(self, table: CometTable):
+        # The table tracks its own changes, so only dirty columns are written
+        rows = sorted(row for row in table.dirty if table.columns['designation'][row] in table.rows)
+        if not rows:
+            return
+
+        changes = []
+        for row in rows:
+            fields = tuple(field for field in FIELDNAMES[1:] if field in table.dirty[row])
+            if fields:
+                changes.append((self.toTableRow(table, row), fields))
+
+        with self.connection:
+            self.writeChanges(self.connection, changes)
+
+        table.dirty.clear()
+
+    def toTableRow(self, table: CometTable, row: int) -> tuple:
+        values = table.toDict(row)
+        values['archive'] = 1 if values['archive'] else 0
+        return tuple(values[field] for field in FIELDNAMES)
+
+    def upsertSql(self, fields: Sequence[str] = FIELDNAMES[1:]) -> str:
+        columns = ['designation'] + list(fields)
+        return f'''
+            INSERT INTO comets ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})
+            ON CONFLICT (designation) DO UPDATE SET
+                {', '.join(f"{field} = excluded.{field}" for field in fields)}
+        '''
+
+    def toRow(self, comet: Comet) -> tuple:
+        values = comet.toDict()
+        values['permid'] = values['permid'] or ''
+        values['name'] = values['name'] or ''
+        values['discoverer'] = values['discoverer'] or ''
+        values['lightcurve'] = values['lightcurve'] or ''
+        values['archive'] = 1 if comet.archive else 0
+        return tuple(values[field] for field in FIELDNAMES)
+
+    def importCsv(self, filePath: str):
+        self.save(CsvCometStorage(filePath).load())
+
+    def exportCsv(self, filePath: str):
+        CsvCometStorage(filePath).save(self.load())
+
+
+if __name__ == "__main__":
+    storage = SqliteCometStorage(':memory:')
+    storage.importCsv('test.csv')
+
+    for comet in storage.queryActiveBrighterThan(12):
+        print(f"{comet.getFriendlyName()}: {comet.mag1davg}")
@@ -0,0 +1,387 @@
+import sys
+import time
+from array import array
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Sequence, Set
+
+from Comet import DATETIME_FORMAT, Comet, parseDateTime
+from CometRegistry import CometRegistry
+
+NAN = float('nan')
+EPOCH = datetime(1970, 1, 1)
+
+TEXT_COLUMNS = ['designation', 'permid', 'name', 'discoverer', 'lightcurve']
+FLOAT_COLUMNS = ['mag1davg', 'mag2davg']
+TIME_COLUMNS = ['lastobs', 'lastupdate', 'lastchecked']
+COLUMNS = TEXT_COLUMNS + FLOAT_COLUMNS + TIME_COLUMNS + ['archive']
+
+# Names and discoverers repeat across a catalogue (ATLAS, PANSTARRS, ...)
+INTERNED_COLUMNS = {'name', 'discoverer'}
+
+
+def parseTimestamps(values: Iterable[str]) -> array:
+    """Parse DATETIME_FORMAT strings to UTC epoch seconds, NaN for blanks.
+
+    The whole column goes through datetime.fromisoformat in one pass, and
+    only falls back to converting value by value if something in it is not
+    a plain naive timestamp.
+    """
+    values = values if isinstance(values, (list, tuple)) else list(values)
+    fromisoformat = datetime.fromisoformat
+
+    try:
+        return array('d', [(fromisoformat(value) - EPOCH).total_seconds() if value else NAN for value in values])
+    except (TypeError, ValueError):
+        return array('d', [toTimestamp(value) for value in values])
+
+
+def toTimestamp(value) -> float:
+    if not value:
+        return NAN
+
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=value.tzinfo or timezone.utc).timestamp()
+
+    return parseDateTime(value).timestamp()
+
+
+def formatTimestamp(value: float) -> str:
+    if value != value:
+        return None
+    return time.strftime(DATETIME_FORMAT, time.gmtime(value))
+
+
+class CometTable:
+    """Comet fields stored column by column.
+
+    Text columns are lists of str, magnitudes and timestamps are arrays of
+    doubles (NaN for missing, times as UTC epoch seconds) and the archive
+    flag is a bytearray.  Rows are addressed by index, with a designation
+    lookup on the side.  Comet objects are only created on demand as
+    CometView rows that read and write the table directly.  The columns
+    changed in each row since the last save are tracked in dirty, so a save
+    writes only those and leaves other processes' changes to the rest alone.
+    """
+
+    def __init__(self):
+        self.columns = {}
+        for column in TEXT_COLUMNS:
+            self.columns[column] = []
+        for column in FLOAT_COLUMNS + TIME_COLUMNS:
+            self.columns[column] = array('d')
+        self.columns['archive'] = bytearray()
+
+        # designation -> row, removed rows are left in the columns but not here
+        self.rows: Dict[str, int] = {}
+        self.dirty: Dict[int, Set[str]] = {}
+
+    @classmethod
+    def fromRows(cls, fieldnames: Sequence[str], rows: Iterable[Sequence], chunkSize: int = 10000) -> 'CometTable':
+        """Build a table from rows of values in fieldnames order, such as csv.reader or SQLite rows.
+
+        Rows are transposed and converted chunkSize at a time, so the raw
+        rows never all sit in memory next to the columns.
+        """
+        table = cls()
+        rows = iter(rows)
+
+        while True:
+            chunk = list(islice(rows, chunkSize))
+            if not chunk:
+                break
+
+            table.extend(dict(zip(fieldnames, zip(*chunk))), len(chunk))
+
+        designations = table.columns['designation']
+        table.rows = { designation: row for row, designation in enumerate(designations) }
+
+        return table
+
+    def extend(self, byField: Dict[str, Sequence], count: int):
+        for column in COLUMNS:
+            data = byField.get(column)
+            target = self.columns[column]
+
+            if column in TEXT_COLUMNS:
+                if data is None:
+                    target.extend([''] * count)
+                elif column in INTERNED_COLUMNS:
+                    target.extend([sys.intern(v) if v else '' for v in data])
+                else:
+                    target.extend([v or '' for v in data])
+            elif column in FLOAT_COLUMNS:
+                target.extend(array('d', [NAN if v is None or v == '' else float(v) for v in data]) if data else array('d', [NAN]) * count)
+            elif column in TIME_COLUMNS:
+                target.extend(parseTimestamps(data) if data else array('d', [NAN]) * count)
+            else:
+                target.extend(bytearray(1 if Comet.getBool(v) else 0 for v in data) if data else bytearray(count))
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __contains__(self, designation: str) -> bool:
+        return designation in self.rows
+
+    def get(self, row: int, column: str):
+        value = self.columns[column][row]
+
+        if column in TIME_COLUMNS:
+            return None if value != value else datetime.fromtimestamp(value, tz=timezone.utc)
+        if column in FLOAT_COLUMNS:
+            return None if value != value else value
+        if column == 'archive':
+            return bool(value)
+
+        return value
+
+    def set(self, row: int, column: str, value):
+        if column in TIME_COLUMNS:
+            value = toTimestamp(value)
+        elif column in FLOAT_COLUMNS:
+            value = NAN if value is None or value == '' else float(value)
+        elif column == 'archive':
+            value = 1 if value else 0
+        else:
+            value = value or ''
+            if column == 'designation' and self.columns[column][row] != value:
+                self.rows.pop(self.columns[column][row], None)
+                self.rows[value] = row
+
+        current = self.columns[column][row]
+        # NaN never equals itself, so a missing value set again is no change
+        if current != value and (current == current or value == value):
+            self.columns[column][row] = value
+            self.dirty.setdefault(row, set()).add(column)
+
+    def put(self, comet: Comet) -> int:
+        """Store a comet's fields, in its existing row if the designation is known."""
+        row = self.rows.get(comet.designation)
+
+        if row is None:
+            row = len(self.columns['designation'])
+            self.columns['designation'].append(comet.designation)
+            for column in TEXT_COLUMNS[1:]:
+                self.columns[column].append('')
+            for column in FLOAT_COLUMNS + TIME_COLUMNS:
+                self.columns[column].append(NAN)
+            self.columns['archive'].append(0)
+            self.rows[comet.designation] = row
+            self.dirty[row] = set(COLUMNS)
+
+        for column in COLUMNS:
+            self.set(row, column, getattr(comet, column))
+
+        return row
+
+    def remove(self, designation: str):
+        row = self.rows.pop(designation, None)
+        if row is not None:
+            self.dirty.pop(row, None)
+
+    def comet(self, row: int) -> 'CometView':
+        return CometView(self, row)
+
+    def iterRows(self) -> Iterator[int]:
+        return iter(list(self.rows.values()))
+
+    def activeRows(self) -> List[int]:
+        archive = self.columns['archive']
+        return [row for row in self.rows.values() if not archive[row]]
+
+    def toDict(self, row: int) -> dict:
+        """The row in the same shape as Comet.toDict, dates as DATETIME_FORMAT strings."""
+        values = {}
+        for column in COLUMNS:
+            value = self.columns[column][row]
+            if column in TIME_COLUMNS:
+                value = formatTimestamp(value)
+            elif column in FLOAT_COLUMNS:
+                value = None if value != value else value
+            elif column == 'archive':
+                value = bool(value)
+            values[column] = value
+        return values
+
+
+def columnProperty(column: str) -> property:
+    def getter(self):
+        return self.table.get(self.row, column)
+
+    def setter(self, value):
+        self.table.set(self.row, column, value)
+
+    return property(getter, setter)
+
+
+class CometView(Comet):
+    """A Comet backed by one CometTable row, changes are written to the table."""
+    __slots__ = ('table', 'row')
+
+    def __init__(self, table: CometTable, row: int):
+        self.table = table
+        self.row = row
+
+    def toDict(self) -> dict:
+        return self.table.toDict(self.row)
+
+
+for _column in COLUMNS:
+    setattr(CometView, _column, columnProperty(_column))
+
+
+class ColumnarCometRegistry(CometRegistry):
+    """CometRegistry over a CometTable.
+
+    Only active comets get a CometView up front.  Archived rows stay in the
+    columns until something looks them up, so a large historical catalogue
+    costs little more than its arrays.
+    """
+
+    def __init__(self, table: CometTable = None):
+        self.table = table if table is not None else CometTable()
+        self.views: Dict[str, CometView] = {}
+        self.byPermid: Dict[str, str] = {}
+        self.byName: Dict[str, Dict[str, str]] = {}
+        self.active: Dict[str, CometView] = {}
+        # Only comets with a permid or name have index keys to remember
+        self.indexedKeys: Dict[str, tuple] = {}
+
+        # The same as index() for every row, without the per-row overhead
+        columns = self.table.columns
+        permids, names, archive = columns['permid'], columns['name'], columns['archive']
+
+        for designation, row in self.table.rows.items():
+            permid = permids[row]
+            name = names[row]
+
+            if permid:
+                self.byPermid[permid] = designation
+            if name:
+                self.byName.setdefault(name, {})[designation] = designation
+
+            if not archive[row]:
+                self.active[designation] = self.view(designation)
+
+            if permid or name:
+                self.indexedKeys[designation] = (permid, name)
+
+    @property
+    def byDesignation(self) -> Dict[str, int]:
+        return self.table.rows
+
+    @property
+    def archived(self) -> Set[str]:
+        # Read from the archive column rather than kept as another index
+        archive = self.table.columns['archive']
+        return { designation for designation, row in self.table.rows.items() if archive[row] }
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def __iter__(self) -> Iterator[Comet]:
+        # Views made just for iterating are not kept
+        for designation, row in list(self.table.rows.items()):
+            yield self.views.get(designation) or self.table.comet(row)
+
+    def __contains__(self, designation: str) -> bool:
+        return designation in self.table
+
+    def clear(self):
+        self.table = CometTable()
+        self.views.clear()
+        self.byPermid.clear()
+        self.byName.clear()
+        self.active.clear()
+        self.indexedKeys.clear()
+
+    def view(self, designation: str) -> CometView:
+        comet = self.views.get(designation)
+        if comet is None:
+            row = self.table.rows.get(designation)
+            if row is None:
+                return None
+            comet = self.views[designation] = self.table.comet(row)
+        return comet
+
+    def add(self, comet: Comet):
+        if comet.designation in self.table:
+            self.unindex(comet.designation)
+
+        if not (isinstance(comet, CometView) and comet.table is self.table):
+            self.table.put(comet)
+
+        self.index(comet.designation)
+
+    def remove(self, comet: Comet):
+        self.unindex(comet.designation)
+        self.views.pop(comet.designation, None)
+        self.table.remove(comet.designation)
+
+    def reindex(self, comet: Comet):
+        # A plain Comet carries its own copy of the fields, write them back first
+        if not (isinstance(comet, CometView) and comet.table is self.table):
+            self.table.put(comet)
+
+        self.unindex(comet.designation)
+        self.index(comet.designation)
+
+    def findByDesignation(self, designation: str) -> Comet:
+        return self.view(designation)
+
+    def findByPermid(self, permid: str) -> Comet:
+        designation = self.byPermid.get(permid)
+        return self.view(designation) if designation else None
+
+    def findByName(self, name: str) -> List[Comet]:
+        return [self.view(designation) for designation in self.byName.get(name, {})]
+
+    def activeComets(self) -> List[Comet]:
+        return list(self.active.values())
+
+    def archivedComets(self) -> List[Comet]:
+        return [self.view(designation) for designation in self.archived]
+
+    def index(self, designation: str):
+        row = self.table.rows[designation]
+        columns = self.table.columns
+        permid = columns['permid'][row]
+        name = columns['name'][row]
+
+        if permid:
+            self.byPermid[permid] = designation
+        if name:
+            self.byName.setdefault(name, {})[designation] = designation
+
+        if not columns['archive'][row]:
+            self.active[designation] = self.view(designation)
+
+        if permid or name:
+            self.indexedKeys[designation] = (permid, name)
+
+    def unindex(self, designation: str):
+        permid, name = self.indexedKeys.pop(designation, ('', ''))
+
+        if permid and self.byPermid.get(permid) == designation:
+            del self.byPermid[permid]
+
+        if name and name in self.byName:
+            self.byName[name].pop(designation, None)
+            if not self.byName[name]:
+                del self.byName[name]
+
+        self.active.pop(designation, None)
+
+
+if __name__ == "__main__":
+    import csv
+
+    with open('test.csv', 'r', newline='') as f:
+        reader = csv.reader(f)
+        table = CometTable.fromRows(next(reader), reader)
+
+    registry = ColumnarCometRegistry(table)
+    print(f"{len(registry)} comets, {len(registry.activeComets())} active")
+
+    for comet in registry.activeComets():
+        print(f"{comet.getFriendlyName()}: {comet.mag1davg} last observed {comet.lastobs}")
@@ -0,0 +1,166 @@
+import signal
+import threading
+import time
+from datetime import datetime
+from typing import Callable, List
+
+from CometDiscovery import (build_summary_embed, count_events, create_designation_probe, create_outbox,
+                            create_resolution_cache, create_response_cache, create_subscribers, create_transport,
+                            drain_outbox, notify_discoveries, notify_magnitude_changes, write_metrics)
+from CometList import OBS_FORMAT, CometList
+from CometStorage import CometStorage
+from Discord import Discord
+from Metrics import Metrics
+from QueryService import QueryService
+from RefreshScheduler import RefreshScheduler
+
+
+class ScheduledTask:
+    def __init__(self, name: str, interval: float, action: Callable[[], None]):
+        self.name = name
+        self.interval = interval
+        self.action = action
+        self.nextRun = time.monotonic()
+
+
+class Daemon:
+    """Keeps the comet list and HTTP clients warm between checks.
+
+    Discovery, observation refresh, outbox delivery, summaries and state
+    checkpoints each run on their own interval (in seconds, 0 disables a
+    task).  Discovery and refresh only record notifications in the outbox,
+    so a slow or unavailable webhook never holds them up.  SIGINT and SIGTERM
+    stop the loop after the running task finishes, and the state is saved one
+    last time on the way out.  Metrics accumulate over the life of the
+    daemon, each task is a phase, and the reports are rewritten after every
+    task.  With a QueryService, a new snapshot is published after each
+    discovery and refresh.
+    """
+
+    def __init__(self, storage: CometStorage, discoveryInterval: float, refreshInterval: float, summaryInterval: float, checkpointInterval: float, drainInterval: float = 60, sendSummary: bool = True, refreshScheduler: RefreshScheduler = None, metrics: Metrics = None, metricsJson: str = None, metricsPrometheus: str = None, columnar: bool = False, queryService: QueryService = None, observationFormat: str = OBS_FORMAT):
+        self.storage = storage
+        self.sendSummary = sendSummary
+        self.stopEvent = threading.Event()
+        self.metrics = metrics or Metrics()
+        self.metricsJson = metricsJson
+        self.metricsPrometheus = metricsPrometheus
+        self.queryService = queryService
+
+        self.transport = create_transport(self.metrics)
+        self.designationProbe = create_designation_probe()
+        self.outbox = create_outbox()
+        self.resolutionCache = create_resolution_cache()
+        self.cometList = CometList(create_response_cache(self.metrics), self.transport, refreshScheduler, self.designationProbe, self.metrics, columnar, self.resolutionCache, observationFormat)
+        self.subscribers = create_subscribers(self.transport)
+        # Summaries still go to DISCORD_WEBHOOK_URL alone
+        self.discord = Discord(transport=self.transport)
+
+        self.cometList.load(storage)
+        print(f"Loaded {len(self.cometList.registry)} previously known comets")
+        self.publish()
+
+        tasks = [
+            ScheduledTask('discovery', discoveryInterval, self.discover),
+            ScheduledTask('refresh', refreshInterval, self.refresh),
+            ScheduledTask('outbox', drainInterval, self.drain),
+            ScheduledTask('summary', summaryInterval, self.summarize),
+            ScheduledTask('checkpoint', checkpointInterval, self.checkpoint)
+        ]
+        self.tasks: List[ScheduledTask] = [t for t in tasks if t.interval and t.interval > 0]
+
+        # The first summary and checkpoint wait a full interval, there is nothing new to report yet
+        for task in self.tasks:
+            if task.name in ('summary', 'checkpoint'):
+                task.nextRun += task.interval
+
+    def run(self):
+        signal.signal(signal.SIGINT, self.handleSignal)
+        signal.signal(signal.SIGTERM, self.handleSignal)
+
+        print(f"Daemon started at {datetime.now()} with tasks: {', '.join(f'{t.name} every {t.interval:.0f}s' for t in self.tasks)}")
+
+        try:
+            while not self.stopEvent.is_set() and self.tasks:
+                task = min(self.tasks, key=lambda t: t.nextRun)
+                wait = task.nextRun - time.monotonic()
+
+                if wait > 0 and self.stopEvent.wait(wait):
+                    break
+
+                self.runTask(task)
+        finally:
+            self.shutdown()
+
+    def runTask(self, task: ScheduledTask):
+        start = time.monotonic()
+        print(f"Running {task.name} at {datetime.now()}")
+
+        try:
+            with self.metrics.phase(task.name):
+                task.action()
+        except Exception as ex:
+            print(f"Error running {task.name}: {ex}")
+            self.metrics.increment('task_errors', task=task.name)
+
+        print(f"Finished {task.name} in {time.monotonic() - start:.1f}s")
+        write_metrics(self.metrics, self.metricsJson, self.metricsPrometheus)
+
+        # Schedule from the start time so a slow task does not drift the interval
+        task.nextRun = max(start + task.interval, time.monotonic())
+
+    def stop(self):
+        self.stopEvent.set()
+
+    def handleSignal(self, signum, frame):
+        print(f"Received signal {signum}, shutting down")
+        self.stop()
+
+    def discover(self):
+        self.cometList.clearEvents()
+        self.cometList.loadRecentComets()
+        print(f"Found {len(self.cometList.added)} new comets")
+        print(f"Updated {len(self.cometList.updated)} comets")
+        self.designationProbe.negativeCache.save()
+
+        notify_discoveries(self.cometList, self.outbox, self.subscribers)
+        count_events(self.cometList, self.metrics)
+        self.publish()
+
+    def refresh(self):
+        self.cometList.clearEvents()
+        self.cometList.updateObservationData()
+
+        notify_magnitude_changes(self.cometList, self.outbox, self.subscribers)
+        count_events(self.cometList, self.metrics)
+        self.publish()
+
+    def drain(self):
+        drain_outbox(self.outbox, self.subscribers, self.metrics)
+
+    def publish(self):
+        if not self.queryService:
+            return
+
+        with self.metrics.span('snapshot_publish'):
+            snapshot = self.queryService.publish(self.cometList.comets)
+        self.metrics.setGauge('snapshot_comets', len(snapshot))
+
+    def summarize(self):
+        embed = build_summary_embed(self.cometList)
+
+        if self.sendSummary:
+            self.discord.SendEmbed(embed)
+        else:
+            print(embed)
+
+    def checkpoint(self):
+        self.cometList.save(self.storage)
+
+    def shutdown(self):
+        print("Saving state before exit")
+        self.checkpoint()
+        self.outbox.close()
+        self.resolutionCache.close()
+        self.transport.close()
+        if self.queryService:
+            self.queryService.stop()
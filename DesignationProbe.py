@@ -0,0 +1,207 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Dict, Iterable, List, Set
+
+if TYPE_CHECKING:
+    from MinorPlanetaryCenter import DesignationIdentifierApi, DesignationInfo
+
+# Comet prefixes probed for each half-month.  Provisional comet numbers are
+# shared between prefixes, so each index is tried with every one of them
+PREFIXES = ['C/', 'P/']
+
+
+class NegativeDesignationCache:
+    """Designations MPC reported as not found, remembered until they expire.
+
+    New comets take the next free index in a half-month, so entries expire
+    after ttl seconds and the designation is probed again.  With a filePath
+    the cache is kept between runs as a small JSON file.
+    """
+
+    def __init__(self, filePath: str = None, ttl: float = 3 * 60 * 60):
+        self.filePath = filePath
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        # designation -> epoch seconds when the entry expires
+        self.expires: Dict[str, float] = {}
+
+        if filePath:
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.filePath, 'r') as f:
+                self.expires = json.load(f)
+        except FileNotFoundError:
+            self.expires = {}
+        except (OSError, ValueError) as e:
+            print(f"Error loading negative designation cache: {e}")
+            self.expires = {}
+
+        self.prune()
+
+    def save(self):
+        if not self.filePath:
+            return
+
+        self.prune()
+
+        directory = os.path.dirname(self.filePath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tempPath = f"{self.filePath}.tmp"
+
+        with self.lock:
+            with open(tempPath, 'w') as f:
+                json.dump(self.expires, f)
+
+        os.replace(tempPath, self.filePath)
+
+    def prune(self):
+        now = time.time()
+
+        with self.lock:
+            self.expires = { designation: expires for designation, expires in self.expires.items() if expires > now }
+
+    def contains(self, designation: str) -> bool:
+        expires = self.expires.get(designation)
+        return expires is not None and expires > time.time()
+
+    def add(self, designations: Iterable[str]):
+        expires = time.time() + self.ttl
+
+        with self.lock:
+            for designation in designations:
+                self.expires[designation] = expires
+
+    def __len__(self) -> int:
+        return len(self.expires)
+
+
+class HalfMonthProbe:
+    def __init__(self, year: int, letter: str):
+        self.year = year
+        self.letter = letter
+        self.nextIndex = 1
+        self.misses = 0
+
+    def designations(self, index: int, prefixes: List[str]) -> List[str]:
+        return [f"{prefix}{self.year} {self.letter}{index}" for prefix in prefixes]
+
+
+class DesignationProbe:
+    """Finds the comets designated in recent half-months.
+
+    Indices are probed in growing batches, one queryMultiple call per round
+    for every half-month still open, until missLimit consecutive indices come
+    back empty.  Designations already known are counted as hits without
+    being looked up, and not-found designations are kept in a negative cache
+    so they are not asked about again until the entry expires.  The api
+    passed to probe() should not cache its replies, or an expired entry
+    would be answered with the same not found reply instead of asking MPC.
+    """
+
+    def __init__(self, negativeCache: NegativeDesignationCache = None, prefixes: List[str] = None, halfMonths: int = 2, missLimit: int = 3, initialBatch: int = 4, maxBatch: int = 32, maxIndex: int = 250):
+        self.negativeCache = negativeCache if negativeCache is not None else NegativeDesignationCache()
+        self.prefixes = prefixes or PREFIXES
+        self.halfMonths = halfMonths
+        self.missLimit = missLimit
+        self.initialBatch = initialBatch
+        self.maxBatch = maxBatch
+        self.maxIndex = maxIndex
+        # Lookups made by the last probe, for logging
+        self.queried = 0
+        self.skipped = 0
+
+    def recentHalfMonths(self, now: datetime) -> List[HalfMonthProbe]:
+        from MinorPlanetaryCenter import DesignationBuilder
+
+        designationBuilder = DesignationBuilder()
+        probes = []
+
+        # Step back 15 days at a time, the same way the fixed range used to
+        forDate = now
+        for _ in range(self.halfMonths):
+            probe = HalfMonthProbe(forDate.year, designationBuilder.GetMonthDesignation(forDate))
+            if not any(p.year == probe.year and p.letter == probe.letter for p in probes):
+                probes.append(probe)
+            forDate -= timedelta(days=15)
+
+        return probes
+
+    def probe(self, api: 'DesignationIdentifierApi', knownDesignations: Set[str], now: datetime = None) -> List['DesignationInfo']:
+        """Return the comets found in recent half-months, apart from the known designations."""
+        now = now or datetime.now(timezone.utc)
+        self.queried = 0
+        self.skipped = 0
+
+        openProbes = self.recentHalfMonths(now)
+        batch = self.initialBatch
+        found: Dict[str, 'DesignationInfo'] = {}
+
+        while openProbes:
+            # The indices each half-month probes this round, and the designations to look up
+            rounds = []
+            lookups = []
+
+            for halfMonth in openProbes:
+                indices = range(halfMonth.nextIndex, min(halfMonth.nextIndex + batch, self.maxIndex + 1))
+                rounds.append((halfMonth, indices))
+
+                for index in indices:
+                    for designation in halfMonth.designations(index, self.prefixes):
+                        if designation in knownDesignations:
+                            continue
+                        if self.negativeCache.contains(designation):
+                            self.skipped += 1
+                            continue
+                        lookups.append(designation)
+
+            results = {}
+            if lookups:
+                try:
+                    results = api.queryMultipleById(lookups)
+                except Exception as e:
+                    print(f"Error probing designations: {e}")
+                    return list(found.values())
+
+                self.queried += len(lookups)
+                self.negativeCache.add(designation for designation in lookups if not results.get(designation) or not results[designation].found)
+
+            for halfMonth, indices in rounds:
+                for index in indices:
+                    hit = False
+
+                    for designation in halfMonth.designations(index, self.prefixes):
+                        info = results.get(designation)
+
+                        if designation in knownDesignations:
+                            hit = True
+                        elif info is not None and info.found:
+                            hit = True
+                            found.setdefault(info.designation or designation, info)
+
+                    halfMonth.misses = 0 if hit else halfMonth.misses + 1
+
+                halfMonth.nextIndex = indices.stop
+
+            openProbes = [p for p in openProbes if p.misses < self.missLimit and p.nextIndex <= self.maxIndex]
+            batch = min(batch * 2, self.maxBatch)
+
+        return list(found.values())
+
+
+if __name__ == "__main__":
+    from MinorPlanetaryCenter import DesignationIdentifierApi
+
+    probe = DesignationProbe()
+    comets = probe.probe(DesignationIdentifierApi(), set())
+
+    for info in comets:
+        print(f"{info.designation} {info.name or ''}")
+
+    print(f"{probe.queried} lookups, {probe.skipped} skipped from the negative cache")
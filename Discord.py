@@ -1,27 +1,159 @@
 import os
+import time
+from typing import List
+
 import requests
 from dotenv import load_dotenv
+from HttpTransport import HttpTransport
+
 
 class Discord:
+    """Sends embeds to a Discord webhook.
+
+    Embeds added with QueueEmbed are packed into as few webhook posts as
+    Discord allows when Flush is called.  Rate limits are honoured through
+    the Retry-After and X-RateLimit-* headers, and posts go through the
+    shared pooled transport.
+    """
+    # Webhook limits on the number of embeds per message and their combined text
+    MAX_EMBEDS_PER_MESSAGE = 10
+    MAX_EMBED_CHARACTERS = 6000
+
+    def __init__(self, webhookUrl: str = None, transport: HttpTransport = None, maxRetries: int = 5):
+        self.DISCORD_WEBHOOK_URL = webhookUrl or os.getenv('DISCORD_WEBHOOK_URL')
+        self.transport = transport or HttpTransport()
+        self.maxRetries = maxRetries
+        self.queue: List[dict] = []
+        self.failed: List[dict] = []
+        # Earliest time the next post may go out, from the rate limit headers
+        self.nextPostAt = 0.0
 
-    def __init__(self):
-        self.DISCORD_WEBHOOK_URL = os.getenv('DISCORD_WEBHOOK_URL')
+    def isConfigured(self) -> bool:
+        return bool(self.DISCORD_WEBHOOK_URL) and self.DISCORD_WEBHOOK_URL != "YOUR_DISCORD_WEBHOOK_URL_HERE"
 
     def SendEmbed(self, embed: dict):
-        if not self.DISCORD_WEBHOOK_URL or self.DISCORD_WEBHOOK_URL == "YOUR_DISCORD_WEBHOOK_URL_HERE":
+        self.QueueEmbed(embed)
+        self.Flush()
+
+    def QueueEmbed(self, embed: dict):
+        self.queue.append(embed)
+
+    def Flush(self) -> int:
+        """Post every queued embed, returning how many were delivered."""
+        if not self.isConfigured():
             print("DISCORD_WEBHOOK_URL not set")
-            return
+            self.queue = []
+            return 0
+
+        sent = 0
+        for batch in self.batches(self.queue):
+            if self.post(batch):
+                sent += len(batch)
+            else:
+                self.failed.extend(batch)
+
+        self.queue = []
+        return sent
+
+    def batches(self, embeds: List[dict]) -> List[List[dict]]:
+        batches = []
+        current = []
+        currentSize = 0
+
+        for embed in embeds:
+            size = self.embedSize(embed)
+
+            if current and (len(current) >= self.MAX_EMBEDS_PER_MESSAGE or currentSize + size > self.MAX_EMBED_CHARACTERS):
+                batches.append(current)
+                current = []
+                currentSize = 0
+
+            current.append(embed)
+            currentSize += size
+
+        if current:
+            batches.append(current)
+
+        return batches
+
+    def embedSize(self, embed: dict) -> int:
+        size = len(embed.get('title', '')) + len(embed.get('description', ''))
+        size += len(embed.get('footer', {}).get('text', '')) + len(embed.get('author', {}).get('name', ''))
+
+        for field in embed.get('fields', []):
+            size += len(str(field.get('name', ''))) + len(str(field.get('value', '')))
 
+        return size
+
+    def post(self, embeds: List[dict]) -> bool:
         webhook_data = {
-            "embeds": [embed]
+            "embeds": embeds
         }
-        
+
+        for attempt in range(self.maxRetries + 1):
+            self.waitForRateLimit()
+
+            try:
+                # Retries are handled here, where the rate limit headers are understood
+                response = self.transport.post(self.DISCORD_WEBHOOK_URL, json=webhook_data, timeout=10, retries=0)
+            except requests.RequestException as e:
+                print(f"Error sending Discord notification: {e}")
+                time.sleep(min(2 ** attempt, 30))
+                continue
+
+            self.updateRateLimit(response)
+
+            if response.status_code == 429:
+                retryAfter = self.getRetryAfter(response)
+                print(f"Discord rate limit hit, retrying in {retryAfter:.1f}s")
+                self.nextPostAt = max(self.nextPostAt, time.monotonic() + retryAfter)
+                continue
+
+            if response.status_code >= 500:
+                print(f"Discord returned {response.status_code}, retrying")
+                time.sleep(min(2 ** attempt, 30))
+                continue
+
+            try:
+                response.raise_for_status()
+            except requests.RequestException as e:
+                print(f"Error sending Discord notification: {e}")
+                return False
+
+            print(f"Discord notification sent with {len(embeds)} embed(s)")
+            return True
+
+        print(f"Giving up on Discord notification with {len(embeds)} embed(s) after {self.maxRetries + 1} attempts")
+        return False
+
+    def waitForRateLimit(self):
+        wait = self.nextPostAt - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+
+    def updateRateLimit(self, response: requests.Response):
+        # When the bucket is empty, hold the next post until it resets
+        if response.headers.get('X-RateLimit-Remaining') == '0':
+            resetAfter = self.getFloat(response.headers.get('X-RateLimit-Reset-After'))
+            if resetAfter:
+                self.nextPostAt = max(self.nextPostAt, time.monotonic() + resetAfter)
+
+    def getRetryAfter(self, response: requests.Response) -> float:
+        retryAfter = self.getFloat(response.headers.get('Retry-After'))
+
+        if retryAfter is None:
+            try:
+                retryAfter = self.getFloat(response.json().get('retry_after'))
+            except ValueError:
+                retryAfter = None
+
+        return retryAfter if retryAfter is not None else 1.0
+
+    def getFloat(self, val) -> float:
         try:
-            response = requests.post(self.DISCORD_WEBHOOK_URL, json=webhook_data, timeout=10)
-            response.raise_for_status()
-            print("Discord notification sent")
-        except requests.RequestException as e:
-            print(f"Error sending Discord notification: {e}")
+            return float(val)
+        except (TypeError, ValueError):
+            return None
 
 if __name__ == "__main__":
     load_dotenv()
@@ -42,8 +174,8 @@ if __name__ == "__main__":
 
         ],
         "color": 0x0000FF
-    }   
+    }
     test.SendEmbed(embed)
-    
+
 
 
@@ -0,0 +1,147 @@
+import random
+import threading
+import time
+from typing import TYPE_CHECKING, Dict
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+if TYPE_CHECKING:
+    from Metrics import Metrics
+
+
+class HostCounters:
+    def __init__(self):
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0
+        self.bytesReceived = 0
+        self.seconds = 0.0
+        self.statuses: Dict[int, int] = {}
+
+    def toDict(self) -> dict:
+        return {
+            'requests': self.requests,
+            'retries': self.retries,
+            'errors': self.errors,
+            'bytesReceived': self.bytesReceived,
+            'seconds': round(self.seconds, 3),
+            'statuses': dict(self.statuses)
+        }
+
+
+class HttpTransport:
+    """One pooled HTTP session shared by the MPC and Discord clients.
+
+    Connections are kept alive between requests, compressed responses are
+    requested, every request gets a timeout, and connection errors and 5xx
+    responses are retried with jittered exponential backoff.  Per-host
+    counters are kept for reporting, and every attempt is also recorded as
+    an 'http' span when a Metrics instance is given.
+    """
+
+    def __init__(self, timeout: tuple = (5, 60), maxRetries: int = 3, backoff: float = 0.5, poolSize: int = 10, metrics: 'Metrics' = None):
+        self.timeout = timeout
+        self.maxRetries = maxRetries
+        self.backoff = backoff
+        self.metrics = metrics
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=poolSize, pool_maxsize=poolSize)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers['Accept-Encoding'] = 'gzip, deflate'
+
+        self.counters: Dict[str, HostCounters] = {}
+        self.lock = threading.Lock()
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def request(self, method: str, url: str, retries: int = None, **kwargs) -> requests.Response:
+        """Send a request, retrying connection errors and 5xx responses.
+
+        retries overrides maxRetries for this call; pass 0 when the caller
+        does its own retrying.
+        """
+        retries = self.maxRetries if retries is None else retries
+        kwargs.setdefault('timeout', self.timeout)
+        host = urlsplit(url).netloc
+
+        for attempt in range(retries + 1):
+            if attempt > 0:
+                self.count(host, retryCount=1)
+                self.sleepBackoff(attempt)
+
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self.count(host, requestCount=1, errorCount=1, seconds=time.perf_counter() - start, method=method)
+                if attempt >= retries:
+                    raise
+                continue
+
+            self.count(host,
+                       requestCount=1,
+                       seconds=time.perf_counter() - start,
+                       bytesReceived=self.responseSize(response, kwargs.get('stream', False)),
+                       status=response.status_code,
+                       method=method)
+
+            if response.status_code >= 500 and attempt < retries:
+                response.close()
+                continue
+
+            return response
+
+    def responseSize(self, response: requests.Response, stream: bool) -> int:
+        # Reading the body of a streamed response here would defeat streaming
+        if stream:
+            return int(response.headers.get('Content-Length', 0) or 0)
+        return len(response.content)
+
+    def sleepBackoff(self, attempt: int):
+        # Full jitter keeps concurrent workers from retrying in lockstep
+        time.sleep(random.uniform(0, self.backoff * (2 ** (attempt - 1))))
+
+    def count(self, host: str, requestCount: int = 0, retryCount: int = 0, errorCount: int = 0, seconds: float = 0.0, bytesReceived: int = 0, status: int = None, method: str = None):
+        with self.lock:
+            counters = self.counters.setdefault(host, HostCounters())
+            counters.requests += requestCount
+            counters.retries += retryCount
+            counters.errors += errorCount
+            counters.seconds += seconds
+            counters.bytesReceived += bytesReceived
+            if status is not None:
+                counters.statuses[status] = counters.statuses.get(status, 0) + 1
+
+        if self.metrics:
+            if requestCount:
+                self.metrics.record('http', seconds, host=host, method=method)
+                self.metrics.increment('http_requests', requestCount, host=host, status=status if status is not None else 'error')
+            if retryCount:
+                self.metrics.increment('http_retries', retryCount, host=host)
+            if errorCount:
+                self.metrics.increment('http_errors', errorCount, host=host)
+            if bytesReceived:
+                self.metrics.increment('http_received_bytes', bytesReceived, host=host)
+
+    def stats(self) -> Dict[str, dict]:
+        with self.lock:
+            return { host: counters.toDict() for host, counters in self.counters.items() }
+
+    def close(self):
+        self.session.close()
+
+
+if __name__ == "__main__":
+    transport = HttpTransport()
+
+    response = transport.get('https://data.minorplanetcenter.net/api/query-identifier', data='C/2025 A6')
+    print(response.status_code)
+    print(transport.stats())
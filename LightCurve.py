@@ -0,0 +1,267 @@
+import base64
+import struct
+import zlib
+from bisect import bisect_left, insort
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Sequence, Set, Tuple
+
+# Rolling windows in days, 1 and 2 feed mag1davg and mag2davg
+WINDOWS = (1, 2, 7)
+
+# Bumped whenever the encoded layout changes
+ENCODING_VERSION = 2
+NAN = float('nan')
+
+
+def sampleKey(obstime: float, stn: str) -> Tuple[int, str]:
+    """An observation's identity, its time to the millisecond and its station."""
+    return round(obstime * 1000), stn or ''
+
+
+class RollingWindow:
+    """Magnitudes observed within the last days of a comet's latest observation.
+
+    Samples are kept sorted by observation time as (obstime, stn, mag), so
+    one reported late goes in at its own place.  They leave from the front
+    only once they are older than the window, with a running total so the
+    mean costs nothing to read.
+    """
+    __slots__ = ('days', 'seconds', 'samples', 'total')
+
+    def __init__(self, days: float):
+        self.days = days
+        self.seconds = days * 86400
+        self.samples: List[Tuple[float, str, float]] = []
+        self.total = 0.0
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def add(self, obstime: float, stn: str, mag: float):
+        insort(self.samples, (obstime, stn, mag))
+        self.total += mag
+
+    def evict(self, latest: float) -> List[Tuple[float, str, float]]:
+        """Drop the samples older than the window, returning them."""
+        samples = self.samples
+        count = bisect_left(samples, (latest - self.seconds,))
+
+        if not count:
+            return []
+
+        evicted = samples[:count]
+        del samples[:count]
+
+        if samples:
+            self.total -= sum(mag for _, _, mag in evicted)
+        else:
+            # Start clean rather than carry rounding left over from the removals
+            self.total = 0.0
+
+        return evicted
+
+    def mean(self) -> float:
+        if not self.samples:
+            return NAN
+        return round(self.total / len(self.samples), 2)
+
+    def trend(self) -> float:
+        """Least squares slope in magnitudes per day, negative while brightening."""
+        count = len(self.samples)
+        if count < 2:
+            return NAN
+
+        origin = self.samples[0][0]
+        days = [(obstime - origin) / 86400 for obstime, _, _ in self.samples]
+        meanDay = sum(days) / count
+        meanMag = self.total / count
+
+        spread = sum((day - meanDay) ** 2 for day in days)
+        if spread == 0:
+            return NAN
+
+        return sum((day - meanDay) * (mag - meanMag) for day, (_, _, mag) in zip(days, self.samples)) / spread
+
+
+class LightCurve:
+    """Per-comet rolling magnitude windows that are updated incrementally.
+
+    Each update only looks at observations within the widest window, so it
+    costs the number of recent observations rather than the whole history.
+    Observations MPC receives late are taken in as long as they still fall
+    within it, each observation counting once by its time and station.  The
+    windows are measured back from the latest observation, with or without
+    a magnitude, the same as the averages MagnitudeAnalysis computes from
+    the full set.  encode() stores only the widest window, the narrower
+    ones are rebuilt from it by decode().
+    """
+
+    def __init__(self, windows: Iterable[float] = WINDOWS):
+        self.lastobs: float = None
+        self.windows: Dict[float, RollingWindow] = { days: RollingWindow(days) for days in sorted(set(windows)) }
+        self.widest = self.windows[max(self.windows)]
+        # Keys of the samples in the widest window, the narrower ones hold a subset
+        self.keys: Set[Tuple[int, str]] = set()
+
+    def since(self) -> float:
+        """The earliest observation time that can still reach a window, None before any update."""
+        if self.lastobs is None:
+            return None
+        return self.lastobs - self.widest.seconds
+
+    def update(self, obstimes: Sequence[float], mags: Sequence[float], stations: Sequence[str] = None) -> int:
+        """Take in observations as UTC epoch seconds, magnitudes (NaN if
+        missing) and station codes.
+
+        Observations already taken in, or older than the widest window, are
+        ignored.  Returns how many were new.
+        """
+        if stations is None:
+            stations = [''] * len(obstimes)
+
+        lastobs = self.lastobs
+        latest = max(obstimes, default=None)
+        if latest is not None and lastobs is not None:
+            latest = max(latest, lastobs)
+
+        if latest is None:
+            return 0
+
+        since = latest - self.widest.seconds
+        windows = list(self.windows.values())
+        keys = self.keys
+        new = 0
+
+        for obstime, mag, stn in zip(obstimes, mags, stations):
+            if mag != mag:
+                # Without a magnitude an observation only moves the windows along
+                if lastobs is None or obstime > lastobs:
+                    new += 1
+                continue
+
+            if obstime < since:
+                continue
+
+            key = sampleKey(obstime, stn)
+            if key in keys:
+                continue
+
+            keys.add(key)
+            new += 1
+            for window in windows:
+                window.add(obstime, stn or '', mag)
+
+        self.lastobs = latest
+        for window in windows:
+            evicted = window.evict(latest)
+            if window is self.widest:
+                keys.difference_update(sampleKey(obstime, stn) for obstime, stn, _ in evicted)
+
+        return new
+
+    def mean(self, days: float) -> float:
+        return self.windows[days].mean()
+
+    def trend(self, days: float) -> float:
+        return self.windows[days].trend()
+
+    def lastObservation(self) -> datetime:
+        if self.lastobs is None:
+            return None
+        return datetime.fromtimestamp(self.lastobs, tz=timezone.utc)
+
+    def samples(self) -> Tuple[Tuple[float, str, float], ...]:
+        return tuple(self.widest.samples)
+
+    def encode(self) -> str:
+        """Compact text for the comet record: the latest observation time as a
+        double, then each sample of the widest window as uint32 milliseconds
+        before it, a float32 magnitude and a 3 character station code,
+        deflated and base64 encoded.
+        """
+        if self.lastobs is None:
+            return ''
+
+        latest = round(self.lastobs * 1000)
+        values = []
+        for obstime, stn, mag in self.widest.samples:
+            values.append(latest - round(obstime * 1000))
+            values.append(mag)
+            values.append(stn.encode('ascii', 'replace')[:3])
+
+        packed = struct.pack('<Bd' + 'If3s' * len(self.widest.samples), ENCODING_VERSION, self.lastobs, *values)
+        return base64.b64encode(zlib.compress(packed)).decode('ascii')
+
+    @staticmethod
+    def sampleCount(text: str) -> int:
+        """How many observations an encode() text holds, without rebuilding
+        the curve.  None for blank or unreadable text, or another layout.
+        """
+        if not text:
+            return None
+
+        try:
+            packed = zlib.decompress(base64.b64decode(text))
+            version, _ = struct.unpack_from('<Bd', packed)
+        except (ValueError, zlib.error, struct.error):
+            return None
+
+        if version != ENCODING_VERSION:
+            return None
+
+        return (len(packed) - struct.calcsize('<Bd')) // struct.calcsize('<If3s')
+
+    @classmethod
+    def decode(cls, text: str, windows: Iterable[float] = WINDOWS) -> 'LightCurve':
+        """Rebuild a light curve from encode(), an empty one for blank or unreadable text.
+
+        Curves stored in an older layout come back empty too, they are
+        rebuilt from the next observations fetched.
+        """
+        curve = cls(windows)
+
+        if not text:
+            return curve
+
+        try:
+            packed = zlib.decompress(base64.b64decode(text))
+            version, lastobs = struct.unpack_from('<Bd', packed)
+        except (ValueError, zlib.error, struct.error) as e:
+            print(f"Ignoring unreadable light curve: {e}")
+            return curve
+
+        if version < ENCODING_VERSION:
+            return curve
+
+        if version != ENCODING_VERSION:
+            print(f"Ignoring light curve stored with unknown version {version}")
+            return curve
+
+        offset = struct.calcsize('<Bd')
+        sample = struct.Struct('<If3s')
+        latest = round(lastobs * 1000)
+        obstimes, mags, stations = [], [], []
+
+        for age, mag, stn in sample.iter_unpack(packed[offset:offset + (len(packed) - offset) // sample.size * sample.size]):
+            obstimes.append((latest - age) / 1000)
+            mags.append(mag)
+            stations.append(stn.rstrip(b'\0').decode('ascii'))
+
+        curve.lastobs = lastobs
+        curve.update(obstimes, mags, stations)
+
+        return curve
+
+
+if __name__ == "__main__":
+    start = datetime(2025, 10, 1, tzinfo=timezone.utc).timestamp()
+
+    curve = LightCurve()
+    print(f"{curve.update([start + hour * 3600 for hour in range(0, 240, 6)], [12 - hour / 60 for hour in range(0, 240, 6)])} new observations")
+    print(f"1 day {curve.mean(1)}, 2 day {curve.mean(2)}, 7 day {curve.mean(7)}, trend {curve.trend(7):.2f} mag/day")
+
+    text = curve.encode()
+    restored = LightCurve.decode(text)
+    print(f"{len(text)} characters stored, restored 2 day {restored.mean(2)} last observed {restored.lastObservation()}")
+    print(f"{restored.update([start + 240 * 3600], [7.5])} new, 1 day now {restored.mean(1)}")
+    print(f"{restored.update([start + 230 * 3600, start + 230 * 3600], [7.9, 7.9], ['T05', 'T05'])} reported late, 1 day now {restored.mean(1)}")
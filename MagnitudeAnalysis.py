@@ -0,0 +1,101 @@
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def aggregateMagnitudes(obs: pd.DataFrame) -> pd.DataFrame:
+    """Per-comet last observation and 1/2 day mean magnitudes in one grouped pass.
+
+    obs holds the observations of every comet with designation, obstime (UTC)
+    and mag columns.  The windows are measured back from each comet's own last
+    observation.  Returns a frame indexed by designation with lastobs,
+    mag1davg and mag2davg columns.
+
+    The refresh keeps its averages in light curves instead, this full-history
+    pass is the reference they are checked against.
+    """
+    # Work on naive UTC datetime64 values so the window arithmetic stays vectorized
+    obstime = pd.to_datetime(obs['obstime'], utc=True).dt.tz_localize(None)
+    mags = pd.to_numeric(obs['mag'], errors='coerce')
+
+    lastObservation = obstime.groupby(obs['designation'], sort=False).max().dt.floor('s')
+    age = lastObservation.reindex(obs['designation']).to_numpy() - obstime.to_numpy()
+
+    windows = pd.DataFrame({
+        'designation': obs['designation'].to_numpy(),
+        'mag2': mags.where(age <= np.timedelta64(2, 'D')).to_numpy(),
+        'mag1': mags.where(age <= np.timedelta64(1, 'D')).to_numpy()
+    })
+
+    grouped = windows.groupby('designation', sort=False)
+
+    result = pd.DataFrame({
+        'lastobs': lastObservation.dt.tz_localize('UTC'),
+        'mag2davg': grouped['mag2'].mean().round(2),
+        'mag1davg': grouped['mag1'].mean().round(2)
+    })
+
+    return result
+
+
+def evaluateMagnitudes(frame: pd.DataFrame, thresholds: List[Tuple[str, float]], suddenIncrease: float) -> pd.DataFrame:
+    """Compare new averages against the prior values as whole-array operations.
+
+    frame holds lastobs, mag1davg and mag2davg, from aggregateMagnitudes or
+    the comets' light curves, plus priorLastobs, priorMag1davg and
+    priorMag2davg.  thresholds is a list of (label, magnitude) pairs checked
+    in order; the first one crossed wins.  Adds
+    isNew, mag1delta, mag2delta, threshold and suddenIncrease columns.
+
+    A row is new when lastobs moved past priorLastobs, or, when frame has a
+    newObservations column, when that count is above zero, so observations
+    reported late count even though they leave lastobs where it was.
+    """
+    new2 = frame['mag2davg'].to_numpy(dtype='float64')
+    new1 = frame['mag1davg'].to_numpy(dtype='float64')
+    prior2 = frame['priorMag2davg'].to_numpy(dtype='float64')
+    prior1 = frame['priorMag1davg'].to_numpy(dtype='float64')
+
+    priorLastobs = frame['priorLastobs']
+    if 'newObservations' in frame:
+        isNew = (priorLastobs.isna() | (frame['newObservations'] > 0)).to_numpy()
+    else:
+        isNew = (priorLastobs.isna() | (frame['lastobs'] > priorLastobs)).to_numpy()
+
+    # A missing or zero prior magnitude means there is nothing to compare against
+    hasPrior2 = ~np.isnan(prior2) & (prior2 != 0)
+    hasPrior1 = ~np.isnan(prior1) & (prior1 != 0)
+    hasNew2 = ~np.isnan(new2) & (new2 != 0)
+
+    mag2delta = np.where(hasPrior2, prior2 - new2, new2)
+    mag1delta = np.where(hasPrior1, prior1 - new1, new1)
+
+    with np.errstate(invalid='ignore'):
+        conditions = [hasPrior2 & hasNew2 & (prior2 > magnitude) & (new2 <= magnitude) for _, magnitude in thresholds]
+        # A first average has nothing to have brightened from
+        sudden = hasPrior2 & (mag2delta >= suddenIncrease)
+
+    result = frame.copy()
+    result['isNew'] = isNew
+    result['mag2delta'] = mag2delta
+    result['mag1delta'] = mag1delta
+    result['threshold'] = np.select(conditions, [label for label, _ in thresholds], default='') if thresholds else ''
+    result['suddenIncrease'] = sudden
+
+    return result
+
+
+if __name__ == "__main__":
+    obs = pd.DataFrame({
+        'designation': ['C/2025 A6', 'C/2025 A6', 'C/2025 A6', 'C/2025 K1'],
+        'obstime': pd.to_datetime(['2025-10-01T01:00:00Z', '2025-10-02T12:00:00Z', '2025-10-03T01:00:00Z', '2025-10-03T05:00:00Z'], utc=True),
+        'mag': ['11.2', '9.0', '7.6', '']
+    })
+
+    aggregated = aggregateMagnitudes(obs)
+    aggregated['priorLastobs'] = pd.to_datetime([None, None], utc=True)
+    aggregated['priorMag2davg'] = [9.0, None]
+    aggregated['priorMag1davg'] = [9.0, None]
+
+    print(evaluateMagnitudes(aggregated, [('binoc', 8)], 1.5))
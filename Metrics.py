@@ -0,0 +1,219 @@
+import io
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Tuple
+
+# Every Prometheus metric name starts with this
+PREFIX = 'comet'
+
+
+class SpanStats:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.maxSeconds = 0.0
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        self.maxSeconds = max(self.maxSeconds, seconds)
+
+    def toDict(self) -> dict:
+        return {
+            'count': self.count,
+            'seconds': round(self.seconds, 6),
+            'maxSeconds': round(self.maxSeconds, 6)
+        }
+
+
+class Metrics:
+    """Timed spans and counters for one run, exported as JSON or Prometheus text.
+
+    Spans and counters are keyed by name plus optional labels, e.g.
+    span('http', host='data.minorplanetcenter.net').  With profile=True, spans
+    opened with profile=True (the top level phases) are also run under
+    cProfile and tracemalloc.  cProfile only sees the thread that opened the
+    span, so work done in worker threads shows up as waiting.
+    """
+
+    def __init__(self, profile: bool = False, profileDir: str = None, profileTop: int = 15):
+        self.profile = profile
+        self.profileDir = profileDir
+        self.profileTop = profileTop
+        self.started = datetime.now(timezone.utc)
+        self.lock = threading.Lock()
+
+        self.spans: Dict[Tuple[str, tuple], SpanStats] = {}
+        self.counters: Dict[Tuple[str, tuple], float] = {}
+        self.gauges: Dict[Tuple[str, tuple], float] = {}
+        self.profiles: Dict[str, dict] = {}
+        self.profiling = False
+
+    def key(self, name: str, labels: dict) -> Tuple[str, tuple]:
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def increment(self, name: str, value: float = 1, **labels):
+        key = self.key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def setGauge(self, name: str, value: float, **labels):
+        with self.lock:
+            self.gauges[self.key(name, labels)] = value
+
+    def record(self, name: str, seconds: float, **labels):
+        key = self.key(name, labels)
+        with self.lock:
+            self.spans.setdefault(key, SpanStats()).add(seconds)
+
+    def phase(self, name: str):
+        """Span for a top level phase of a run, the unit that gets profiled."""
+        return self.span('phase', profile=True, phase=name)
+
+    @contextmanager
+    def span(self, name: str, profile: bool = False, **labels):
+        # Profilers cannot nest, so only the outermost profiled span is captured
+        profiling = self.profile and profile and not self.profiling
+        if profiling:
+            self.startProfile()
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, **labels)
+            if profiling:
+                self.stopProfile(labels.get('phase', name))
+
+    def startProfile(self):
+        # The profilers are only imported when profiling was asked for
+        import cProfile
+        import tracemalloc
+
+        self.profiling = True
+        self.profiler = cProfile.Profile()
+        self.startedTracing = not tracemalloc.is_tracing()
+        if self.startedTracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        self.profiler.enable()
+
+    def stopProfile(self, name: str):
+        import pstats
+        import tracemalloc
+
+        self.profiler.disable()
+        current, peak = tracemalloc.get_traced_memory()
+        if self.startedTracing:
+            tracemalloc.stop()
+        self.profiling = False
+
+        output = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=output)
+        stats.sort_stats('cumulative').print_stats(self.profileTop)
+
+        profile = {
+            'peakBytes': peak,
+            'currentBytes': current,
+            'top': output.getvalue()
+        }
+
+        if self.profileDir:
+            os.makedirs(self.profileDir, exist_ok=True)
+            profile['path'] = os.path.join(self.profileDir, f"{name}.prof")
+            stats.dump_stats(profile['path'])
+
+        self.profiles[name] = profile
+        self.setGauge('phase_peak_bytes', peak, phase=name)
+
+    def toDict(self) -> dict:
+        with self.lock:
+            return {
+                'started': self.started.isoformat(),
+                'finished': datetime.now(timezone.utc).isoformat(),
+                'spans': [{ 'name': name, 'labels': dict(labels), **stats.toDict() } for (name, labels), stats in self.spans.items()],
+                'counters': [{ 'name': name, 'labels': dict(labels), 'value': value } for (name, labels), value in self.counters.items()],
+                'gauges': [{ 'name': name, 'labels': dict(labels), 'value': value } for (name, labels), value in self.gauges.items()],
+                'profiles': dict(self.profiles)
+            }
+
+    def toPrometheus(self) -> str:
+        lines = []
+
+        def labelText(labels: tuple) -> str:
+            if not labels:
+                return ''
+            return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels) + '}'
+
+        def number(value: float) -> str:
+            return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+        def escape(value: str) -> str:
+            return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+        def grouped(items: dict) -> Dict[str, list]:
+            groups = {}
+            for (name, labels), value in sorted(items.items()):
+                groups.setdefault(name, []).append((labels, value))
+            return groups
+
+        with self.lock:
+            spans = grouped(self.spans)
+            counters = grouped(self.counters)
+            gauges = grouped(self.gauges)
+
+        for name, series in spans.items():
+            metric = f"{PREFIX}_{name}_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            for labels, stats in series:
+                lines.append(f"{metric}_count{labelText(labels)} {stats.count}")
+                lines.append(f"{metric}_sum{labelText(labels)} {stats.seconds:.6f}")
+            lines.append(f"# TYPE {metric}_max gauge")
+            for labels, stats in series:
+                lines.append(f"{metric}_max{labelText(labels)} {stats.maxSeconds:.6f}")
+
+        for name, series in counters.items():
+            metric = f"{PREFIX}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for labels, value in series:
+                lines.append(f"{metric}{labelText(labels)} {number(value)}")
+
+        for name, series in gauges.items():
+            metric = f"{PREFIX}_{name}"
+            lines.append(f"# TYPE {metric} gauge")
+            for labels, value in series:
+                lines.append(f"{metric}{labelText(labels)} {number(value)}")
+
+        lines.append(f"# TYPE {PREFIX}_last_run_timestamp_seconds gauge")
+        lines.append(f"{PREFIX}_last_run_timestamp_seconds {time.time():.0f}")
+
+        return '\n'.join(lines) + '\n'
+
+    def writeJson(self, filePath: str):
+        self.writeFile(filePath, json.dumps(self.toDict(), indent=2))
+
+    def writePrometheus(self, filePath: str):
+        self.writeFile(filePath, self.toPrometheus())
+
+    def writeFile(self, filePath: str, content: str):
+        # The textfile collector may read at any moment, so swap in a complete file
+        tempPath = f"{filePath}.tmp"
+        with open(tempPath, 'w') as f:
+            f.write(content)
+        os.replace(tempPath, filePath)
+
+
+if __name__ == "__main__":
+    metrics = Metrics(profile=True)
+
+    with metrics.phase('demo'):
+        for host in ['data.minorplanetcenter.net', 'discord.com']:
+            with metrics.span('http', host=host):
+                time.sleep(0.01)
+            metrics.increment('http_requests', host=host, status=200)
+
+    print(metrics.toPrometheus())
@@ -1,8 +1,24 @@
 from datetime import datetime, timedelta
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Tuple
+import os
+import queue
+import threading
+import time
 import requests
 import json
-import pandas as pd
+from HttpTransport import HttpTransport
+from RateLimiter import RateLimiter
+from ResponseCache import ResponseCache
+
+if TYPE_CHECKING:
+    import pandas as pd
+    from ResolutionCache import ResolutionCache
+
+# Root of the MPC API, MPC_API_ROOT points the clients at another server such
+# as the benchmark stand-in
+MPC_API_ROOT = os.getenv('MPC_API_ROOT', 'https://data.minorplanetcenter.net/api').rstrip('/')
 
 class DesignationInfo:
     found: bool
@@ -72,52 +88,352 @@ class DesignationBuilder:
 
         return [f"C/{forDate.year} {month_designation}{index}" for index in range(startIndex, endIndex + 1)]
 
+# Designations per query-identifier request, requests in flight at once and
+# requests started per second after a first burst of one per worker
+IDENTIFIER_CHUNK_SIZE = 100
+IDENTIFIER_MAX_IN_FLIGHT = 4
+IDENTIFIER_REQUESTS_PER_SECOND = 2
+
 class DesignationIdentifierApi:
-    baseUrl = "https://data.minorplanetcenter.net/api/query-identifier"
+    baseUrl = f"{MPC_API_ROOT}/query-identifier"
+
+    def __init__(self, cache: ResponseCache = None, transport: HttpTransport = None, resolutionCache: 'ResolutionCache' = None, chunkSize: int = IDENTIFIER_CHUNK_SIZE, maxWorkers: int = IDENTIFIER_MAX_IN_FLIGHT, rateLimiter: RateLimiter = None):
+        """With a resolutionCache, designations it holds a fresh identity for
+        are answered from it and never sent to MPC.
+
+        Every request waits on rateLimiter, one of its own by default, so the
+        chunks fetched at once share the same budget.  Pass one in to share it
+        with other clients of the endpoint.
+        """
+        self.cache = cache
+        self.transport = transport or HttpTransport()
+        self.resolutionCache = resolutionCache
+        self.chunkSize = chunkSize
+        self.maxWorkers = maxWorkers
+        self.rateLimiter = rateLimiter or RateLimiter(IDENTIFIER_REQUESTS_PER_SECOND, maxWorkers, burst=maxWorkers)
+        # Designations answered from the resolution cache and sent to MPC, for logging
+        self.cacheHits = 0
+        self.requested = 0
 
     def querySingle(self, designation: str) -> DesignationInfo:
-        response = requests.get(self.baseUrl, data=designation)
+        response = self.get(data=designation)
 
         response.raise_for_status()
         return DesignationInfo(response.json())
 
     def queryMultiple(self, designations: List[str]) -> List[DesignationInfo]:
-        response = requests.get(self.baseUrl, json={ 'ids': designations })
+        return list(self.queryMultipleById(designations).values())
+
+    def queryMultipleById(self, designations: List[str]) -> Dict[str, DesignationInfo]:
+        """Look up several designations, keyed by the designation as queried.
+
+        Designations the resolution cache answers are not sent.  The rest go
+        chunkSize to a request, up to maxWorkers requests at once, and what
+        they resolve to is added to the cache.
+        """
+        entries = self.resolutionCache.getMany(designations) if self.resolutionCache else {}
+        self.cacheHits += len(entries)
+
+        missing = [designation for designation in dict.fromkeys(designations) if designation not in entries]
+        chunks = [missing[start:start + self.chunkSize] for start in range(0, len(missing), self.chunkSize)]
+        self.requested += len(missing)
+
+        fetched = {}
+        if len(chunks) > 1 and self.maxWorkers > 1:
+            with ThreadPoolExecutor(max_workers=min(self.maxWorkers, len(chunks))) as executor:
+                for chunkEntries in executor.map(self.queryChunk, chunks):
+                    fetched.update(chunkEntries)
+        else:
+            for chunk in chunks:
+                fetched.update(self.queryChunk(chunk))
+
+        if self.resolutionCache and fetched:
+            self.resolutionCache.putMany(fetched)
+
+        entries.update(fetched)
+        return { designation: DesignationInfo(entries[designation]) for designation in designations if designation in entries }
+
+    def queryChunk(self, designations: List[str]) -> Dict[str, dict]:
+        """The raw query-identifier entries for one request's worth of designations."""
+        response = self.get(json={ 'ids': designations })
         response.raise_for_status()
 
-        results = []
-        data = response.json()
-        for row in data:
-            results.append(DesignationInfo(data[row]))
+        return response.json()
 
-        return results
+    def get(self, json: dict = None, data: str = None):
+        def send(headers: dict = None) -> requests.Response:
+            # Only requests that actually go to the network count against the rate limit
+            with self.rateLimiter:
+                return self.transport.get(self.baseUrl, json=json, data=data, headers=headers)
+
+        if self.cache:
+            return self.cache.get(self.baseUrl, json=json, data=data, send=send)
+
+        return send()
+
+
+class RateLimitedStream:
+    """A streamed response that holds its rate limiter slot until the body
+    has been read or the response is closed.
+    """
+
+    def __init__(self, response: requests.Response, rateLimiter: RateLimiter):
+        self.response = response
+        self.rateLimiter = rateLimiter
+        self.released = False
+
+    def __getattr__(self, name: str):
+        return getattr(self.response, name)
+
+    @property
+    def content(self) -> bytes:
+        try:
+            return self.response.content
+        finally:
+            self.close()
+
+    def iter_content(self, chunk_size: int = 1) -> Iterator[bytes]:
+        try:
+            yield from self.response.iter_content(chunk_size)
+        finally:
+            self.close()
+
+    def close(self):
+        if not self.released:
+            self.released = True
+            self.response.close()
+            self.rateLimiter.release()
 
 
 class ObservationsApi:
-    baseUrl = 'https://data.minorplanetcenter.net/api/get-obs'
+    baseUrl = f"{MPC_API_ROOT}/get-obs"
+
+    streamChunkSize = 64 * 1024
 
-    def query(self, designation: str) -> pd.DataFrame:
-        cleanedDesignation = designation.removeprefix('(').removesuffix(')')
+    def __init__(self, rateLimiter: RateLimiter = None, cache: ResponseCache = None, streaming: bool = False, columns: Tuple[str, ...] = None, outputFormat: str = 'ADES_DF', transport: HttpTransport = None):
+        """streaming=True makes queryMany and friends decode responses incrementally,
+        keeping only the given columns (obstime, mag and stn by default) as
+        compact typed arrays.
+
+        outputFormat='OBS80' fetches the much smaller 80-column format instead
+        and parses it into obstime, mag and stn columns.
+        """
+        self.rateLimiter = rateLimiter
+        self.cache = cache
+        self.streaming = streaming
+        self.columns = columns
+        self.outputFormat = outputFormat
+        self.transport = transport or HttpTransport()
+
+    def query(self, designation: str) -> 'pd.DataFrame':
+        cleanedDesignation = self.cleanDesignation(designation)
 
         json = { 'desigs': [ cleanedDesignation ], 'output_format': [ 'ADES_DF' ] }
-        response = requests.get(self.baseUrl, json=json)
-        
-        response.raise_for_status()
 
-        data = pd.DataFrame(response.json()[0]['ADES_DF'])
+        # pandas is imported on first use to keep startup light for commands that never need it
+        import pandas as pd
+
+        data = pd.DataFrame(self.getJson(json)[0]['ADES_DF'])
         return data
+
+    def queryMany(self, designations: List[str], chunk_size: int = 25, pause: float = 0.5) -> Dict[str, 'pd.DataFrame']:
+        """Fetch observations for many designations, chunk_size designations per request.
+
+        Returns a dict of designation -> ADES_DF frame.  Designations that could
+        not be fetched are left out of the result.
+        """
+        results = {}
+
+        for start in range(0, len(designations), chunk_size):
+            if start > 0 and pause:
+                # Pause between chunks to avoid spamming the API
+                time.sleep(pause)
+
+            chunk = designations[start:start + chunk_size]
+            results.update(self.queryChunk(chunk))
+
+        return results
+
+    def queryChunk(self, designations: List[str]) -> Dict[str, 'pd.DataFrame']:
+        import pandas as pd
+        from ObservationParser import DEFAULT_COLUMNS, parseAdesStream, parseObs80
+
+        cleanedDesignations = [self.cleanDesignation(d) for d in designations]
+
+        json = { 'desigs': cleanedDesignations, 'output_format': [ self.outputFormat ] }
+
+        try:
+            if self.outputFormat == 'OBS80':
+                data = self.checkEntries(self.getJson(json), designations)
+                return { designation: parseObs80(entry['OBS80']) for designation, entry in zip(designations, data) }
+
+            if self.streaming:
+                response = self.getResponse(json, stream=True)
+                try:
+                    return parseAdesStream(response.iter_content(self.streamChunkSize), designations, self.columns or DEFAULT_COLUMNS)
+                finally:
+                    response.close()
+
+            data = self.checkEntries(self.getJson(json), designations)
+        except (requests.RequestException, ValueError) as ex:
+            if len(designations) == 1:
+                print(f"Error getting observations for {designations[0]}: {ex}")
+                return {}
+
+            if not self.isDesignationError(ex):
+                # A connection failure, timeout or server error is not down to
+                # any one designation, retrying them one at a time would only
+                # send more requests to fail.  The chunk is left for the next run.
+                print(f"Error getting observations for {len(designations)} designations, skipping them: {ex}")
+                return {}
+
+            # One bad designation can fail the whole request, or leave the
+            # entries not lining up with the designations, so fall back to
+            # fetching the chunk one designation at a time.
+            print(f"Error getting observations for {len(designations)} designations, retrying individually: {ex}")
+            results = {}
+            for designation in designations:
+                results.update(self.queryChunk([designation]))
+            return results
+
+        # The response holds one entry per requested designation, in request order
+        results = {}
+        for designation, entry in zip(designations, data):
+            results[designation] = pd.DataFrame(entry['ADES_DF'])
+
+        return results
             
+    def isDesignationError(self, ex: Exception) -> bool:
+        """Whether a failed chunk may be down to one of its designations: MPC
+        rejecting the request, or entries that do not line up with them.
+        """
+        if isinstance(ex, requests.HTTPError):
+            status = ex.response.status_code if ex.response is not None else None
+            # Too Many Requests is MPC pushing back, not a bad designation
+            return status is not None and 400 <= status < 500 and status != 429
+
+        return isinstance(ex, ValueError) and not isinstance(ex, requests.RequestException)
+
+    def iterQueryStream(self, designations: Iterable[str], chunk_size: int = 25, maxWorkers: int = 4, maxPending: int = None) -> Iterator[Dict[str, 'pd.DataFrame']]:
+        """Fetch chunks concurrently, yielding each chunk's designation -> frame
+        dict as it completes.
+
+        Requests are throttled by the rateLimiter passed to the constructor, so
+        pass one in when using more than one worker.  designations is read a
+        chunk at a time as there is room, so it can be fed by another stage of
+        a pipeline.  At most maxPending chunks, twice maxWorkers by default,
+        are being fetched or waiting to be consumed at once, so a slow
+        consumer holds the reading back rather than letting fetched frames
+        pile up.
+        """
+        maxWorkers = max(1, maxWorkers)
+        maxPending = maxPending or 2 * maxWorkers
+        slots = threading.Semaphore(maxPending)
+        completed = queue.Queue()
+        stopped = threading.Event()
+
+        with ThreadPoolExecutor(max_workers=maxWorkers) as executor:
+            def feed():
+                submitted = 0
+                try:
+                    source = iter(designations)
+                    while True:
+                        chunk = list(islice(source, chunk_size))
+                        if not chunk:
+                            break
+
+                        slots.acquire()
+                        if stopped.is_set():
+                            break
+
+                        executor.submit(self.queryChunk, chunk).add_done_callback(completed.put)
+                        submitted += 1
+                except Exception as ex:
+                    completed.put(ex)
+                finally:
+                    # The count goes last, so the consumer knows how many results to wait for
+                    completed.put(submitted)
+
+            feeder = threading.Thread(target=feed, daemon=True)
+            feeder.start()
+
+            received = 0
+            expected = None
+            try:
+                while expected is None or received < expected:
+                    item = completed.get()
+
+                    if isinstance(item, int):
+                        expected = item
+                    elif isinstance(item, Exception):
+                        raise item
+                    else:
+                        received += 1
+                        slots.release()
+                        yield item.result()
+            finally:
+                # Let a feeder waiting for room see that nothing more is wanted
+                stopped.set()
+                for _ in range(maxPending):
+                    slots.release()
+
+    def checkEntries(self, data: list, designations: List[str]) -> list:
+        """The response entries, checked to be one per requested designation.
+
+        Entries carry no designation of their own and are matched by
+        position, so a short or padded response raises ValueError.
+        """
+        if not isinstance(data, list) or len(data) != len(designations):
+            raise ValueError(f"{len(data) if isinstance(data, list) else 'no'} entries in the response for {len(designations)} designations")
+        return data
+
+    def getJson(self, json: dict):
+        return self.getResponse(json).json()
+
+    def getResponse(self, json: dict, stream: bool = False):
+        """The response to a get-obs request.  With stream=True the body is
+        left to be read through iter_content, and the caller closes it.
+        """
+        if self.cache:
+            response = self.cache.get(self.baseUrl, json=json, send=lambda headers: self.send(json, headers, stream), stream=stream)
+        else:
+            response = self.send(json, stream=stream)
+
+        if response.status_code >= 400:
+            response.close()
+
+        response.raise_for_status()
+        return response
+
+    def send(self, json: dict, headers: dict = None, stream: bool = False) -> requests.Response:
+        # Only requests that actually go to the network count against the rate limit
+        if not self.rateLimiter:
+            return self.transport.get(self.baseUrl, json=json, headers=headers, stream=stream)
+
+        if not stream:
+            with self.rateLimiter:
+                return self.transport.get(self.baseUrl, json=json, headers=headers, stream=stream)
+
+        # A streamed body is downloaded as it is read, so the request keeps
+        # its place in flight until then
+        self.rateLimiter.acquire()
+        try:
+            return RateLimitedStream(self.transport.get(self.baseUrl, json=json, headers=headers, stream=True), self.rateLimiter)
+        except BaseException:
+            self.rateLimiter.release()
+            raise
+
     def queryObs80(self, designation: str) -> str:
-        cleanedDesignation = designation.removeprefix('(').removesuffix(')')
+        cleanedDesignation = self.cleanDesignation(designation)
 
         json = { 'desigs': [ cleanedDesignation ], 'output_format': [ 'OBS80' ] }
-        response = requests.get(self.baseUrl, json=json)
-        
-        response.raise_for_status()
 
-        data = response.json()[0]['OBS80']
+        data = self.getJson(json)[0]['OBS80']
         return data
 
+    def cleanDesignation(self, designation: str) -> str:
+        return designation.removeprefix('(').removesuffix(')')
+
 
 
 if __name__ == "__main__":
@@ -0,0 +1,227 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+from CometStorage import BUSY_TIMEOUT
+from Subscribers import DEFAULT_SUBSCRIBER
+
+if TYPE_CHECKING:
+    from Metrics import Metrics
+    from Subscribers import SubscriberRegistry
+
+# Delivery attempts before a notification is given up on
+MAX_ATTEMPTS = 8
+# Seconds before the first retry, doubling after every failure up to RETRY_MAX
+RETRY_BASE = 30
+RETRY_MAX = 60 * 60
+# Seconds a drainer has to deliver what it claimed before others may retry it
+CLAIM_TTL = 5 * 60
+# Delivered notifications are kept this many seconds so repeats are still recognised
+KEEP_SENT = 30 * 24 * 60 * 60
+
+
+class OutboxRow:
+    def __init__(self, row: tuple):
+        self.id, self.subscriber, self.designation, self.kind, self.value, embed, self.attempts = row
+        self.embed = json.loads(embed)
+
+
+class NotificationOutbox:
+    """Notifications waiting to be delivered, kept in SQLite until they are.
+
+    Each event is recorded once per (subscriber, designation, kind, value),
+    so running the same analysis again, or two workers reaching the same
+    conclusion, does not notify a subscriber twice.  drain() delivers what
+    is pending.  Rows are claimed before they are sent, so several
+    processes can drain the same outbox.  Failures are retried with
+    exponential backoff until MAX_ATTEMPTS, after which they stay in the
+    table as given up.
+    """
+
+    def __init__(self, filePath: str):
+        self.filePath = filePath
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(filePath, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.migrate()
+        self.createTable()
+
+    def close(self):
+        self.connection.close()
+
+    def createTable(self):
+        self.connection.execute(f'''
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                subscriber TEXT NOT NULL DEFAULT '{DEFAULT_SUBSCRIBER}',
+                designation TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                value TEXT NOT NULL DEFAULT '',
+                embed TEXT NOT NULL,
+                created REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                nextAttempt REAL NOT NULL DEFAULT 0,
+                sent REAL,
+                lastError TEXT,
+                UNIQUE (subscriber, designation, kind, value)
+            )
+        ''')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (sent, nextAttempt)')
+
+    def migrate(self):
+        """Give an outbox from before subscribers its subscriber column.
+
+        The column is part of the unique key, so the table is rebuilt and the
+        existing rows go to the default subscriber.
+        """
+        columns = [row[1] for row in self.connection.execute('PRAGMA table_info(outbox)')]
+
+        if not columns or 'subscriber' in columns:
+            return
+
+        with self.lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                self.connection.execute('ALTER TABLE outbox RENAME TO outbox_old')
+                self.connection.execute('DROP INDEX IF EXISTS outbox_pending')
+                self.createTable()
+                self.connection.execute(
+                    'INSERT INTO outbox (id, designation, kind, value, embed, created, attempts, nextAttempt, sent, lastError) '
+                    'SELECT id, designation, kind, value, embed, created, attempts, nextAttempt, sent, lastError FROM outbox_old'
+                )
+                self.connection.execute('DROP TABLE outbox_old')
+                self.connection.execute('COMMIT')
+            except Exception:
+                self.connection.execute('ROLLBACK')
+                raise
+
+    def add(self, designation: str, kind: str, value: str, embed: dict, subscriber: str = DEFAULT_SUBSCRIBER) -> bool:
+        """Record a notification for subscriber, False if the same one was already recorded."""
+        with self.lock:
+            cursor = self.connection.execute(
+                'INSERT OR IGNORE INTO outbox (subscriber, designation, kind, value, embed, created) VALUES (?, ?, ?, ?, ?, ?)',
+                (subscriber, designation, kind, value or '', json.dumps(embed), time.time())
+            )
+
+        return cursor.rowcount == 1
+
+    def claim(self, limit: int = 100, now: float = None, subscribers: List[str] = None) -> List[OutboxRow]:
+        """Take up to limit pending notifications for delivery, oldest first.
+
+        subscribers limits the claim to those subscribers' notifications.
+        """
+        now = now or time.time()
+
+        where = 'sent IS NULL AND attempts < ? AND nextAttempt <= ?'
+        parameters = [MAX_ATTEMPTS, now]
+        if subscribers is not None:
+            where += f" AND subscriber IN ({', '.join('?' * len(subscribers))})"
+            parameters += subscribers
+
+        with self.lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                rows = self.connection.execute(
+                    f'SELECT id, subscriber, designation, kind, value, embed, attempts FROM outbox WHERE {where} ORDER BY id LIMIT ?',
+                    (*parameters, limit)
+                ).fetchall()
+
+                self.connection.executemany('UPDATE outbox SET nextAttempt = ? WHERE id = ?', [(now + CLAIM_TTL, row[0]) for row in rows])
+                self.connection.execute('COMMIT')
+            except Exception:
+                self.connection.execute('ROLLBACK')
+                raise
+
+        return [OutboxRow(row) for row in rows]
+
+    def markSent(self, ids: List[int], now: float = None):
+        now = now or time.time()
+        with self.lock:
+            self.connection.executemany('UPDATE outbox SET sent = ?, attempts = attempts + 1, lastError = NULL WHERE id = ?', [(now, id) for id in ids])
+
+    def markFailed(self, rows: List[OutboxRow], error: str, now: float = None):
+        now = now or time.time()
+        updates = [(now + min(RETRY_BASE * 2 ** row.attempts, RETRY_MAX), error, row.id) for row in rows]
+
+        with self.lock:
+            self.connection.executemany('UPDATE outbox SET attempts = attempts + 1, nextAttempt = ?, lastError = ? WHERE id = ?', updates)
+
+    def prune(self, now: float = None) -> int:
+        now = now or time.time()
+        with self.lock:
+            cursor = self.connection.execute('DELETE FROM outbox WHERE sent IS NOT NULL AND sent < ?', (now - KEEP_SENT,))
+        return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        with self.lock:
+            pending, sent, givenUp = self.connection.execute(
+                'SELECT COALESCE(SUM(sent IS NULL AND attempts < ?), 0), COALESCE(SUM(sent IS NOT NULL), 0), COALESCE(SUM(sent IS NULL AND attempts >= ?), 0) FROM outbox',
+                (MAX_ATTEMPTS, MAX_ATTEMPTS)
+            ).fetchone()
+
+        return { 'pending': pending, 'sent': sent, 'givenUp': givenUp }
+
+    def drain(self, subscribers: 'SubscriberRegistry', metrics: 'Metrics' = None, limit: int = 100) -> Tuple[int, int]:
+        """Deliver pending notifications to their subscribers' webhooks until none are due.
+
+        Returns (sent, failed).  Each webhook post carries as many embeds as
+        Discord allows, and a failed post only reschedules its own rows.
+        Notifications for subscribers without a webhook stay pending.
+        """
+        configured = subscribers.configuredNames()
+        if not configured:
+            print("No subscriber has a Discord webhook set, notifications stay in the outbox")
+            return 0, 0
+
+        sent = failed = 0
+
+        while True:
+            rows = self.claim(limit, subscribers=configured)
+            if not rows:
+                break
+
+            bySubscriber: Dict[str, List[OutboxRow]] = {}
+            for row in rows:
+                bySubscriber.setdefault(row.subscriber, []).append(row)
+
+            for name, subscriberRows in bySubscriber.items():
+                discord = subscribers.discordFor(name)
+
+                start = 0
+                for batch in discord.batches([row.embed for row in subscriberRows]):
+                    batchRows = subscriberRows[start:start + len(batch)]
+                    start += len(batch)
+
+                    if discord.post(batch):
+                        self.markSent([row.id for row in batchRows])
+                        sent += len(batchRows)
+                    else:
+                        self.markFailed(batchRows, 'Webhook post failed')
+                        failed += len(batchRows)
+
+        self.prune()
+
+        if metrics:
+            metrics.increment('notifications_sent', sent)
+            metrics.increment('notifications_failed', failed)
+            for state, count in self.counts().items():
+                metrics.setGauge('outbox', count, state=state)
+
+        return sent, failed
+
+
+if __name__ == "__main__":
+    outbox = NotificationOutbox(':memory:')
+
+    embed = { 'title': '🌟 Comet magnitude change: C/2025 A6 (LEMMON)', 'description': 'Binocular comet' }
+    print(f"First record added: {outbox.add('C/2025 A6', 'binoc', '7.65', embed)}")
+    print(f"Same event again added: {outbox.add('C/2025 A6', 'binoc', '7.65', embed)}")
+    print(f"Same event for another subscriber added: {outbox.add('C/2025 A6', 'binoc', '7.65', embed, 'club')}")
+
+    rows = outbox.claim()
+    print(f"Claimed {len(rows)}, claimed again straight after: {len(outbox.claim())}")
+
+    outbox.markFailed(rows, 'Webhook post failed')
+    print(outbox.counts())
@@ -0,0 +1,298 @@
+import codecs
+import json
+from array import array
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_COLUMNS = ('obstime', 'mag', 'stn')
+
+
+class ObservationColumns:
+    """Compact column buffers for the observations of one designation.
+
+    obstime is converted to datetime64 in blocks as rows arrive and mag is
+    kept as float32 (NaN when missing).  Any other requested columns are kept
+    as plain lists.
+    """
+    BLOCK_SIZE = 4096
+
+    def __init__(self, columns: Tuple[str, ...] = DEFAULT_COLUMNS):
+        self.columns = columns
+        self.keepObstime = 'obstime' in columns
+        self.keepMag = 'mag' in columns
+        self.obstimeBlocks: List[np.ndarray] = []
+        self.pendingObstimes: List[str] = []
+        self.mags = array('f')
+        self.other: Dict[str, list] = { c: [] for c in columns if c not in ('obstime', 'mag') }
+
+    def append(self, row: dict):
+        if self.keepObstime:
+            # numpy does not accept the trailing Z, the values are all UTC
+            self.pendingObstimes.append((row.get('obstime') or 'NaT').removesuffix('Z'))
+            if len(self.pendingObstimes) >= self.BLOCK_SIZE:
+                self.flushObstimes()
+
+        if self.keepMag:
+            self.mags.append(self.getFloat(row.get('mag')))
+
+        for column, values in self.other.items():
+            values.append(row.get(column))
+
+    def flushObstimes(self):
+        if self.pendingObstimes:
+            self.obstimeBlocks.append(np.array(self.pendingObstimes, dtype='datetime64[ms]'))
+            self.pendingObstimes = []
+
+    def toFrame(self) -> pd.DataFrame:
+        data = {}
+
+        if self.keepObstime:
+            self.flushObstimes()
+            obstimes = np.concatenate(self.obstimeBlocks) if self.obstimeBlocks else np.array([], dtype='datetime64[ms]')
+            data['obstime'] = pd.Series(obstimes).dt.tz_localize('UTC')
+
+        if self.keepMag:
+            data['mag'] = np.frombuffer(self.mags, dtype=np.float32)
+
+        for column, values in self.other.items():
+            data[column] = values
+
+        return pd.DataFrame(data)
+
+    def getFloat(self, val) -> float:
+        if val is None or val == '':
+            return float('nan')
+        try:
+            return float(val)
+        except (TypeError, ValueError):
+            return float('nan')
+
+
+class AdesStreamParser:
+    """Incremental parser for get-obs ADES_DF responses.
+
+    Feed it the raw response body in chunks.  It yields (entry, row) pairs,
+    where entry is the index of the requested designation, without ever
+    decoding the whole body at once.
+    """
+
+    def __init__(self, key: str = 'ADES_DF'):
+        self.marker = f'"{key}"'
+        self.decoder = json.JSONDecoder()
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.pos = 0
+        self.entryCount = 0
+        self.state = 'search'
+
+    def feed(self, chunk: bytes) -> Iterator[Tuple[int, dict]]:
+        self.buffer += self.utf8.decode(chunk)
+        yield from self.parse()
+
+    def close(self) -> Iterator[Tuple[int, dict]]:
+        self.buffer += self.utf8.decode(b'', final=True)
+        yield from self.parse()
+
+        if self.state != 'search':
+            raise ValueError(f"Incomplete {self.marker} data at end of response")
+
+    def parse(self) -> Iterator[Tuple[int, dict]]:
+        while True:
+            if self.state == 'search':
+                found = self.buffer.find(self.marker, self.pos)
+                if found < 0:
+                    # Keep enough of the tail to match a marker split across chunks
+                    self.pos = max(self.pos, len(self.buffer) - len(self.marker))
+                    break
+                self.pos = found + len(self.marker)
+                self.state = 'value'
+
+            elif self.state == 'value':
+                start = self.skip(' \t\r\n:')
+                if start >= len(self.buffer):
+                    break
+
+                if self.buffer[start] == '[':
+                    self.pos = start + 1
+                    self.state = 'rows'
+                else:
+                    # Column oriented frame, which has to be decoded whole
+                    try:
+                        columns, end = self.decoder.raw_decode(self.buffer, start)
+                    except json.JSONDecodeError:
+                        break
+
+                    self.pos = end
+                    self.state = 'search'
+                    entry = self.entryCount
+                    self.entryCount += 1
+                    for row in self.columnsToRows(columns):
+                        yield entry, row
+
+            elif self.state == 'rows':
+                start = self.skip(' \t\r\n,')
+                if start >= len(self.buffer):
+                    break
+
+                if self.buffer[start] == ']':
+                    self.pos = start + 1
+                    self.state = 'search'
+                    self.entryCount += 1
+                    continue
+
+                try:
+                    row, end = self.decoder.raw_decode(self.buffer, start)
+                except json.JSONDecodeError:
+                    # The row is split across chunks
+                    break
+
+                self.pos = end
+                yield self.entryCount, row
+
+            self.trim()
+
+    def skip(self, characters: str) -> int:
+        pos = self.pos
+        while pos < len(self.buffer) and self.buffer[pos] in characters:
+            pos += 1
+        self.pos = pos
+        return pos
+
+    def trim(self):
+        if self.pos > 1 << 20:
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+
+    def columnsToRows(self, columns: dict) -> Iterator[dict]:
+        names = list(columns)
+        values = [list(columns[name].values()) if isinstance(columns[name], dict) else columns[name] for name in names]
+
+        for rowValues in zip(*values):
+            yield dict(zip(names, rowValues))
+
+
+def parseAdesStream(chunks: Iterable[bytes], designations: List[str], columns: Tuple[str, ...] = DEFAULT_COLUMNS) -> Dict[str, pd.DataFrame]:
+    """Parse a get-obs ADES_DF response into one compact frame per designation.
+
+    Only the requested columns are kept.  The entries are matched to the
+    designations by position, so a response without exactly one entry per
+    designation raises ValueError.
+    """
+    parser = AdesStreamParser()
+    builders = [ObservationColumns(columns) for _ in designations]
+
+    def append(entry: int, row: dict):
+        if entry >= len(builders):
+            raise ValueError(f"More entries in the response than the {len(designations)} designations requested")
+        builders[entry].append(row)
+
+    for chunk in chunks:
+        for entry, row in parser.feed(chunk):
+            append(entry, row)
+
+    for entry, row in parser.close():
+        append(entry, row)
+
+    if parser.entryCount != len(designations):
+        raise ValueError(f"{parser.entryCount} entries in the response for {len(designations)} designations")
+
+    return { designation: builders[index].toFrame() for index, designation in enumerate(designations) }
+
+
+def parseObs80(text) -> pd.DataFrame:
+    """Parse MPC 80-column observations into obstime, mag and stn columns.
+
+    The lines are viewed as a 2D uint8 array and the date and magnitude
+    fields are decoded with column arithmetic, so no per-line Python objects
+    are created when every line is exactly 80 columns.  Second lines of
+    satellite, roving and radar observations are skipped.
+    """
+    data = text.encode('ascii', errors='replace') if isinstance(text, str) else text
+    lines = obs80Lines(data)
+
+    # Column 15 marks the second line of two-line observations
+    lines = lines[~np.isin(lines[:, 14], np.frombuffer(b'srv', dtype=np.uint8))]
+
+    years = digitsToInt(lines[:, 15:19])
+    months = digitsToInt(lines[:, 20:22])
+    days = digitsToInt(lines[:, 23:25])
+    fractions = fieldToFloat(lines[:, 25:32])
+
+    dates = (years - 1970).astype('datetime64[Y]').astype('datetime64[M]') + (months - 1).astype('timedelta64[M]')
+    dates = dates.astype('datetime64[D]') + (days - 1).astype('timedelta64[D]')
+    obstimes = dates.astype('datetime64[ms]') + np.round(np.nan_to_num(fractions) * 86400000).astype(np.int64).astype('timedelta64[ms]')
+
+    return pd.DataFrame({
+        'obstime': pd.Series(obstimes).dt.tz_localize('UTC'),
+        'mag': fieldToFloat(lines[:, 65:70]).astype(np.float32),
+        'stn': np.ascontiguousarray(lines[:, 77:80]).view('S3').ravel().astype('U3')
+    })
+
+
+def obs80Lines(data: bytes) -> np.ndarray:
+    data = data.rstrip(b'\r\n')
+    if not data:
+        return np.zeros((0, 80), dtype=np.uint8)
+
+    buffer = np.frombuffer(data + b'\n', dtype=np.uint8)
+
+    # Fast path: fixed 81 byte records, viewed in place
+    if len(buffer) % 81 == 0:
+        lines = buffer.reshape(-1, 81)
+        if (lines[:, 80] == ord('\n')).all():
+            return lines[:, :80]
+
+    # Ragged lines (CRLF endings or trimmed trailing blanks) are padded to 80 columns
+    padded = np.array(data.replace(b'\r', b'').split(b'\n'), dtype='S80')
+    return padded.view(np.uint8).reshape(-1, 80)
+
+
+def digitsToInt(field: np.ndarray) -> np.ndarray:
+    digits = field.astype(np.int64) - ord('0')
+    digits[(digits < 0) | (digits > 9)] = 0
+    powers = 10 ** np.arange(field.shape[1] - 1, -1, -1, dtype=np.int64)
+    return digits @ powers
+
+
+def fieldToFloat(field: np.ndarray) -> np.ndarray:
+    """Decode a fixed-width numeric field such as ' 9.8 ' or '-1.25' per row, NaN when blank."""
+    width = field.shape[1]
+    positions = np.arange(width)
+
+    isDigit = (field >= ord('0')) & (field <= ord('9'))
+    hasDigit = isDigit.any(axis=1)
+    isDot = field == ord('.')
+
+    # Without a decimal point the value ends after its last digit
+    lastDigit = width - 1 - np.argmax(isDigit[:, ::-1], axis=1)
+    dotPosition = np.where(isDot.any(axis=1), np.argmax(isDot, axis=1), lastDigit + 1)
+
+    exponents = dotPosition[:, None] - positions[None, :]
+    exponents = np.where(positions[None, :] < dotPosition[:, None], exponents - 1, exponents)
+
+    digits = np.where(isDigit, field.astype(np.float64) - ord('0'), 0.0)
+    values = (digits * np.power(10.0, exponents)).sum(axis=1)
+
+    values = np.where((field == ord('-')).any(axis=1), -values, values)
+    return np.where(hasDigit, values, np.nan)
+
+
+if __name__ == "__main__":
+    body = json.dumps([
+        { 'ADES_DF': [ { 'obstime': '2025-10-01T01:00:00.120Z', 'mag': '11.2', 'stn': 'T05', 'ra': 1.0 },
+                       { 'obstime': '2025-10-02T01:00:00Z', 'mag': None, 'stn': 'T08', 'ra': 2.0 } ] },
+        { 'ADES_DF': [ { 'obstime': '2025-10-03T01:00:00Z', 'mag': '10.8', 'stn': 'I41', 'ra': 3.0 } ] }
+    ]).encode('utf-8')
+
+    chunks = [body[i:i + 7] for i in range(0, len(body), 7)]
+
+    for designation, frame in parseAdesStream(chunks, ['C/2025 A6', 'C/2025 K1']).items():
+        print(designation)
+        print(frame.dtypes)
+        print(frame)
+
+    obs80 = ("    CK25A060  C2025 10 03.16263 05 22 11.730+12 34 56.70         11.2 T      T05\n"
+             "    CK25A060  C2025 10 04.50000 05 23 11.730+12 35 56.70         -1.35T      I41\n")
+    print(parseObs80(obs80))
@@ -0,0 +1,103 @@
+from datetime import datetime
+from typing import Dict, Iterable
+
+import numpy as np
+import pandas as pd
+
+from CometRegistry import CometRegistry
+from LightCurve import WINDOWS, LightCurve
+
+EPOCH = pd.Timestamp(0, tz='UTC')
+
+
+class ObservationStore:
+    """The recent observations of each comet, looked up by designation.
+
+    Each comet keeps the observations inside its widest light curve window in
+    its lightcurve field, keyed by observation time and station, and they are
+    saved with the comet by whichever CometStorage holds it.  append() only
+    takes in observations newer than those stored, or reported late but still
+    inside the window, and the averages are read from the stored window.  A
+    run's work therefore follows the new observations rather than the whole
+    history MPC returns.
+    """
+
+    def __init__(self, registry: CometRegistry, windows: Iterable[float] = WINDOWS):
+        self.registry = registry
+        self.windows = tuple(windows)
+        # Decoded curves, each comet's lightcurve text is only read once
+        self.curves: Dict[str, LightCurve] = {}
+
+    def curve(self, designation: str) -> LightCurve:
+        curve = self.curves.get(designation)
+
+        if curve is None:
+            comet = self.registry.findByDesignation(designation)
+            curve = LightCurve.decode(comet.lightcurve, self.windows)
+            self.curves[designation] = curve
+
+        return curve
+
+    def latestObsTime(self, designation: str) -> datetime:
+        return self.curve(designation).lastObservation()
+
+    def append(self, designation: str, obs: pd.DataFrame) -> int:
+        """Store the observations of an ADES frame that are not stored yet.
+
+        Returns the number of new observations, the comet's lightcurve is
+        only rewritten when there are some.
+        """
+        if obs.empty or 'obstime' not in obs:
+            return 0
+
+        obstime = pd.to_datetime(obs['obstime'], format='ISO8601', utc=True)
+        seconds = (obstime - EPOCH).dt.total_seconds().to_numpy()
+        mags = pd.to_numeric(obs['mag'], errors='coerce').to_numpy(dtype='float64') if 'mag' in obs else np.full(len(seconds), np.nan)
+        stations = obs['stn'].fillna('').astype(str).to_numpy() if 'stn' in obs else np.full(len(seconds), '')
+
+        curve = self.curve(designation)
+
+        # Only observations that can still reach a window are looked at
+        # one by one, those reported late included
+        since = max(np.nanmax(seconds), curve.lastobs or -np.inf) - curve.widest.seconds
+        recent = seconds >= since
+
+        new = curve.update(seconds[recent].tolist(), mags[recent].tolist(), stations[recent].tolist())
+        if new:
+            self.registry.findByDesignation(designation).lightcurve = curve.encode()
+
+        return new
+
+    def window(self, designation: str, days: float) -> pd.DataFrame:
+        """Observations within the given number of days of the latest stored
+        observation, at most the widest window.
+        """
+        curve = self.curve(designation)
+        samples = curve.samples()
+
+        if curve.lastobs is not None:
+            samples = [sample for sample in samples if sample[0] >= curve.lastobs - days * 86400]
+
+        return pd.DataFrame({
+            'obstime': pd.to_datetime([obstime for obstime, _, _ in samples], unit='s', utc=True),
+            'mag': pd.Series([mag for _, _, mag in samples], dtype='float64'),
+            'stn': pd.Series([stn for _, stn, _ in samples], dtype='object')
+        })
+
+
+if __name__ == "__main__":
+    from Comet import Comet
+
+    registry = CometRegistry()
+    registry.add(Comet({ 'designation': 'C/2025 A6' }))
+    store = ObservationStore(registry)
+
+    obs = pd.DataFrame({
+        'obstime': ['2025-10-01T01:00:00Z', '2025-10-02T01:00:00Z', '2025-10-03T01:00:00Z'],
+        'mag': ['11.2', '', '10.8'],
+        'stn': ['T05', 'T08', 'T05']
+    })
+
+    print(f"{store.append('C/2025 A6', obs)} new observations stored")
+    print(f"{store.append('C/2025 A6', obs)} new observations stored")
+    print(store.window('C/2025 A6', 2))
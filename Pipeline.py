@@ -0,0 +1,194 @@
+import queue
+import threading
+import time
+from itertools import chain
+from typing import TYPE_CHECKING, Callable, Iterator
+
+from CometList import OBS_CHUNK_SIZE, CometList
+from Metrics import Metrics
+
+if TYPE_CHECKING:
+    from NotificationOutbox import NotificationOutbox
+    from Subscribers import SubscriberRegistry
+
+# Bounds on the queues between stages, a stage this far ahead waits for the next one
+EVENT_BUFFER = 256
+DESIGNATION_BUFFER = 4 * OBS_CHUNK_SIZE
+# Seconds delivery waits after a notification is recorded, so notifications
+# close together share a webhook post
+DELIVERY_LINGER = 0.5
+
+# Put on a queue after a stage's last item
+END = None
+
+
+def iterQueue(items: queue.Queue) -> Iterator:
+    """The items put on a queue, until END."""
+    while True:
+        item = items.get()
+        if item is END:
+            return
+        yield item
+
+
+class Stage:
+    """A pipeline stage running on its own thread, join() re-raises its error."""
+
+    def __init__(self, name: str, target: Callable[[], None], metrics: Metrics):
+        self.name = name
+        self.target = target
+        self.metrics = metrics
+        self.error = None
+        self.thread = threading.Thread(target=self.run, name=f"pipeline-{name}", daemon=True)
+
+    def start(self) -> 'Stage':
+        self.thread.start()
+        return self
+
+    def run(self):
+        try:
+            with self.metrics.span('pipeline_stage', stage=self.name):
+                self.target()
+        except Exception as ex:
+            print(f"Error in the {self.name} stage: {ex}")
+            self.error = ex
+
+    def join(self):
+        self.thread.join()
+        if self.error:
+            raise self.error
+
+
+class UpdatePipeline:
+    """An update run as stages joined by bounded queues, so comets flow
+    through it one batch at a time instead of phase by phase.
+
+        refresh plan --------------------+
+        discovery --- new designations --+--> fetch + analysis --- events --> outbox --> delivery
+
+    Discovery runs alongside the refresh of the comets already known, and
+    the comets it finds join the refresh as they turn up.  Chunks of
+    observations are analysed as they arrive, every event the comet list
+    reports is recorded in the outbox straight away, and a delivery stage
+    sends them while the rest of the catalogue is still being fetched.
+    Delivering before the comets are saved is safe because the outbox
+    records an event only once, a run that dies before saving finds the same
+    events next time and they are not sent again.
+
+    run() returns once everything is fetched, analysed and recorded, and
+    finish() delivers what is left and stops the delivery stage.
+    """
+
+    def __init__(self, cometList: CometList, outbox: 'NotificationOutbox', subscribers: 'SubscriberRegistry', metrics: Metrics = None):
+        self.cometList = cometList
+        self.outbox = outbox
+        self.subscribers = subscribers
+        self.metrics = metrics or Metrics()
+
+        self.events = queue.Queue(EVENT_BUFFER)
+        self.newDesignations = queue.Queue(DESIGNATION_BUFFER)
+        self.recorded = threading.Event()
+        self.finished = threading.Event()
+
+        self.started = time.perf_counter()
+        # Seconds from the start of the run to the first delivered notification
+        self.firstAlert = None
+        self.sent = 0
+        self.failed = 0
+        self.delivery = Stage('deliver', self.deliver, self.metrics)
+
+    def run(self):
+        cometList = self.cometList
+
+        # Planned before discovery starts adding comets, the new ones come
+        # through newDesignations instead
+        planned = [comet.designation for comet in cometList.planRefresh()]
+
+        cometList.listener = self.onEvent
+        self.delivery.start()
+        recorder = Stage('record', self.record, self.metrics).start()
+        discovery = Stage('discovery', self.discover, self.metrics).start()
+
+        try:
+            with self.metrics.span('pipeline_stage', stage='refresh'):
+                cometList.refreshObservations(chain(planned, iterQueue(self.newDesignations)))
+        finally:
+            # Stops discovery waiting for room if the refresh gave up early
+            while discovery.thread.is_alive():
+                self.drainQueue(self.newDesignations)
+                discovery.thread.join(0.1)
+
+            cometList.listener = None
+            self.events.put(END)
+            recorder.join()
+
+        discovery.join()
+
+        print(f"Found {len(cometList.added)} new comets")
+        print(f"Updated {len(cometList.updated)} comets")
+        print(f"Total of {len(cometList.registry)} comets")
+
+    def finish(self):
+        """Deliver the notifications still pending and stop the delivery stage."""
+        self.finished.set()
+        self.recorded.set()
+        self.delivery.join()
+
+        counts = self.outbox.counts()
+        print(f"Sent {self.sent} Discord notifications, {self.failed} failed, {counts['pending']} pending, {counts['givenUp']} given up")
+
+        if self.firstAlert is not None:
+            print(f"First notification delivered {self.firstAlert:.1f}s into the run")
+
+    def onEvent(self, kind: str, event):
+        # Called on the discovery and refresh threads as the comet list records events
+        if kind == 'added':
+            self.newDesignations.put(event.designation)
+
+        self.events.put((kind, event))
+
+    def discover(self):
+        try:
+            self.cometList.loadRecentComets()
+            self.cometList.designationProbe.negativeCache.save()
+        finally:
+            self.newDesignations.put(END)
+
+    def record(self):
+        from CometDiscovery import notify_event
+
+        for kind, event in iterQueue(self.events):
+            try:
+                if notify_event(kind, event, self.outbox, self.subscribers):
+                    self.recorded.set()
+            except Exception as ex:
+                print(f"Error recording the notifications for a {kind} event: {ex}")
+
+    def deliver(self):
+        # Without a webhook there is nothing to deliver, the final drain reports that once
+        if not self.subscribers.configuredNames():
+            self.finished.wait()
+
+        while not self.finished.is_set():
+            self.recorded.wait()
+            self.finished.wait(DELIVERY_LINGER)
+            self.recorded.clear()
+            self.drain()
+
+        self.drain()
+
+    def drain(self):
+        sent, failed = self.outbox.drain(self.subscribers, self.metrics)
+        self.sent += sent
+        self.failed += failed
+
+        if sent and self.firstAlert is None:
+            self.firstAlert = time.perf_counter() - self.started
+            self.metrics.setGauge('first_alert_seconds', self.firstAlert)
+
+    def drainQueue(self, items: queue.Queue):
+        try:
+            while True:
+                items.get_nowait()
+        except queue.Empty:
+            pass
@@ -0,0 +1,298 @@
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from Comet import Comet
+
+# Responses built for one snapshot are kept for repeat requests, up to this many
+RESPONSE_CACHE_SIZE = 256
+
+
+# The Comet fields a snapshot entry is built from
+ENTRY_FIELDS = ('designation', 'permid', 'name', 'discoverer', 'mag1davg', 'mag2davg', 'lastobs', 'lastupdate', 'lastchecked', 'archive')
+
+
+def entryKey(comet: Comet) -> tuple:
+    return tuple(getattr(comet, field) for field in ENTRY_FIELDS)
+
+
+class SnapshotEntry:
+    """One comet in a snapshot, serialized once when the snapshot is built."""
+    __slots__ = ('key', 'designation', 'permid', 'name', 'magnitude', 'active', 'body')
+
+    def __init__(self, comet: Comet, key: tuple):
+        self.key = key
+        values = comet.toDict()
+        # The encoded light curve is internal state, not something to serve
+        values.pop('lightcurve', None)
+
+        # An empty light curve window leaves NaN, which is not valid JSON
+        for field in ('mag1davg', 'mag2davg'):
+            if values[field] != values[field]:
+                values[field] = None
+
+        self.designation = comet.designation
+        self.permid = (comet.permid or '').lower()
+        self.name = (comet.name or '').lower()
+        # Filtered on the 2 day average where there is one, like the refresh scheduler
+        self.magnitude = values['mag2davg'] or values['mag1davg']
+        self.active = not comet.archive
+        self.body = json.dumps(values).encode('utf-8')
+
+
+class CometSnapshot:
+    """Read-only copy of the comet list at one point in time.
+
+    Every comet is serialized to JSON when the snapshot is built, so list
+    responses are only joined bytes.  Entries for comets unchanged since
+    the previous snapshot are reused rather than serialized again.  A
+    snapshot is never changed once built, the service swaps in a new one
+    instead.
+    """
+
+    def __init__(self, comets: Iterable[Comet], generated: datetime = None, previous: 'CometSnapshot' = None):
+        self.generated = generated or datetime.now(timezone.utc)
+        self.entries: List[SnapshotEntry] = []
+
+        reusable = previous.byDesignation if previous else {}
+        for comet in comets:
+            key = entryKey(comet)
+            entry = reusable.get(comet.designation)
+            self.entries.append(entry if entry is not None and entry.key == key else SnapshotEntry(comet, key))
+
+        self.byDesignation: Dict[str, SnapshotEntry] = { entry.designation: entry for entry in self.entries }
+        self.byPermid: Dict[str, SnapshotEntry] = { entry.permid: entry for entry in self.entries if entry.permid }
+        self.byName: Dict[str, List[SnapshotEntry]] = {}
+        for entry in self.entries:
+            if entry.name:
+                self.byName.setdefault(entry.name, []).append(entry)
+
+        digest = hashlib.blake2b(digest_size=8)
+        for entry in self.entries:
+            digest.update(entry.body)
+        self.version = digest.hexdigest()
+        self.lastModified = formatdate(self.generated.timestamp(), usegmt=True)
+
+        self.responses: Dict[str, tuple] = {}
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def response(self, target: str) -> tuple:
+        """(status, body, etag) for a request target such as /comets?active=true."""
+        with self.lock:
+            cached = self.responses.get(target)
+        if cached:
+            return cached
+
+        status, body = self.render(target)
+        result = (status, body, f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"')
+
+        with self.lock:
+            if len(self.responses) >= RESPONSE_CACHE_SIZE:
+                self.responses.clear()
+            self.responses[target] = result
+
+        return result
+
+    def render(self, target: str) -> tuple:
+        parts = urlsplit(target)
+        path = unquote(parts.path).rstrip('/')
+        query = { key: values[-1] for key, values in parse_qs(parts.query).items() }
+
+        if path == '/comets':
+            try:
+                entries = self.filter(query)
+            except ValueError as e:
+                return 400, self.error(str(e))
+            return 200, self.listBody(entries)
+
+        if path.startswith('/comets/'):
+            entry = self.byDesignation.get(path[len('/comets/'):])
+            if entry is None:
+                return 404, self.error('Unknown designation')
+            return 200, entry.body
+
+        if path in ('', '/status'):
+            return 200, json.dumps(self.status()).encode('utf-8')
+
+        return 404, self.error('Not found')
+
+    def filter(self, query: Dict[str, str]) -> List[SnapshotEntry]:
+        """Entries matching designation, permid, name, active, maxmag and minmag, sorted and limited."""
+        if 'designation' in query:
+            entry = self.byDesignation.get(query['designation'])
+            entries = [entry] if entry else []
+        elif 'permid' in query:
+            entry = self.byPermid.get(query['permid'].lower())
+            entries = [entry] if entry else []
+        elif 'name' in query:
+            entries = self.byName.get(query['name'].lower(), [])
+        else:
+            entries = self.entries
+
+        if 'active' in query:
+            active = Comet.getBool(query['active'])
+            entries = [entry for entry in entries if entry.active == active]
+
+        if 'maxmag' in query:
+            limit = self.number(query, 'maxmag')
+            entries = [entry for entry in entries if entry.magnitude is not None and entry.magnitude <= limit]
+
+        if 'minmag' in query:
+            limit = self.number(query, 'minmag')
+            entries = [entry for entry in entries if entry.magnitude is not None and entry.magnitude >= limit]
+
+        sort = query.get('sort')
+        if sort == 'mag':
+            entries = sorted(entries, key=lambda entry: (entry.magnitude is None, entry.magnitude or 0))
+        elif sort is not None and sort != 'designation':
+            raise ValueError("sort must be 'mag' or 'designation'")
+
+        if 'limit' in query:
+            entries = entries[:max(0, int(self.number(query, 'limit')))]
+
+        return entries
+
+    def number(self, query: Dict[str, str], name: str) -> float:
+        try:
+            return float(query[name])
+        except ValueError:
+            raise ValueError(f"{name} must be a number")
+
+    def listBody(self, entries: List[SnapshotEntry]) -> bytes:
+        # The version rather than the build time, so an unchanged list keeps its ETag
+        header = json.dumps({ 'version': self.version, 'count': len(entries) })
+        return header[:-1].encode('utf-8') + b', "comets": [' + b', '.join(entry.body for entry in entries) + b']}'
+
+    def status(self) -> dict:
+        return {
+            'generated': self.generated.isoformat(),
+            'version': self.version,
+            'comets': len(self.entries),
+            'active': sum(1 for entry in self.entries if entry.active)
+        }
+
+    def error(self, message: str) -> bytes:
+        return json.dumps({ 'error': message }).encode('utf-8')
+
+
+class QueryService:
+    """Read-only HTTP/JSON service over the latest published comet snapshot.
+
+    publish() builds a CometSnapshot and swaps it in with a single
+    assignment, so requests are always answered from one complete snapshot
+    and never touch the CometList or MPC.  Endpoints:
+
+        GET /comets                    all comets, filtered by the query string
+            ?designation= ?permid= ?name=   lookups, permid and name ignore case
+            ?active=true|false              archived or not
+            ?maxmag= ?minmag=               on the 2 day average, or 1 day without one
+            ?sort=mag|designation ?limit=
+        GET /comets/<designation>      one comet, e.g. /comets/C%2F2025%20A6
+        GET /status                    snapshot time, version and counts
+
+    Every response carries an ETag and answers If-None-Match with 304.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 8642):
+        self.snapshot = CometSnapshot([])
+        self.httpd = ThreadingHTTPServer((host, port), self.makeHandler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def publish(self, comets: Iterable[Comet]) -> CometSnapshot:
+        """Swap in a snapshot of comets, keeping the current one if nothing changed."""
+        snapshot = CometSnapshot(comets, previous=self.snapshot)
+
+        if snapshot.version != self.snapshot.version:
+            self.snapshot = snapshot
+
+        return self.snapshot
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        print(f"Serving comet queries at {self.url}/comets")
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def makeHandler(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out as separate writes, without this every
+            # keep-alive response waits on the client's delayed ACK
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                self.respond(includeBody=True)
+
+            def do_HEAD(self):
+                self.respond(includeBody=False)
+
+            def respond(self, includeBody: bool):
+                # Read the reference once, a publish mid-request does not matter
+                snapshot = service.snapshot
+                status, body, etag = snapshot.response(self.path)
+
+                if status == 200 and etag in self.ifNoneMatch():
+                    status, body = 304, b''
+
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('ETag', etag)
+                self.send_header('Last-Modified', snapshot.lastModified)
+                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+
+                if includeBody and body:
+                    self.wfile.write(body)
+
+            def ifNoneMatch(self) -> List[str]:
+                header = self.headers.get('If-None-Match') or ''
+                return [tag.strip().removeprefix('W/') for tag in header.split(',')]
+
+        return Handler
+
+
+if __name__ == "__main__":
+    import urllib.request
+
+    from CometStorage import CsvCometStorage
+
+    service = QueryService(port=0)
+    service.publish(CsvCometStorage('test.csv').load())
+    service.start()
+
+    start = time.perf_counter()
+    with urllib.request.urlopen(f"{service.url}/comets?active=true&sort=mag&limit=3") as response:
+        etag = response.headers['ETag']
+        print(response.read().decode('utf-8'))
+    print(f"First request in {(time.perf_counter() - start) * 1000:.2f} ms, ETag {etag}")
+
+    try:
+        urllib.request.urlopen(urllib.request.Request(f"{service.url}/comets?active=true&sort=mag&limit=3", headers={'If-None-Match': etag}))
+    except urllib.error.HTTPError as e:
+        print(f"Repeat request with If-None-Match: {e.code}")
+
+    service.stop()
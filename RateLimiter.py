@@ -0,0 +1,68 @@
+import threading
+import time
+
+
+class RateLimiter:
+    """Token bucket shared between threads making requests to the same API.
+
+    requestsPerSecond sets the refill rate of the bucket, burst the number of
+    tokens it can hold, and maxInFlight caps how many requests may be running
+    at once.  Use it as a context manager around each request.
+    """
+
+    def __init__(self, requestsPerSecond: float = 2, maxInFlight: int = 4, burst: int = 1):
+        self.requestsPerSecond = requestsPerSecond
+        self.maxInFlight = maxInFlight
+        self.burst = max(1, burst)
+
+        self.tokens = float(self.burst)
+        self.lastRefill = time.monotonic()
+        self.lock = threading.Lock()
+        self.inFlight = threading.BoundedSemaphore(max(1, maxInFlight))
+
+    def acquire(self):
+        self.inFlight.acquire()
+
+        try:
+            self.waitForToken()
+        except BaseException:
+            self.inFlight.release()
+            raise
+
+    def release(self):
+        self.inFlight.release()
+
+    def waitForToken(self):
+        if not self.requestsPerSecond or self.requestsPerSecond <= 0:
+            return
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.lastRefill) * self.requestsPerSecond)
+                self.lastRefill = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) / self.requestsPerSecond
+
+            time.sleep(wait)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+
+if __name__ == "__main__":
+    limiter = RateLimiter(requestsPerSecond=4, maxInFlight=2)
+
+    start = time.monotonic()
+    for i in range(8):
+        with limiter:
+            print(f"Request {i} at {time.monotonic() - start:.2f}s")
@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta, timezone
+from typing import List, Tuple
+
+from Comet import Comet
+from LightCurve import WINDOWS, LightCurve
+
+# Refresh intervals by 2 day average magnitude, brightest first
+MAGNITUDE_INTERVALS = [
+    (8, timedelta(minutes=30)),
+    (12, timedelta(hours=2)),
+    (15, timedelta(hours=6)),
+    (float('inf'), timedelta(days=1))
+]
+
+# Comets brightening by at least this much between the 2 and 1 day averages
+# are refreshed at the fastest rate
+BRIGHTENING_MAGNITUDE = 0.5
+
+# Comets without recent observations are refreshed less often
+STALE_AFTER = timedelta(days=14)
+STALE_INTERVAL_FACTOR = 4
+
+# Observations a day over the light curve window.  Comets observed less than
+# QUIET bring little new data to a refresh and are checked less often, those
+# observed at least BUSY more often, though never faster than the fastest rate
+QUIET_OBSERVATIONS_PER_DAY = 1
+QUIET_INTERVAL_FACTOR = 2
+BUSY_OBSERVATIONS_PER_DAY = 24
+BUSY_INTERVAL_FACTOR = 0.5
+
+
+class RefreshScheduler:
+    """Decides which comets are due for an observation refresh.
+
+    Each comet gets a refresh interval from its brightness, how quickly it is
+    brightening, how recently it was observed and how often it is observed,
+    going by the observations in its light curve.  Comets not observed for
+    longer than the inactivity window are archived instead of refreshed.
+    """
+
+    def __init__(self, inactivityWindow: timedelta = timedelta(days=60), unknownInterval: timedelta = timedelta(hours=1)):
+        self.inactivityWindow = inactivityWindow
+        self.unknownInterval = unknownInterval
+
+    def refreshInterval(self, comet: Comet, now: datetime) -> timedelta:
+        magnitude = comet.mag2davg or comet.mag1davg
+
+        # Nothing known yet, so check often until there is data to go on
+        if not magnitude or magnitude != magnitude:
+            return self.unknownInterval
+
+        if comet.mag2davg and comet.mag1davg and comet.mag2davg - comet.mag1davg >= BRIGHTENING_MAGNITUDE:
+            return MAGNITUDE_INTERVALS[0][1]
+
+        interval = next(interval for limit, interval in MAGNITUDE_INTERVALS if magnitude <= limit)
+
+        if comet.lastobs and now - comet.lastobs > STALE_AFTER:
+            interval *= STALE_INTERVAL_FACTOR
+
+        rate = self.observationRate(comet)
+        if rate is not None:
+            if rate < QUIET_OBSERVATIONS_PER_DAY:
+                interval *= QUIET_INTERVAL_FACTOR
+            elif rate >= BUSY_OBSERVATIONS_PER_DAY:
+                interval = max(interval * BUSY_INTERVAL_FACTOR, MAGNITUDE_INTERVALS[0][1])
+
+        return interval
+
+    def observationRate(self, comet: Comet) -> float:
+        """Observations with a magnitude per day over the light curve window,
+        None for a comet without a light curve yet.
+        """
+        count = LightCurve.sampleCount(comet.lightcurve)
+        if count is None:
+            return None
+
+        return count / max(WINDOWS)
+
+    def isDue(self, comet: Comet, now: datetime) -> bool:
+        if not comet.lastchecked:
+            return True
+
+        return now - comet.lastchecked >= self.refreshInterval(comet, now)
+
+    def isInactive(self, comet: Comet, now: datetime) -> bool:
+        return bool(comet.lastobs) and now - comet.lastobs > self.inactivityWindow
+
+    def plan(self, comets: List[Comet], now: datetime = None) -> Tuple[List[Comet], List[Comet]]:
+        """Split comets into (due for refresh, to be archived)."""
+        now = now or datetime.now(timezone.utc)
+
+        due = []
+        inactive = []
+
+        for comet in comets:
+            if self.isInactive(comet, now):
+                inactive.append(comet)
+            elif self.isDue(comet, now):
+                due.append(comet)
+
+        return due, inactive
+
+
+if __name__ == "__main__":
+    now = datetime.now(timezone.utc)
+    scheduler = RefreshScheduler()
+
+    for comet in [Comet({'designation': 'C/2025 A6', 'mag1davg': '5.2', 'mag2davg': '5.9', 'lastobs': (now - timedelta(hours=3)).strftime('%Y-%m-%d %H:%M:%S')}),
+                  Comet({'designation': 'C/2025 K1', 'mag1davg': '17.1', 'mag2davg': '17.3', 'lastobs': (now - timedelta(days=20)).strftime('%Y-%m-%d %H:%M:%S')}),
+                  Comet({'designation': 'C/2024 G3', 'mag1davg': '18.1', 'mag2davg': '18.3', 'lastobs': (now - timedelta(days=90)).strftime('%Y-%m-%d %H:%M:%S')})]:
+        print(f"{comet.designation}: every {scheduler.refreshInterval(comet, now)}, inactive: {scheduler.isInactive(comet, now)}")
@@ -0,0 +1,89 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable
+
+from CometStorage import BUSY_TIMEOUT
+
+
+def isFinal(entry: dict) -> bool:
+    """A query-identifier entry for an object with both a permid and a name, which do not change again."""
+    return bool(entry.get('found') and entry.get('permid') and entry.get('name'))
+
+
+class ResolutionCache:
+    """Identities MPC resolved for designations, kept in SQLite between runs.
+
+    Each designation keeps the raw query-identifier entry it resolved to.
+    Entries for final objects, those with both a permid and a name, never
+    expire.  The rest are looked up again once they are older than ttl
+    seconds, as they may still be named or numbered.  Designations MPC did
+    not find are not kept here, DesignationProbe's negative cache covers
+    those with its own, shorter, expiry.
+    """
+
+    def __init__(self, filePath: str, ttl: float = 6 * 60 * 60):
+        self.filePath = filePath
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        # Discovery may run on a pipeline thread
+        self.connection = sqlite3.connect(filePath, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS resolutions (
+                designation TEXT PRIMARY KEY,
+                entry TEXT NOT NULL,
+                resolved REAL NOT NULL,
+                final INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        ''')
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def getMany(self, designations: Iterable[str], now: float = None) -> Dict[str, dict]:
+        """The entries still fresh for designations, keyed by designation."""
+        now = now or time.time()
+        designations = list(designations)
+        results = {}
+
+        with self.lock:
+            # Under SQLite's default limit on bound parameters
+            for start in range(0, len(designations), 500):
+                chunk = designations[start:start + 500]
+                rows = self.connection.execute(
+                    f"SELECT designation, entry FROM resolutions WHERE designation IN ({', '.join('?' * len(chunk))}) AND (final = 1 OR resolved >= ?)",
+                    (*chunk, now - self.ttl)
+                ).fetchall()
+                results.update((designation, json.loads(entry)) for designation, entry in rows)
+
+        return results
+
+    def putMany(self, entries: Dict[str, dict], now: float = None) -> int:
+        """Keep the found entries, returning how many were stored."""
+        now = now or time.time()
+        rows = [(designation, json.dumps(entry), now, 1 if isFinal(entry) else 0) for designation, entry in entries.items() if entry.get('found')]
+
+        with self.lock:
+            self.connection.executemany('INSERT OR REPLACE INTO resolutions (designation, entry, resolved, final) VALUES (?, ?, ?, ?)', rows)
+            self.connection.commit()
+
+        return len(rows)
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(*) FROM resolutions').fetchone()[0]
+
+
+if __name__ == "__main__":
+    cache = ResolutionCache(':memory:', ttl=60)
+
+    cache.putMany({
+        '12P': { 'found': 1, 'permid': '12P', 'name': 'Pons-Brooks' },
+        'C/2025 R2': { 'found': 1, 'permid': None, 'name': None },
+        'C/2025 Z9': { 'found': 0 }
+    }, now=time.time() - 120)
+
+    print(f"Fresh after two minutes: {sorted(cache.getMany(['12P', 'C/2025 R2', 'C/2025 Z9']))}")
@@ -0,0 +1,334 @@
+import hashlib
+import json as jsonlib
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, BinaryIO, Callable, Dict, Iterator
+from urllib.parse import urlsplit
+
+import requests
+
+if TYPE_CHECKING:
+    from Metrics import Metrics
+
+
+class CachedResponse:
+    """The parts of a requests.Response the API classes use, backed by the cache.
+
+    A streamed hit holds the open body file instead of its content, so
+    iter_content reads it a chunk at a time.
+    """
+
+    def __init__(self, url: str, status_code: int, headers: dict, content: bytes = None, fromCache: bool = False, file: BinaryIO = None):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.fromCache = fromCache
+        self.file = file
+        self._content = content
+
+    @property
+    def content(self) -> bytes:
+        if self._content is None and self.file:
+            with self.file:
+                self._content = self.file.read()
+        return self._content
+
+    @property
+    def text(self) -> str:
+        return self.content.decode('utf-8')
+
+    def json(self):
+        return jsonlib.loads(self.content)
+
+    def iter_content(self, chunk_size: int = 1) -> Iterator[bytes]:
+        if self._content is None and self.file:
+            with self.file:
+                while chunk := self.file.read(chunk_size):
+                    yield chunk
+            return
+
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self.url}")
+
+    def close(self):
+        if self.file:
+            self.file.close()
+
+
+class StreamingResponse(CachedResponse):
+    """A streamed network response written to the cache as it is read.
+
+    The body goes to a temp file chunk by chunk and only becomes a cache
+    entry once it has been read to the end, a stream abandoned part way
+    leaves nothing behind.
+    """
+
+    def __init__(self, url: str, response: requests.Response, tempPath: str, onComplete: Callable[[], None]):
+        super().__init__(url, response.status_code, dict(response.headers))
+        self.response = response
+        self.tempPath = tempPath
+        self.onComplete = onComplete
+
+    @property
+    def content(self) -> bytes:
+        if self._content is None:
+            self._content = b''.join(self.iter_content(64 * 1024))
+        return self._content
+
+    def iter_content(self, chunk_size: int = 1) -> Iterator[bytes]:
+        complete = False
+
+        try:
+            with open(self.tempPath, 'wb') as f:
+                for chunk in self.response.iter_content(chunk_size):
+                    f.write(chunk)
+                    yield chunk
+            complete = True
+        finally:
+            self.close()
+
+            if complete:
+                self.onComplete()
+            else:
+                try:
+                    os.remove(self.tempPath)
+                except FileNotFoundError:
+                    pass
+
+    def close(self):
+        self.response.close()
+
+
+class ResponseCache:
+    """Content-addressed on-disk cache for MPC API responses.
+
+    Entries are keyed by a hash of the endpoint and request body.  Each
+    endpoint can have its own TTL.  Stale entries that carry an ETag or
+    Last-Modified validator are revalidated with a conditional request, and
+    the least recently used entries are evicted once the cache grows past
+    maxBytes.  A running total of the bytes stored means the directory is
+    only scanned when it may have grown past maxBytes.  With stream=True a
+    response is never held in memory whole, a hit is read from its file and
+    a miss is written to the cache as the caller reads it.
+    """
+
+    def __init__(self, directory: str, ttls: Dict[str, float] = None, defaultTtl: float = 3600, maxBytes: int = 256 * 1024 * 1024, metrics: 'Metrics' = None):
+        self.directory = directory
+        self.metrics = metrics
+        self.ttls = ttls or {}
+        self.defaultTtl = defaultTtl
+        self.maxBytes = maxBytes
+        self.lock = threading.Lock()
+        # Bytes in the directory, from the last scan plus what was stored
+        # since, None until the first scan
+        self.totalBytes = None
+
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, url: str, json: dict = None, data: str = None, send: Callable[[dict], requests.Response] = None, stream: bool = False) -> CachedResponse:
+        """GET url with the given body, answering from the cache while the entry is fresh.
+
+        send(headers) performs the network request when one is needed; it
+        defaults to a plain requests.get with the same body, and should
+        itself stream when stream is True.
+        """
+        if send is None:
+            send = lambda headers: requests.get(url, json=json, data=data, headers=headers, stream=stream)
+
+        key = self.key(url, json, data)
+        meta = self.readMeta(key)
+
+        if meta and time.time() - meta['fetched'] < self.ttls.get(url, self.defaultTtl):
+            cached = self.cachedResponse(url, key, meta, stream)
+            if cached is not None:
+                self.touch(key)
+                self.count(url, 'hit')
+                return cached
+
+        headers = {}
+        if meta:
+            if meta['headers'].get('ETag'):
+                headers['If-None-Match'] = meta['headers']['ETag']
+            if meta['headers'].get('Last-Modified'):
+                headers['If-Modified-Since'] = meta['headers']['Last-Modified']
+
+        response = send(headers)
+
+        if response.status_code == 304 and meta:
+            response.close()
+            cached = self.cachedResponse(url, key, meta, stream)
+            if cached is not None:
+                meta['fetched'] = time.time()
+                self.writeMeta(key, meta)
+                self.touch(key)
+                self.count(url, 'revalidated')
+                return cached
+
+            # The body went missing, so fetch it again without validators
+            response = send({})
+
+        self.count(url, 'miss')
+
+        if stream and response.status_code == 200:
+            tempPath = self.tempPath(self.contentPath(key))
+            return StreamingResponse(url, response, tempPath, lambda: self.storeFile(key, tempPath, response.headers))
+
+        result = CachedResponse(url, response.status_code, dict(response.headers), response.content)
+        response.close()
+
+        if response.status_code == 200:
+            self.store(key, result)
+
+        return result
+
+    def cachedResponse(self, url: str, key: str, meta: dict, stream: bool) -> CachedResponse:
+        """The stored response for key, None if its body has gone."""
+        if stream:
+            try:
+                # Open now, so an eviction meanwhile cannot take the body away
+                file = open(self.contentPath(key), 'rb')
+            except FileNotFoundError:
+                return None
+            return CachedResponse(url, meta['status'], meta['headers'], fromCache=True, file=file)
+
+        content = self.readContent(key)
+        if content is None:
+            return None
+        return CachedResponse(url, meta['status'], meta['headers'], content, fromCache=True)
+
+    def count(self, url: str, result: str):
+        if self.metrics:
+            self.metrics.increment('cache_requests', endpoint=urlsplit(url).path, result=result)
+
+    def key(self, url: str, json: dict, data: str) -> str:
+        body = jsonlib.dumps(json, sort_keys=True) if json is not None else (data or '')
+        return hashlib.sha256(f"GET {url}\n{body}".encode('utf-8')).hexdigest()
+
+    def store(self, key: str, response: CachedResponse):
+        before = self.entrySize(key)
+        self.writeFile(self.contentPath(key), response.content)
+        self.writeMeta(key, self.meta(response.headers))
+        self.stored(key, before)
+
+    def storeFile(self, key: str, tempPath: str, headers: dict):
+        """Make a fully written temp file the body of key."""
+        before = self.entrySize(key)
+        os.replace(tempPath, self.contentPath(key))
+        self.writeMeta(key, self.meta(headers))
+        self.stored(key, before)
+
+    def stored(self, key: str, before: int):
+        """Count an entry that took the place of before bytes, evicting once over maxBytes."""
+        with self.lock:
+            if self.totalBytes is not None:
+                self.totalBytes += self.entrySize(key) - before
+                if self.totalBytes <= self.maxBytes:
+                    return
+
+        self.evict()
+
+    def entrySize(self, key: str) -> int:
+        size = 0
+        for path in (self.contentPath(key), self.metaPath(key)):
+            try:
+                size += os.stat(path).st_size
+            except FileNotFoundError:
+                pass
+        return size
+
+    def meta(self, headers: dict) -> dict:
+        return {
+            'fetched': time.time(),
+            'status': 200,
+            'headers': { name: headers[name] for name in ('ETag', 'Last-Modified') if name in headers }
+        }
+
+    def evict(self):
+        """Scan the directory and remove the least recently used entries past maxBytes.
+
+        Other processes sharing the directory are only seen here, so the
+        running total is reset from the scan.
+        """
+        with self.lock:
+            entries = []
+            total = 0
+
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                total += stat.st_size
+                if name.endswith('.body'):
+                    entries.append((stat.st_mtime, stat.st_size, name[:-len('.body')]))
+
+            if total <= self.maxBytes:
+                self.totalBytes = total
+                return
+
+            # Down to 90% of maxBytes, so the next scan is a good many stores away
+            target = self.maxBytes * 0.9
+            entries.sort()
+            for _, size, key in entries:
+                if total <= target:
+                    break
+                for path in (self.contentPath(key), self.metaPath(key)):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                total -= size
+
+            self.totalBytes = total
+
+    def clear(self):
+        with self.lock:
+            for name in os.listdir(self.directory):
+                os.remove(os.path.join(self.directory, name))
+            self.totalBytes = None
+
+    def contentPath(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.body")
+
+    def metaPath(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def readContent(self, key: str) -> bytes:
+        try:
+            with open(self.contentPath(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def readMeta(self, key: str) -> dict:
+        try:
+            with open(self.metaPath(key), 'r') as f:
+                return jsonlib.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def writeMeta(self, key: str, meta: dict):
+        self.writeFile(self.metaPath(key), jsonlib.dumps(meta).encode('utf-8'))
+
+    def tempPath(self, path: str) -> str:
+        return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    def writeFile(self, path: str, content: bytes):
+        # Write to a temp file first so readers never see a partial entry
+        tempPath = self.tempPath(path)
+        with open(tempPath, 'wb') as f:
+            f.write(content)
+        os.replace(tempPath, path)
+
+    def touch(self, key: str):
+        # The body's mtime doubles as the LRU timestamp
+        try:
+            os.utime(self.contentPath(key))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,202 @@
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Callable, List
+
+from CometStorage import BUSY_TIMEOUT
+
+
+def shardOf(designation: str, shardCount: int) -> int:
+    """Stable shard for a designation, the same in every process and run."""
+    return zlib.crc32(designation.encode('utf-8')) % shardCount
+
+
+class ShardLeases:
+    """Shard leases for refresh workers, kept in a SQLite database shared by the workers.
+
+    Every shard has a row with the worker that holds it, when that lease
+    expires and the last refresh cycle completed for it.  The current cycle
+    is the lowest one not yet completed by every shard, so once each shard
+    has been refreshed the next worker to start begins a new cycle.  A
+    worker that dies simply lets its lease expire and another worker picks
+    the shard up.  complete() checks the lease and writes the worker's
+    results in the same transaction, so a worker that lost its lease can
+    never overwrite a newer result.
+    """
+
+    def __init__(self, filePath: str, shardCount: int):
+        self.filePath = filePath
+        self.shardCount = shardCount
+        self.lock = threading.Lock()
+        # Transactions are begun explicitly, so claims can take the write lock up front
+        self.connection = sqlite3.connect(filePath, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS shard_leases (
+                shard INTEGER PRIMARY KEY,
+                owner TEXT NOT NULL DEFAULT '',
+                expires REAL NOT NULL DEFAULT 0,
+                completed INTEGER NOT NULL DEFAULT 0,
+                finished REAL
+            )
+        ''')
+        self.ensureShards()
+
+    def close(self):
+        self.connection.close()
+
+    def ensureShards(self):
+        with self.transaction() as connection:
+            existing = connection.execute('SELECT COUNT(*), COALESCE(MAX(shard) + 1, 0) FROM shard_leases').fetchone()
+
+            if existing[0] and existing[1] != self.shardCount:
+                raise ValueError(f"{self.filePath} is set up for {existing[1]} shards, not {self.shardCount}")
+
+            # New shards join at the current cycle rather than trigger a catch-up
+            completed = connection.execute('SELECT COALESCE(MIN(completed), 0) FROM shard_leases').fetchone()[0]
+            connection.executemany(
+                'INSERT OR IGNORE INTO shard_leases (shard, completed) VALUES (?, ?)',
+                [(shard, completed) for shard in range(self.shardCount)]
+            )
+
+    def transaction(self) -> 'ShardTransaction':
+        return ShardTransaction(self)
+
+    def currentCycle(self) -> int:
+        with self.lock:
+            return self.connection.execute('SELECT MIN(completed) + 1 FROM shard_leases').fetchone()[0]
+
+    def claim(self, owner: str, cycle: int, ttl: float, now: float = None) -> int:
+        """Lease the first shard not yet completed in cycle, or None when none is free."""
+        now = now or time.time()
+
+        with self.transaction() as connection:
+            row = connection.execute(
+                "SELECT shard FROM shard_leases WHERE completed < ? AND (owner = '' OR expires < ?) ORDER BY shard LIMIT 1",
+                (cycle, now)
+            ).fetchone()
+
+            if row is None:
+                return None
+
+            connection.execute('UPDATE shard_leases SET owner = ?, expires = ? WHERE shard = ?', (owner, now + ttl, row[0]))
+
+        return row[0]
+
+    def renew(self, shard: int, owner: str, ttl: float) -> bool:
+        """Extend a lease, False if it has expired and been taken by someone else."""
+        now = time.time()
+
+        with self.transaction() as connection:
+            cursor = connection.execute(
+                'UPDATE shard_leases SET expires = ? WHERE shard = ? AND owner = ? AND expires >= ?',
+                (now + ttl, shard, owner, now)
+            )
+
+        return cursor.rowcount == 1
+
+    def release(self, shard: int, owner: str):
+        """Give a shard back without completing it."""
+        with self.transaction() as connection:
+            connection.execute("UPDATE shard_leases SET owner = '', expires = 0 WHERE shard = ? AND owner = ?", (shard, owner))
+
+    def complete(self, shard: int, owner: str, cycle: int, write: Callable[[sqlite3.Connection], None]) -> bool:
+        """Run write and mark the shard done, all in one transaction, if owner still holds the lease.
+
+        Returns False, having written nothing, when the lease was lost.
+        """
+        now = time.time()
+
+        with self.transaction() as connection:
+            row = connection.execute('SELECT owner, expires FROM shard_leases WHERE shard = ?', (shard,)).fetchone()
+
+            if row is None or row[0] != owner or row[1] < now:
+                return False
+
+            write(connection)
+            connection.execute(
+                "UPDATE shard_leases SET owner = '', expires = 0, completed = MAX(completed, ?), finished = ? WHERE shard = ?",
+                (cycle, now, shard)
+            )
+
+        return True
+
+    def status(self) -> List[tuple]:
+        with self.lock:
+            return self.connection.execute('SELECT shard, owner, expires, completed, finished FROM shard_leases ORDER BY shard').fetchall()
+
+
+class ShardTransaction:
+    """BEGIN IMMEDIATE ... COMMIT, rolled back on an exception.
+
+    Taking the write lock at the start means two workers can never both
+    read a shard as free and then both claim it.
+    """
+
+    def __init__(self, leases: ShardLeases):
+        self.leases = leases
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.leases.lock.acquire()
+        try:
+            self.leases.connection.execute('BEGIN IMMEDIATE')
+        except Exception:
+            self.leases.lock.release()
+            raise
+        return self.leases.connection
+
+    def __exit__(self, excType, exc, traceback):
+        try:
+            self.leases.connection.execute('COMMIT' if excType is None else 'ROLLBACK')
+        finally:
+            self.leases.lock.release()
+
+
+class LeaseHeartbeat:
+    """Renews a shard lease in the background while the shard is worked on."""
+
+    def __init__(self, leases: ShardLeases, shard: int, owner: str, ttl: float):
+        self.leases = leases
+        self.shard = shard
+        self.owner = owner
+        self.ttl = ttl
+        self.lost = False
+        self.stopEvent = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def __enter__(self) -> 'LeaseHeartbeat':
+        self.thread.start()
+        return self
+
+    def __exit__(self, excType, exc, traceback):
+        self.stopEvent.set()
+        self.thread.join()
+
+    def run(self):
+        while not self.stopEvent.wait(self.ttl / 3):
+            try:
+                if not self.leases.renew(self.shard, self.owner, self.ttl):
+                    print(f"Lost the lease on shard {self.shard}")
+                    self.lost = True
+                    return
+            except sqlite3.Error as e:
+                # The lease may still be valid, try again on the next beat
+                print(f"Error renewing the lease on shard {self.shard}: {e}")
+
+
+if __name__ == "__main__":
+    leases = ShardLeases(':memory:', 4)
+    cycle = leases.currentCycle()
+
+    first = leases.claim('worker-a', cycle, ttl=60)
+    second = leases.claim('worker-b', cycle, ttl=60)
+    print(f"Cycle {cycle}: worker-a has shard {first}, worker-b has shard {second}")
+
+    print(f"worker-a completed: {leases.complete(first, 'worker-a', cycle, lambda connection: None)}")
+    print(f"worker-a completing shard {second}: {leases.complete(second, 'worker-a', cycle, lambda connection: None)}")
+
+    for designation in ['C/2025 A6', 'C/2025 K1', 'C/2025 R2']:
+        print(f"{designation} is in shard {shardOf(designation, 4)}")
+
+    print(leases.status())
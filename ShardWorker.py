@@ -0,0 +1,148 @@
+import os
+import socket
+import time
+from typing import Dict, List
+
+from CometDiscovery import (count_events, create_outbox, create_response_cache, create_subscribers, create_transport,
+                            drain_outbox, notify_magnitude_changes)
+from CometList import OBS_FORMAT, CometList
+from CometStorage import SqliteCometStorage
+from Metrics import Metrics
+from RefreshScheduler import RefreshScheduler
+from ShardLeases import LeaseHeartbeat, ShardLeases
+
+# Times a worker tries a shard that keeps failing before leaving it to the others
+MAX_SHARD_ATTEMPTS = 3
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class ShardWorker:
+    """Refreshes the shards of the catalogue it can lease until none are left.
+
+    Comets are split into shards by shardOf(designation).  Any number of
+    workers can run at once against the same comet database, each claiming
+    shards through ShardLeases.  A shard's changed comets are merged in the
+    same transaction that marks it complete, and its notifications are only
+    recorded in the shared outbox once that merge succeeds, so a shard
+    picked up again after a lost lease is never reported twice.  Each
+    worker drains the outbox after its shards, the outbox's claims keep
+    workers from delivering the same notification.  Discovery is not
+    sharded and stays with the normal update run or the daemon.
+
+    A shard that fails keeps its lease until it expires, so the worker moves
+    on to other shards instead of claiming the same one straight back.
+    After MAX_SHARD_ATTEMPTS failures the worker stops taking it.
+    """
+
+    def __init__(self, storage: SqliteCometStorage, shardCount: int, workerId: str = None, leaseTtl: float = 600, refreshScheduler: RefreshScheduler = None, metrics: Metrics = None, observationFormat: str = OBS_FORMAT):
+        self.storage = storage
+        self.shardCount = shardCount
+        self.workerId = workerId or default_worker_id()
+        self.leaseTtl = leaseTtl
+        self.metrics = metrics or Metrics()
+        self.leases = ShardLeases(storage.filePath, shardCount)
+
+        self.transport = create_transport(self.metrics)
+        self.cometList = CometList(create_response_cache(self.metrics), self.transport, refreshScheduler, metrics=self.metrics, observationFormat=observationFormat)
+        self.subscribers = create_subscribers(self.transport)
+        self.outbox = create_outbox()
+
+    def close(self):
+        self.leases.close()
+        self.outbox.close()
+        self.transport.close()
+
+    def run(self) -> List[int]:
+        """Work through the current cycle, returning the shards this worker completed."""
+        cycle = self.leases.currentCycle()
+        completed = []
+        failures: Dict[int, int] = {}
+
+        print(f"Worker {self.workerId} starting refresh cycle {cycle} over {self.shardCount} shards")
+
+        # Loaded once for the cycle, a shard is only ever merged by the worker
+        # holding it, so no other worker changes this one's comets meanwhile
+        self.cometList.load(self.storage)
+
+        while True:
+            shard = self.leases.claim(self.workerId, cycle, self.leaseTtl)
+
+            if shard is None:
+                break
+
+            if failures.get(shard, 0) >= MAX_SHARD_ATTEMPTS:
+                print(f"Leaving shard {shard} to other workers after {failures[shard]} failures")
+                self.leases.release(shard, self.workerId)
+                break
+
+            if shard in failures:
+                # Start again from the stored comets, not what the failed attempt left behind
+                self.cometList.load(self.storage)
+
+            start = time.monotonic()
+
+            try:
+                with self.metrics.phase(f"shard_{shard}"):
+                    merged = self.refreshShard(shard, cycle)
+            except Exception as ex:
+                print(f"Error refreshing shard {shard}: {ex}")
+                self.metrics.increment('shard_errors')
+                failures[shard] = failures.get(shard, 0) + 1
+                # The lease is left to expire rather than released, so the
+                # same shard is not claimed straight back
+                continue
+
+            if merged:
+                completed.append(shard)
+
+            print(f"Shard {shard} {'merged' if merged else 'dropped'} after {time.monotonic() - start:.1f}s")
+
+        print(f"Worker {self.workerId} finished cycle {cycle}, completed shards: {completed or 'none'}")
+
+        with self.metrics.phase('notify'):
+            drain_outbox(self.outbox, self.subscribers, self.metrics)
+
+        return completed
+
+    def refreshShard(self, shard: int, cycle: int) -> bool:
+        cometList = self.cometList
+        cometList.clearEvents()
+
+        with LeaseHeartbeat(self.leases, shard, self.workerId, self.leaseTtl) as heartbeat:
+            cometList.updateObservationData(shard=(shard, self.shardCount))
+
+        if heartbeat.lost:
+            print(f"Dropping the results for shard {shard}, another worker holds it now")
+            self.metrics.increment('shard_leases_lost')
+            return False
+
+        # Only the fields this worker changed are written, so a name or permid
+        # discovery stored since the cycle loaded is not overwritten
+        changes = self.storage.changes(cometList.shardComets(cometList.comets, (shard, self.shardCount)))
+
+        if not self.leases.complete(shard, self.workerId, cycle, lambda connection: self.storage.writeChanges(connection, changes)):
+            print(f"Dropping the results for shard {shard}, the lease expired before they were merged")
+            self.metrics.increment('shard_leases_lost')
+            return False
+
+        self.storage.markSaved(changes)
+        self.metrics.increment('shards_completed')
+        self.metrics.increment('shard_rows_merged', len(changes))
+
+        notify_magnitude_changes(cometList, self.outbox, self.subscribers)
+        count_events(cometList, self.metrics)
+
+        return True
+
+
+if __name__ == "__main__":
+    storage = SqliteCometStorage('comets.db')
+    worker = ShardWorker(storage, shardCount=4)
+
+    try:
+        worker.run()
+    finally:
+        worker.close()
+        storage.close()
@@ -0,0 +1,200 @@
+import json
+import os
+from bisect import bisect_left, bisect_right
+from typing import TYPE_CHECKING, Dict, Iterable, List, Set
+
+from Comet import Comet
+from CometList import SUDDEN_INCREASE_MAGNITUDE, THRESHOLDS, MagnitudeChange
+
+if TYPE_CHECKING:
+    from Discord import Discord
+    from HttpTransport import HttpTransport
+
+# The subscriber used when there is no subscribers file, posting to DISCORD_WEBHOOK_URL
+DEFAULT_SUBSCRIBER = 'default'
+
+# Notifications a subscriber can ask for, the magnitude thresholds brightest first
+NOTIFICATION_KINDS = ['discovery', 'update'] + [kind for kind, _ in THRESHOLDS] + ['suddenincrease']
+
+
+class Subscriber:
+    """One Discord webhook and the notifications it wants.
+
+    thresholds maps 'spectacular', 'nakedeye' and 'binoc' to the 2 day
+    average magnitude a comet has to brighten past, None turning that one
+    off.  suddenIncrease is the brightening in magnitudes that counts as
+    sudden.  events limits the notifications to those kinds.  A watchlist of
+    designations, permids or names limits update and magnitude
+    notifications to those comets, discoveries are never on a watchlist yet.
+    """
+
+    def __init__(self, name: str, webhookUrl: str, thresholds: Dict[str, float] = None, suddenIncrease: float = SUDDEN_INCREASE_MAGNITUDE, events: Iterable[str] = None, watchlist: Iterable[str] = None):
+        self.name = name
+        self.webhookUrl = webhookUrl
+        self.thresholds = { **dict(THRESHOLDS), **(thresholds or {}) }
+        self.suddenIncrease = suddenIncrease
+        self.events: Set[str] = set(events if events is not None else NOTIFICATION_KINDS)
+        self.watchlist: Set[str] = { key.lower() for key in watchlist or [] }
+
+        unknown = (self.events - set(NOTIFICATION_KINDS)) | (set(self.thresholds) - set(dict(THRESHOLDS)))
+        if unknown:
+            raise ValueError(f"Subscriber {name}: unknown notification kinds {', '.join(sorted(unknown))}")
+
+    @classmethod
+    def fromDict(cls, values: dict) -> 'Subscriber':
+        """A subscriber from its subscribers file entry.
+
+        The webhook is given as webhook, or as webhookEnv naming the
+        environment variable that holds it so the file need not hold secrets.
+        """
+        webhookUrl = values.get('webhook') or os.getenv(values.get('webhookEnv') or '')
+
+        return cls(values['name'],
+                   webhookUrl,
+                   values.get('thresholds'),
+                   values.get('suddenIncrease', SUDDEN_INCREASE_MAGNITUDE),
+                   values.get('events'),
+                   values.get('watchlist'))
+
+    def isConfigured(self) -> bool:
+        return bool(self.webhookUrl) and self.webhookUrl != "YOUR_DISCORD_WEBHOOK_URL_HERE"
+
+
+class SubscriberRegistry:
+    """The subscribers every refresh is fanned out to.
+
+    The comets are fetched and analysed once, then each event is matched
+    against the subscribers through indexes built up front: the subscribers
+    wanting each kind, every threshold sorted by magnitude so a change from
+    prior to current finds the thresholds it crossed by bisection, and the
+    watchlists keyed by designation, permid and name.  Matching costs the
+    same however many subscribers there are, and MPC never sees them.
+    """
+
+    def __init__(self, subscribers: List[Subscriber], transport: 'HttpTransport' = None):
+        self.subscribers: Dict[str, Subscriber] = {}
+        for subscriber in subscribers:
+            if subscriber.name in self.subscribers:
+                raise ValueError(f"Subscriber {subscriber.name} is listed twice")
+            self.subscribers[subscriber.name] = subscriber
+
+        self.transport = transport
+        self.discords: Dict[str, 'Discord'] = {}
+
+        self.byKind: Dict[str, List[str]] = { kind: [s.name for s in subscribers if kind in s.events] for kind in NOTIFICATION_KINDS }
+
+        # kind -> (threshold magnitudes ascending, subscriber names in the same order)
+        self.thresholds: Dict[str, tuple] = {}
+        for kind, _ in THRESHOLDS:
+            entries = sorted((s.thresholds[kind], s.name) for s in subscribers if kind in s.events and s.thresholds.get(kind) is not None)
+            self.thresholds[kind] = ([magnitude for magnitude, _ in entries], [name for _, name in entries])
+
+        entries = sorted((s.suddenIncrease, s.name) for s in subscribers if 'suddenincrease' in s.events and s.suddenIncrease is not None)
+        self.suddenIncreases = ([increase for increase, _ in entries], [name for _, name in entries])
+
+        # Subscribers with a watchlist only hear about the comets on it
+        self.watched: Set[str] = { s.name for s in subscribers if s.watchlist }
+        self.watchers: Dict[str, Set[str]] = {}
+        for subscriber in subscribers:
+            for key in subscriber.watchlist:
+                self.watchers.setdefault(key, set()).add(subscriber.name)
+
+    @classmethod
+    def load(cls, filePath: str, transport: 'HttpTransport' = None) -> 'SubscriberRegistry':
+        """The subscribers in a JSON file, or the default subscriber when there is no file.
+
+        The file holds {"subscribers": [{"name": ..., "webhookEnv": ...,
+        "thresholds": {"binoc": 9}, "events": [...], "watchlist": [...]}]}.
+        """
+        try:
+            with open(filePath, 'r') as f:
+                config = json.load(f)
+        except FileNotFoundError:
+            return cls.default(transport)
+
+        return cls([Subscriber.fromDict(values) for values in config.get('subscribers', [])], transport)
+
+    @classmethod
+    def default(cls, transport: 'HttpTransport' = None) -> 'SubscriberRegistry':
+        return cls([Subscriber(DEFAULT_SUBSCRIBER, os.getenv('DISCORD_WEBHOOK_URL'))], transport)
+
+    def __len__(self) -> int:
+        return len(self.subscribers)
+
+    def configuredNames(self) -> List[str]:
+        return [name for name, subscriber in self.subscribers.items() if subscriber.isConfigured()]
+
+    def discordFor(self, name: str) -> 'Discord':
+        """The Discord client for a subscriber's webhook, each keeps its own rate limit."""
+        discord = self.discords.get(name)
+
+        if discord is None:
+            from Discord import Discord
+
+            discord = self.discords[name] = Discord(self.subscribers[name].webhookUrl, self.transport)
+
+        return discord
+
+    def match(self, kind: str, comet: Comet) -> List[str]:
+        """Subscribers to notify of a 'discovery' or 'update' of comet."""
+        names = self.byKind.get(kind, [])
+
+        if kind == 'discovery':
+            return list(names)
+
+        return self.watching(names, comet)
+
+    def matchChange(self, change: MagnitudeChange) -> Dict[str, List[str]]:
+        """Notification kind -> subscribers to notify, for a change in a comet's 2 day average.
+
+        Like evaluateMagnitudes, a threshold is crossed when prior is above it
+        and current at or below it, and each subscriber hears only of the
+        brightest threshold it crossed.
+        """
+        matches: Dict[str, List[str]] = {}
+
+        if change.prior is None or change.current is None:
+            return matches
+
+        notified = set()
+        for kind, _ in THRESHOLDS:
+            magnitudes, names = self.thresholds[kind]
+            # Thresholds in [current, prior) are the ones crossed
+            crossed = [name for name in names[bisect_left(magnitudes, change.current):bisect_left(magnitudes, change.prior)] if name not in notified]
+
+            if crossed:
+                notified.update(crossed)
+                matches[kind] = crossed
+
+        increases, names = self.suddenIncreases
+        sudden = names[:bisect_right(increases, change.increase)]
+        if sudden:
+            matches['suddenincrease'] = sudden
+
+        return { kind: watching for kind, names in matches.items() if (watching := self.watching(names, change.comet)) }
+
+    def watching(self, names: List[str], comet: Comet) -> List[str]:
+        if not self.watched:
+            return list(names)
+
+        watchers = set()
+        for key in (comet.designation, comet.permid, comet.name):
+            if key:
+                watchers |= self.watchers.get(key.lower(), set())
+
+        return [name for name in names if name not in self.watched or name in watchers]
+
+
+if __name__ == "__main__":
+    registry = SubscriberRegistry([
+        Subscriber('club', 'https://discord.com/api/webhooks/club'),
+        Subscriber('observatory', 'https://discord.com/api/webhooks/observatory', thresholds={ 'binoc': 11 }, suddenIncrease=0.5),
+        Subscriber('lemmon-fans', 'https://discord.com/api/webhooks/lemmon', events=['binoc', 'nakedeye'], watchlist=['C/2025 A6'])
+    ])
+
+    lemmon = Comet({ 'designation': 'C/2025 A6', 'name': 'Lemmon' })
+    other = Comet({ 'designation': 'C/2025 K1' })
+
+    print(f"Lemmon 8.9 -> 7.6: {registry.matchChange(MagnitudeChange(lemmon, 8.9, 7.6))}")
+    print(f"C/2025 K1 11.4 -> 10.8: {registry.matchChange(MagnitudeChange(other, 11.4, 10.8))}")
+    print(f"Discovery of C/2025 K1: {registry.match('discovery', other)}")
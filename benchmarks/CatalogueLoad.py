@@ -0,0 +1,112 @@
+"""
+Compare loading a large comet catalogue as Comet objects and as a CometTable.
+
+Run from the repository root:
+    python -m benchmarks.CatalogueLoad --sizes 10000 100000
+
+Each load runs in a fresh interpreter so the reported RSS, the peak during
+the load and what is still held afterwards, belongs to that load alone.
+Linux only, the figures come from /proc.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+from Comet import DATETIME_FORMAT, Comet
+from CometStorage import CsvCometStorage, SqliteCometStorage
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+NAMES = ['ATLAS', 'PANSTARRS', 'Lemmon', 'NEOWISE', 'LINEAR', 'Catalina', 'SWAN', 'Borisov', '', '', '']
+
+# Loads the catalogue in a child process and reports the time, peak and
+# retained RSS as JSON
+LOADER = f"""
+import gc, json, sys, time
+sys.path.insert(0, {REPO_ROOT!r})
+from CometList import CometList
+from CometStorage import CsvCometStorage, SqliteCometStorage
+
+def memory(field):
+    # ru_maxrss would carry over the parent's peak across exec, VmHWM does not
+    with open('/proc/self/status') as f:
+        return next(int(line.split()[1]) for line in f if line.startswith(field + ':'))
+
+kind, path, columnar = sys.argv[1], sys.argv[2], sys.argv[3] == 'columnar'
+storage = CsvCometStorage(path) if kind == 'csv' else SqliteCometStorage(path)
+before = memory('VmRSS')
+
+start = time.perf_counter()
+cometList = CometList(columnar=columnar)
+cometList.load(storage)
+active = len(cometList.activeComets())
+elapsed = time.perf_counter() - start
+
+peak = memory('VmHWM')
+gc.collect()
+print(json.dumps({{'seconds': elapsed, 'peakKiB': peak - before, 'retainedKiB': memory('VmRSS') - before, 'comets': len(cometList.registry), 'active': active}}))
+"""
+
+
+def makeCatalogue(count: int, activeFraction: float, seed: int = 1) -> list:
+    random.seed(seed)
+    start = datetime(1990, 1, 1)
+
+    comets = []
+    for i in range(count):
+        lastobs = start + timedelta(seconds=random.randint(0, 36 * 365 * 86400))
+        name = random.choice(NAMES)
+        comets.append(Comet({
+            'designation': f"C/{1990 + i // 2400} {'ABCDEFGHJKLMNOPQRSTUVWXY'[(i // 100) % 24]}{i % 100 + 1}",
+            'permid': f"{i + 1}P" if random.random() < 0.05 else '',
+            'name': name,
+            'discoverer': name.upper(),
+            'mag1davg': f"{random.uniform(5, 22):.2f}",
+            'mag2davg': f"{random.uniform(5, 22):.2f}",
+            'lastobs': lastobs.strftime(DATETIME_FORMAT),
+            'lastupdate': (lastobs + timedelta(days=1)).strftime(DATETIME_FORMAT),
+            'lastchecked': (lastobs + timedelta(days=2)).strftime(DATETIME_FORMAT),
+            'archive': random.random() >= activeFraction
+        }))
+
+    return comets
+
+
+def measure(kind: str, path: str, mode: str) -> dict:
+    result = subprocess.run([sys.executable, '-c', LOADER, kind, path, mode], capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser('Benchmark loading a large catalogue as objects and as columns')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000], help='Catalogue sizes to test')
+    parser.add_argument('--active', type=float, default=0.01, help='Fraction of the catalogue that is not archived')
+    args = parser.parse_args()
+
+    print(f"{'comets':>8} {'storage':<8} {'mode':<9} {'load ms':>10} {'peak MiB':>9} {'kept MiB':>9} {'active':>8}")
+
+    with tempfile.TemporaryDirectory() as workDir:
+        for size in args.sizes:
+            comets = makeCatalogue(size, args.active)
+
+            csvPath = os.path.join(workDir, f"catalogue_{size}.csv")
+            CsvCometStorage(csvPath).save(comets)
+
+            dbPath = os.path.join(workDir, f"catalogue_{size}.db")
+            storage = SqliteCometStorage(dbPath)
+            storage.save(comets)
+            storage.close()
+
+            for kind, path in [('csv', csvPath), ('sqlite', dbPath)]:
+                for mode in ['objects', 'columnar']:
+                    result = measure(kind, path, mode)
+                    print(f"{result['comets']:>8} {kind:<8} {mode:<9} {result['seconds'] * 1000:>10.1f} {result['peakKiB'] / 1024:>9.1f} {result['retainedKiB'] / 1024:>9.1f} {result['active']:>8}")
+
+
+if __name__ == "__main__":
+    main()
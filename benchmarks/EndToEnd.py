@@ -0,0 +1,194 @@
+"""
+Time updateAndCheckNotifications end to end against the local stand-in server.
+
+Run from the repository root:
+    python -m benchmarks.EndToEnd --comets 10 1000 10000 --observations 100 1000 --runs 2
+
+Each catalogue size and observation count runs in its own scratch directory
+with a fresh comet database and response cache.  The first run fetches
+everything; later runs show the steady state where the
+refresh scheduler and caches skip most of the work.  Timings are reported
+for the whole update and for each phase: loading the comets, discovery,
+the observation refresh, Discord notifications and saving, along with the
+time until the first notification reached the webhook.  Runs are
+pipelined unless --phased is given; in a pipelined run discovery, the
+refresh and notifications overlap, so their times add up to more than the
+total.
+"""
+import argparse
+import contextlib
+import functools
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+from benchmarks.StandInServer import StandInServer, makeCatalogue
+
+PHASES = ['load', 'discovery', 'observations', 'notify', 'save']
+
+
+class PhaseTimer:
+    """Accumulates the time spent in the methods that make up each phase."""
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+        self.originals = []
+
+    def wrap(self, owner, methodName: str, phase: str, **overrides):
+        original = getattr(owner, methodName)
+        self.originals.append((owner, methodName, original))
+
+        @functools.wraps(original)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **{ **kwargs, **overrides })
+            finally:
+                self.seconds[phase] = self.seconds.get(phase, 0.0) + time.perf_counter() - start
+
+        setattr(owner, methodName, timed)
+
+    def restore(self):
+        for owner, methodName, original in reversed(self.originals):
+            setattr(owner, methodName, original)
+        self.originals = []
+
+    def reset(self):
+        self.seconds = {}
+
+
+def writeCatalogue(filePath: str, catalogue: List[str]):
+    from Comet import Comet
+    from CometStorage import CsvCometStorage
+
+    lastobs = datetime.now(timezone.utc) - timedelta(days=1)
+
+    CsvCometStorage(filePath).save(Comet({
+        'designation': designation,
+        'mag1davg': '12',
+        'mag2davg': '12',
+        'lastobs': lastobs
+    }) for designation in catalogue)
+
+
+def runCase(server: StandInServer, comets: int, observations: int, args) -> List[dict]:
+    import CometDiscovery
+    from CometList import CometList
+    from NotificationOutbox import NotificationOutbox
+
+    catalogue = makeCatalogue(comets)
+    server.configure(catalogue, observations, args.newcomets)
+
+    timer = PhaseTimer()
+    timer.wrap(CometList, 'load', 'load')
+    timer.wrap(CometList, 'loadRecentComets', 'discovery')
+    if args.obsrate:
+        timer.wrap(CometList, 'refreshObservations', 'observations', requestsPerSecond=args.obsrate)
+    else:
+        timer.wrap(CometList, 'refreshObservations', 'observations')
+    timer.wrap(NotificationOutbox, 'drain', 'notify')
+    timer.wrap(CometList, 'save', 'save')
+
+    results = []
+    workDir = os.getcwd()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)
+        try:
+            writeCatalogue(CometDiscovery.CSV_FILE, catalogue)
+            storage = CometDiscovery.create_storage(args.storage)
+
+            for run in range(1, args.runs + 1):
+                timer.reset()
+                server.resetCounters()
+
+                output = sys.stdout if args.verbose else io.StringIO()
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(output):
+                    CometDiscovery.updateAndCheckNotifications(storage, CometDiscovery.create_refresh_scheduler(60), columnar=args.columnar, pipelined=not args.phased)
+                elapsed = time.perf_counter() - start
+
+                counters = server.resetCounters()
+                results.append({
+                    'comets': comets,
+                    'observations': observations,
+                    'run': run,
+                    'seconds': elapsed,
+                    'firstAlert': counters.firstDiscordPost - start if counters.firstDiscordPost else None,
+                    'phases': { phase: timer.seconds.get(phase, 0.0) for phase in PHASES },
+                    'server': counters.toDict()
+                })
+
+            storage.close()
+        finally:
+            os.chdir(workDir)
+            timer.restore()
+
+    return results
+
+
+def printResult(result: dict):
+    phases = ' '.join(f"{result['phases'][phase]:>12.2f}" for phase in PHASES)
+    server = result['server']
+    firstAlert = f"{result['firstAlert']:>9.2f}" if result['firstAlert'] is not None else f"{'-':>9}"
+    print(f"{result['comets']:>7} {result['observations']:>7} {result['run']:>4} {result['seconds']:>8.2f} {firstAlert} {phases} "
+          f"{server['identifierRequests'] + server['obsRequests']:>9} {server['bytesSent'] / 2**20:>9.1f} "
+          f"{server['discordPosts']:>7} {server['discordRateLimited']:>5}")
+
+
+def main():
+    parser = argparse.ArgumentParser('Benchmark updateAndCheckNotifications against a local MPC and Discord stand-in')
+    parser.add_argument('--comets', type=int, nargs='+', default=[10, 1000], help='Catalogue sizes to test')
+    parser.add_argument('--observations', type=int, nargs='+', default=[100, 1000], help='Observations per comet to test')
+    parser.add_argument('--runs', type=int, default=2, help='Consecutive updates per case, the first one is cold')
+    parser.add_argument('--newcomets', type=int, default=3, help='Comets for discovery to find in the current half-month')
+    parser.add_argument('--latency', type=float, default=20, help='Milliseconds the stand-in adds to every response')
+    parser.add_argument('--discordlimit', type=int, default=5, help='Webhook posts allowed per rate limit window')
+    parser.add_argument('--discordwindow', type=float, default=2, help='Webhook rate limit window in seconds')
+    parser.add_argument('--obsrate', type=float, default=None, help='Override the get-obs requests per second limit')
+    parser.add_argument('--storage', choices=['sqlite', 'csv'], default='sqlite')
+    parser.add_argument('--phased', action='store_true', help='Run the steps one after the other instead of as a pipeline')
+    parser.add_argument('--columnar', action='store_true', help='Keep the comets in the columnar CometTable')
+    parser.add_argument('--maxrows', type=int, default=20_000_000, help='Skip cases serving more observations than this in total')
+    parser.add_argument('--json', metavar='PATH', help='Also write the results to a JSON file')
+    parser.add_argument('--verbose', action='store_true', help="Show the tool's own output")
+    args = parser.parse_args()
+
+    server = StandInServer(latency=args.latency / 1000, discordLimit=args.discordlimit, discordWindow=args.discordwindow)
+    server.start()
+
+    # The MPC clients read their root URL when first imported, so point them at
+    # the stand-in before anything imports them
+    os.environ['MPC_API_ROOT'] = f"{server.url}/api"
+    os.environ['DISCORD_WEBHOOK_URL'] = f"{server.url}/webhook"
+
+    results = []
+
+    print(f"{'comets':>7} {'obs':>7} {'run':>4} {'total s':>8} {'1st alert':>9} {' '.join(f'{phase:>12}' for phase in PHASES)} "
+          f"{'requests':>9} {'MiB':>9} {'posts':>7} {'429s':>5}")
+
+    try:
+        for comets in args.comets:
+            for observations in args.observations:
+                if comets * observations > args.maxrows:
+                    print(f"{comets:>7} {observations:>7} skipped, over --maxrows")
+                    continue
+
+                for result in runCase(server, comets, observations, args):
+                    printResult(result)
+                    results.append(result)
+    finally:
+        server.stop()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Compare the get-obs parse paths on synthetic responses.
+
+Run from the repository root:
+    python -m benchmarks.ObservationParsers --sizes 1000 10000 100000
+"""
+import argparse
+import json
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from ObservationParser import parseAdesStream, parseObs80
+
+STATIONS = ['T05', 'T08', 'I41', 'F51', 'G96', 'W68', 'M22', 'Q55']
+
+
+def makeObservations(count: int, seed: int = 1, start: datetime = datetime(2025, 1, 1), spacing: float = 600, magRange: tuple = (5, 20)) -> list:
+    random.seed(seed)
+
+    observations = []
+    for i in range(count):
+        obstime = start + timedelta(seconds=i * spacing + random.uniform(0, spacing / 2), microseconds=random.randint(0, 999) * 1000)
+        mag = None if random.random() < 0.1 else round(random.uniform(*magRange), 1)
+        observations.append((obstime, mag, random.choice(STATIONS)))
+
+    return observations
+
+
+def makeAdesBody(observations: list) -> bytes:
+    return json.dumps([{ 'ADES_DF': makeAdesRows(observations) }]).encode('utf-8')
+
+
+def makeAdesRows(observations: list) -> list:
+    rows = []
+    for obstime, mag, stn in observations:
+        rows.append({
+            'permid': None,
+            'provid': '2025 A6',
+            'trksub': None,
+            'obsid': f"{random.getrandbits(64):016x}",
+            'trkid': f"{random.getrandbits(40):010x}",
+            'mode': 'CCD',
+            'stn': stn,
+            'obstime': obstime.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z',
+            'ra': round(random.uniform(0, 360), 6),
+            'dec': round(random.uniform(-90, 90), 6),
+            'rmsra': None,
+            'rmsdec': None,
+            'mag': None if mag is None else f"{mag:.1f}",
+            'band': 'G',
+            'astcat': 'Gaia3',
+            'photcat': 'Gaia3',
+            'notes': None,
+            'remarks': None
+        })
+
+    return rows
+
+
+def makeObs80Body(observations: list) -> bytes:
+    return json.dumps([{ 'OBS80': makeObs80Text(observations) }]).encode('utf-8')
+
+
+def makeObs80Text(observations: list) -> str:
+    lines = []
+    for obstime, mag, stn in observations:
+        dayFraction = (obstime.hour * 3600 + obstime.minute * 60 + obstime.second + obstime.microsecond / 1e6) / 86400
+        date = f"{obstime.year:04d} {obstime.month:02d} {obstime.day + dayFraction:09.6f}"
+        magnitude = '     ' if mag is None else f"{mag:4.1f} "
+        lines.append(f"    CK25A060  C{date}05 22 11.730+12 34 56.70         {magnitude}G      {stn}")
+
+    return '\n'.join(lines) + '\n'
+
+
+def parseAdesFull(body: bytes) -> pd.DataFrame:
+    obs = pd.DataFrame(json.loads(body)[0]['ADES_DF'])
+    obs['obstime'] = pd.to_datetime(obs['obstime'], format='ISO8601', utc=True)
+    obs['mag'] = pd.to_numeric(obs['mag'], errors='coerce')
+    return obs
+
+
+def parseAdesStreaming(body: bytes) -> pd.DataFrame:
+    chunks = (body[start:start + 64 * 1024] for start in range(0, len(body), 64 * 1024))
+    return parseAdesStream(chunks, ['C/2025 A6'])['C/2025 A6']
+
+
+def parseObs80Body(body: bytes) -> pd.DataFrame:
+    return parseObs80(json.loads(body)[0]['OBS80'])
+
+
+def measure(parse, body: bytes, repeat: int) -> tuple:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(body)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    result = parse(body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return best, peak, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser('Benchmark the ADES_DF and OBS80 observation parsers')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='Observation counts to test')
+    parser.add_argument('--repeat', type=int, default=3, help='Timing runs per parser, the best is reported')
+    args = parser.parse_args()
+
+    print(f"{'observations':>12} {'parser':<15} {'wire bytes':>12} {'best ms':>10} {'peak MiB':>10} {'rows':>8}")
+
+    for size in args.sizes:
+        observations = makeObservations(size)
+        adesBody = makeAdesBody(observations)
+        obs80Body = makeObs80Body(observations)
+
+        for name, parse, body in [('ades-full', parseAdesFull, adesBody),
+                                  ('ades-streaming', parseAdesStreaming, adesBody),
+                                  ('obs80', parseObs80Body, obs80Body)]:
+            best, peak, rows = measure(parse, body, args.repeat)
+            print(f"{size:>12} {name:<15} {len(body):>12} {best * 1000:>10.1f} {peak / 2**20:>10.1f} {rows:>8}")
+
+
+if __name__ == "__main__":
+    main()
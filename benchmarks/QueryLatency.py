@@ -0,0 +1,89 @@
+"""
+Measure QueryService latency over a large synthetic catalogue.
+
+Run from the repository root:
+    python -m benchmarks.QueryLatency --comets 100000 --requests 2000
+
+Publishes a snapshot of the catalogue, then times requests over one
+keep-alive connection: designation and permid lookups, a filtered list of
+the bright active comets, and revalidation with If-None-Match.  Lookups
+are spread over the whole catalogue, so most of them miss the response
+cache and are rendered from the snapshot.
+"""
+import argparse
+import http.client
+import random
+import statistics
+import time
+from urllib.parse import quote
+
+from benchmarks.CatalogueLoad import makeCatalogue
+from QueryService import QueryService
+
+
+def timeRequests(connection: http.client.HTTPConnection, targets: list, headers: dict = None) -> list:
+    timings = []
+    for target in targets:
+        start = time.perf_counter()
+        connection.request('GET', target, headers=headers or {})
+        response = connection.getresponse()
+        response.read()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(label: str, timings: list):
+    timings = sorted(timings)
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(f"{label:<22} {len(timings):>7} {statistics.median(timings) * 1000:>9.3f} {p99 * 1000:>9.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser('Benchmark QueryService reads over a synthetic catalogue')
+    parser.add_argument('--comets', type=int, default=100000, help='Catalogue size')
+    parser.add_argument('--active', type=float, default=0.01, help='Fraction of the catalogue that is not archived')
+    parser.add_argument('--requests', type=int, default=2000, help='Requests per kind')
+    args = parser.parse_args()
+
+    comets = makeCatalogue(args.comets, args.active)
+    service = QueryService(port=0)
+
+    start = time.perf_counter()
+    snapshot = service.publish(comets)
+    print(f"Published {len(snapshot)} comets in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    # A refresh touches the active comets, everything else is reused
+    for comet in comets:
+        if not comet.archive:
+            comet.lastchecked = comet.lastobs
+
+    start = time.perf_counter()
+    snapshot = service.publish(comets)
+    print(f"Republished after changing {sum(1 for comet in comets if not comet.archive)} comets in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    service.start()
+    host, port = service.httpd.server_address[:2]
+    connection = http.client.HTTPConnection(host, port)
+
+    random.seed(3)
+    designations = [comet.designation for comet in random.sample(comets, min(args.requests, len(comets)))]
+    permids = [comet.permid for comet in comets if comet.permid][:args.requests]
+
+    print(f"{'request':<22} {'count':>7} {'p50 ms':>9} {'p99 ms':>9}")
+
+    try:
+        report('designation', timeRequests(connection, [f"/comets/{quote(designation, safe='')}" for designation in designations]))
+        report('permid', timeRequests(connection, [f"/comets?permid={quote(permid)}" for permid in permids]))
+        report('active maxmag=12', timeRequests(connection, ['/comets?active=true&maxmag=12&sort=mag'] * args.requests))
+
+        connection.request('GET', '/comets?active=true&maxmag=12&sort=mag')
+        response = connection.getresponse()
+        response.read()
+        report('revalidate (304)', timeRequests(connection, ['/comets?active=true&maxmag=12&sort=mag'] * args.requests, { 'If-None-Match': response.headers['ETag'] }))
+    finally:
+        connection.close()
+        service.stop()
+
+
+if __name__ == "__main__":
+    main()
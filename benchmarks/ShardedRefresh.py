@@ -0,0 +1,103 @@
+"""
+Time a full refresh cycle split across sharded worker processes.
+
+Run from the repository root:
+    python -m benchmarks.ShardedRefresh --comets 1000 --observations 200 --workers 1 2 4
+
+For each worker count a fresh comet database is refreshed by that many
+`CometDiscovery.py --worker` processes started together against the local
+stand-in server.  Each worker keeps its own MPC rate limit, so the cycle
+time should fall roughly in proportion to the worker count.  After each
+cycle the database is checked so that every comet was refreshed and every
+shard completed with no lease left behind.  The workers share the machine's
+cores with each other and the stand-in, so once those are busy adding
+workers stops helping.
+"""
+import argparse
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.EndToEnd import writeCatalogue
+from benchmarks.StandInServer import StandInServer, makeCatalogue
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def runCycle(server: StandInServer, catalogue: list, workers: int, args) -> dict:
+    import CometDiscovery
+
+    with tempfile.TemporaryDirectory() as scratch:
+        writeCatalogue(os.path.join(scratch, CometDiscovery.CSV_FILE), catalogue)
+
+        # Import the CSV once up front so the workers do not race to do it
+        subprocess.run([sys.executable, os.path.join(REPO_ROOT, 'CometDiscovery.py'), '--exportcsv', os.devnull, '--storage', 'sqlite'],
+                       cwd=scratch, env=os.environ, check=True, capture_output=True)
+
+        command = [sys.executable, os.path.join(REPO_ROOT, 'CometDiscovery.py'), '--worker', '--storage', 'sqlite', '--refreshall', '--shards', str(args.shards)]
+        output = None if args.verbose else subprocess.DEVNULL
+
+        server.resetCounters()
+        start = time.perf_counter()
+        processes = [subprocess.Popen(command + ['--workerid', f"worker-{i}"], cwd=scratch, env=os.environ, stdout=output, stderr=output)
+                     for i in range(workers)]
+        failures = sum(1 for process in processes if process.wait() != 0)
+        elapsed = time.perf_counter() - start
+        counters = server.resetCounters()
+
+        connection = sqlite3.connect(os.path.join(scratch, CometDiscovery.COMETS_DB))
+        refreshed = connection.execute('SELECT COUNT(*) FROM comets WHERE lastchecked IS NOT NULL').fetchone()[0]
+        shards = connection.execute('SELECT COUNT(*) FROM shard_leases WHERE completed >= 1').fetchone()[0]
+        owners = connection.execute("SELECT COUNT(*) FROM shard_leases WHERE owner != ''").fetchone()[0]
+        connection.close()
+
+    return {
+        'workers': workers,
+        'seconds': elapsed,
+        'refreshed': refreshed,
+        'shards': shards,
+        'heldLeases': owners,
+        'failures': failures,
+        'obsRequests': counters.obsRequests,
+        'obsDesignations': counters.obsDesignations
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser('Benchmark a refresh cycle across sharded worker processes')
+    parser.add_argument('--comets', type=int, default=1000, help='Catalogue size')
+    parser.add_argument('--observations', type=int, default=200, help='Observations per comet')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help='Worker counts to test')
+    parser.add_argument('--shards', type=int, default=8, help='Shards the catalogue is split into')
+    parser.add_argument('--latency', type=float, default=20, help='Milliseconds the stand-in adds to every response')
+    parser.add_argument('--verbose', action='store_true', help="Show the workers' own output")
+    args = parser.parse_args()
+
+    server = StandInServer(latency=args.latency / 1000, discordLimit=1000, discordWindow=1)
+    server.start()
+
+    os.environ['MPC_API_ROOT'] = f"{server.url}/api"
+    os.environ['DISCORD_WEBHOOK_URL'] = f"{server.url}/webhook"
+    os.environ['PYTHONPATH'] = os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get('PYTHONPATH')]))
+
+    catalogue = makeCatalogue(args.comets)
+    server.configure(catalogue, args.observations)
+
+    print(f"{'workers':>7} {'cycle s':>8} {'speedup':>7} {'refreshed':>9} {'shards':>6} {'held':>4} {'obs req':>7} {'desigs':>7} {'failed':>6}")
+
+    baseline = None
+    try:
+        for workers in args.workers:
+            result = runCycle(server, catalogue, workers, args)
+            baseline = baseline or result['seconds'] * result['workers']
+            print(f"{workers:>7} {result['seconds']:>8.2f} {baseline / result['seconds']:>7.2f} {result['refreshed']:>9} "
+                  f"{result['shards']:>6} {result['heldLeases']:>4} {result['obsRequests']:>7} {result['obsDesignations']:>7} {result['failures']:>6}")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
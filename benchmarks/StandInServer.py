@@ -0,0 +1,265 @@
+"""
+Local stand-in for the MPC API and a Discord webhook, for benchmarks.
+
+Serves synthetic query-identifier and get-obs responses for a generated
+catalogue, and a webhook that enforces a Discord style rate limit.  Every
+request can be delayed to simulate network latency.
+
+Run it on its own and point the tool at it:
+    python -m benchmarks.StandInServer --port 8080 --comets 1000 --observations 1000
+    MPC_API_ROOT=http://127.0.0.1:8080/api DISCORD_WEBHOOK_URL=http://127.0.0.1:8080/webhook python CometDiscovery.py
+"""
+import argparse
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+from benchmarks.ObservationParsers import makeAdesRows, makeObs80Text, makeObservations
+
+# Half-month letters, I and Z are not used
+LETTERS = 'ABCDEFGHJKLMNOPQRSTUVWXY'
+
+# Every BRIGHT_EVERY-th comet is served bright enough to cross a magnitude threshold
+BRIGHT_EVERY = 50
+
+
+def makeCatalogue(count: int) -> List[str]:
+    """Designations for count comets, all well before the half-months probed for discoveries."""
+    return [f"C/{2000 + i // 2400} {LETTERS[(i // 100) % 24]}{i % 100 + 1}" for i in range(count)]
+
+
+def makeNewComets(count: int, now: datetime) -> List[str]:
+    letter = LETTERS[(now.month - 1) * 2 + (1 if now.day > 15 else 0)]
+    return [f"C/{now.year} {letter}{i + 1}" for i in range(count)]
+
+
+def identifierEntry(designation: str, found: bool) -> dict:
+    return {
+        'found': 1 if found else 0,
+        'object_type': ['Comet', 10] if found else [],
+        'orbfit_name': designation if found else None,
+        'name': None,
+        'iau_designation': designation if found else None,
+        'permid': None,
+        'packed_permid': None,
+        'packed_primary_provisional_designation': None,
+        'packed_secondary_provisional_designations': [],
+        'unpacked_primary_provisional_designation': designation if found else None,
+        'unpacked_secondary_provisional_designations': [],
+        'disambiguation_list': None
+    }
+
+
+class Counters:
+    def __init__(self):
+        self.identifierRequests = 0
+        self.identifierIds = 0
+        self.obsRequests = 0
+        self.obsDesignations = 0
+        self.bytesSent = 0
+        self.discordPosts = 0
+        self.discordEmbeds = 0
+        self.discordRateLimited = 0
+        # time.perf_counter() of the first accepted webhook post, 0 before one
+        self.firstDiscordPost = 0.0
+
+    def toDict(self) -> dict:
+        return dict(self.__dict__)
+
+
+class StandInServer:
+    """Threaded HTTP server standing in for MPC and Discord.
+
+    configure() swaps the catalogue and observation counts between benchmark
+    cases without restarting, so clients that captured the URL keep working.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0, discordLimit: int = 5, discordWindow: float = 2.0):
+        self.latency = latency
+        self.discordLimit = discordLimit
+        self.discordWindow = discordWindow
+        self.lock = threading.Lock()
+        self.counters = Counters()
+
+        self.known: Dict[str, bool] = {}
+        self.templates: Dict[tuple, bytes] = {}
+        self.observations = 0
+
+        # Fixed window rate limit for the webhook
+        self.windowStart = time.monotonic()
+        self.windowPosts = 0
+
+        self.httpd = ThreadingHTTPServer((host, port), self.makeHandler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def configure(self, catalogue: List[str], observations: int, newComets: int = 0):
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+
+        with self.lock:
+            self.known = { designation: i % BRIGHT_EVERY == 0 for i, designation in enumerate(catalogue) }
+            for designation in makeNewComets(newComets, now):
+                self.known[designation] = False
+
+            self.observations = observations
+            self.templates = {}
+
+            # Observations spread over the last 30 days, ending an hour ago.  The
+            # serialized rows are shared by every comet of the same brightness
+            spacing = min(600, 30 * 86400 / max(observations, 1))
+            start = now - timedelta(hours=1) - timedelta(seconds=spacing * observations)
+
+            for bright, magRange in [(False, (13, 17)), (True, (5, 7.5))]:
+                rows = makeObservations(observations, seed=2 if bright else 1, start=start, spacing=spacing, magRange=magRange)
+                self.templates[('ADES_DF', bright)] = json.dumps(makeAdesRows(rows)).encode('utf-8')
+                self.templates[('OBS80', bright)] = json.dumps(makeObs80Text(rows)).encode('utf-8')
+
+            self.counters = Counters()
+
+    def resetCounters(self) -> Counters:
+        with self.lock:
+            counters = self.counters
+            self.counters = Counters()
+
+        return counters
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def count(self, **increments):
+        with self.lock:
+            for name, value in increments.items():
+                setattr(self.counters, name, getattr(self.counters, name) + value)
+
+    def identifierBody(self, ids: List[str]) -> bytes:
+        self.count(identifierRequests=1, identifierIds=len(ids))
+        return json.dumps({ designation: identifierEntry(designation, designation in self.known) for designation in ids }).encode('utf-8')
+
+    def observationsBody(self, designations: List[str], outputFormat: str) -> bytes:
+        self.count(obsRequests=1, obsDesignations=len(designations))
+
+        parts = []
+        for designation in designations:
+            template = self.templates.get((outputFormat, self.known.get(designation, False)), b'[]')
+            parts.append(b'{"' + outputFormat.encode('ascii') + b'":' + template + b'}')
+
+        return b'[' + b','.join(parts) + b']'
+
+    def discordResponse(self, body: dict) -> tuple:
+        """Status, headers and body for a webhook post, applying the rate limit."""
+        embeds = body.get('embeds', [])
+        if len(embeds) > 10:
+            return 400, {}, json.dumps({ 'message': 'Too many embeds' }).encode('utf-8')
+
+        with self.lock:
+            now = time.monotonic()
+            if now - self.windowStart >= self.discordWindow:
+                self.windowStart = now
+                self.windowPosts = 0
+
+            resetAfter = max(self.discordWindow - (now - self.windowStart), 0)
+
+            if self.windowPosts >= self.discordLimit:
+                self.counters.discordRateLimited += 1
+                headers = { 'Retry-After': f"{resetAfter:.3f}", 'X-RateLimit-Limit': str(self.discordLimit), 'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset-After': f"{resetAfter:.3f}" }
+                return 429, headers, json.dumps({ 'message': 'You are being rate limited.', 'retry_after': resetAfter, 'global': False }).encode('utf-8')
+
+            self.windowPosts += 1
+            self.counters.discordPosts += 1
+            self.counters.discordEmbeds += len(embeds)
+            self.counters.firstDiscordPost = self.counters.firstDiscordPost or time.perf_counter()
+            remaining = self.discordLimit - self.windowPosts
+
+        return 204, { 'X-RateLimit-Limit': str(self.discordLimit), 'X-RateLimit-Remaining': str(remaining), 'X-RateLimit-Reset-After': f"{resetAfter:.3f}" }, b''
+
+    def makeHandler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def readJson(self) -> dict:
+                length = int(self.headers.get('Content-Length') or 0)
+                return json.loads(self.rfile.read(length)) if length else {}
+
+            def reply(self, status: int, body: bytes, headers: dict = None):
+                if server.latency:
+                    time.sleep(server.latency)
+
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+                server.count(bytesSent=len(body))
+
+            def do_GET(self):
+                try:
+                    request = self.readJson()
+                except ValueError:
+                    self.reply(400, b'{"error": "invalid json"}')
+                    return
+
+                if self.path.endswith('/query-identifier'):
+                    self.reply(200, server.identifierBody(request.get('ids', [])))
+                elif self.path.endswith('/get-obs'):
+                    outputFormat = (request.get('output_format') or ['ADES_DF'])[0]
+                    self.reply(200, server.observationsBody(request.get('desigs', []), outputFormat))
+                else:
+                    self.reply(404, b'{"error": "not found"}')
+
+            def do_POST(self):
+                if not self.path.endswith('/webhook'):
+                    self.reply(404, b'{"error": "not found"}')
+                    return
+
+                status, headers, body = server.discordResponse(self.readJson())
+                self.reply(status, body, headers)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser('Serve synthetic MPC and Discord responses for benchmarks')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--comets', type=int, default=1000, help='Comets in the synthetic catalogue')
+    parser.add_argument('--observations', type=int, default=1000, help='Observations returned per comet')
+    parser.add_argument('--newcomets', type=int, default=3, help='Comets designated in the current half-month')
+    parser.add_argument('--latency', type=float, default=20, help='Milliseconds added to every response')
+    parser.add_argument('--discordlimit', type=int, default=5, help='Webhook posts allowed per window')
+    parser.add_argument('--discordwindow', type=float, default=2, help='Webhook rate limit window in seconds')
+    args = parser.parse_args()
+
+    server = StandInServer(port=args.port, latency=args.latency / 1000, discordLimit=args.discordlimit, discordWindow=args.discordwindow)
+    server.configure(makeCatalogue(args.comets), args.observations, args.newcomets)
+
+    print(f"Serving MPC at {server.url}/api and the webhook at {server.url}/webhook")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(server.counters.toDict(), indent=2))
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Measure cold start time of each CometDiscovery command and check which heavy
+modules it loads.
+
+Run from the repository root:
+    python -m benchmarks.Startup --repeat 5 --check
+
+Each command runs in a fresh interpreter inside a scratch directory seeded
+with test.csv, so nothing touches the real comet state or the network.
+With --check the exit code is non-zero when a command loads a module it
+should not, or is slower than --maxms.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ['pandas', 'numpy', 'requests', 'sqlite3']
+
+# Command name, CometDiscovery arguments and the heavy modules it must not load
+COMMANDS = [
+    ('help', ['--help'], ['pandas', 'numpy', 'requests']),
+    ('summarize', ['--summarize', '--skipsend'], ['pandas', 'numpy', 'requests']),
+    ('summarize-sqlite', ['--summarize', '--skipsend', '--storage', 'sqlite'], ['pandas', 'numpy', 'requests']),
+    ('exportcsv', ['--exportcsv', 'export.csv', '--storage', 'sqlite'], ['pandas', 'numpy', 'requests'])
+]
+
+# Runs CometDiscovery as __main__ and reports the heavy modules it loaded on stderr
+WRAPPER = f"""
+import json, runpy, sys
+sys.path.insert(0, {REPO_ROOT!r})
+try:
+    runpy.run_path({os.path.join(REPO_ROOT, 'CometDiscovery.py')!r}, run_name='__main__')
+except SystemExit:
+    pass
+finally:
+    sys.stderr.write('\\nMODULES ' + json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]) + '\\n')
+"""
+
+
+def runCommand(arguments: list, workDir: str) -> tuple:
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', WRAPPER, *arguments], cwd=workDir, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+
+    modules = []
+    for line in result.stderr.splitlines():
+        if line.startswith('MODULES '):
+            modules = json.loads(line[len('MODULES '):])
+
+    return elapsed, modules, result
+
+
+def interpreterStartup(repeat: int) -> float:
+    # Bare interpreter start, the floor for every command
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'pass'])
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser('Benchmark the cold start of each CometDiscovery command')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per command, the best is reported')
+    parser.add_argument('--maxms', type=float, default=None, help='Fail --check when a command takes longer than this')
+    parser.add_argument('--check', action='store_true', help='Exit non-zero on a forbidden import or a slow command')
+    args = parser.parse_args()
+
+    failures = []
+
+    with tempfile.TemporaryDirectory() as workDir:
+        shutil.copy(os.path.join(REPO_ROOT, 'test.csv'), os.path.join(workDir, 'known_comets.csv'))
+
+        # Create the comet database once so the sqlite commands measure a warm file
+        runCommand(['--exportcsv', 'export.csv', '--storage', 'sqlite'], workDir)
+
+        print(f"{'command':<15} {'best ms':>10} {'heavy modules loaded'}")
+        print(f"{'(interpreter)':<15} {interpreterStartup(args.repeat) * 1000:>10.1f} -")
+
+        for name, arguments, forbidden in COMMANDS:
+            best = None
+            modules = []
+
+            for _ in range(args.repeat):
+                elapsed, modules, result = runCommand(arguments, workDir)
+                if result.returncode != 0:
+                    failures.append(f"{name} exited with {result.returncode}: {result.stderr.strip()[-500:]}")
+                    break
+                best = elapsed if best is None else min(best, elapsed)
+
+            if best is None:
+                continue
+
+            print(f"{name:<15} {best * 1000:>10.1f} {', '.join(modules) or '-'}")
+
+            loaded = [m for m in forbidden if m in modules]
+            if loaded:
+                failures.append(f"{name} loaded {', '.join(loaded)}")
+            if args.maxms is not None and best * 1000 > args.maxms:
+                failures.append(f"{name} took {best * 1000:.1f}ms, over the {args.maxms:.0f}ms budget")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+
+    if args.check and failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
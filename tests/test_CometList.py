@@ -0,0 +1,52 @@
+import pandas as pd
+import pytest
+
+from Comet import Comet
+from CometList import BINOC_MAGNITUDE, CometList
+
+DESIGNATION = 'C/2025 A6'
+
+
+def observations(rows):
+    return { DESIGNATION: pd.DataFrame(rows, columns=['obstime', 'mag', 'stn']) }
+
+
+@pytest.fixture
+def cometList():
+    cometList = CometList()
+    cometList.addComet(Comet({ 'designation': DESIGNATION, 'name': 'Lemmon' }))
+    return cometList
+
+
+def test_observation_reported_late_updates_the_averages(cometList):
+    comet = cometList.registry.findByDesignation(DESIGNATION)
+
+    first = [('2025-10-01T00:00:00Z', BINOC_MAGNITUDE + 1.0, 'T05'),
+             ('2025-10-02T00:00:00Z', BINOC_MAGNITUDE + 0.5, 'T05')]
+    cometList.processObservationBatch(observations(first))
+    assert (comet.mag1davg, comet.mag2davg) == (BINOC_MAGNITUDE + 0.75, BINOC_MAGNITUDE + 0.75)
+    lastobs = comet.lastobs
+
+    # A bright observation from earlier on the last day reaches MPC late
+    cometList.clearEvents()
+    late = first + [('2025-10-01T18:00:00Z', BINOC_MAGNITUDE - 3.0, 'I41')]
+    cometList.processObservationBatch(observations(late))
+
+    assert comet.lastobs == lastobs
+    assert comet.mag1davg == comet.mag2davg == pytest.approx(BINOC_MAGNITUDE - 0.5)
+    assert cometList.binoc == [comet]
+    assert [change.current for change in cometList.changed] == [pytest.approx(BINOC_MAGNITUDE - 0.5)]
+
+
+def test_same_observations_again_change_nothing(cometList):
+    comet = cometList.registry.findByDesignation(DESIGNATION)
+    rows = [('2025-10-01T00:00:00Z', 11.0, 'T05'), ('2025-10-02T00:00:00Z', 10.0, 'T05')]
+
+    cometList.processObservationBatch(observations(rows))
+    cometList.clearEvents()
+    lastupdate = comet.lastupdate
+
+    cometList.processObservationBatch(observations(rows))
+
+    assert comet.lastupdate == lastupdate
+    assert cometList.changed == []
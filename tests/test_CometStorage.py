@@ -0,0 +1,80 @@
+import pytest
+
+from Comet import Comet
+from CometStorage import SqliteCometStorage
+from CometTable import CometTable
+
+
+@pytest.fixture
+def databasePath(tmp_path):
+    path = str(tmp_path / 'comets.db')
+    storage = SqliteCometStorage(path)
+    storage.save([Comet({'designation': 'C/2025 A6', 'discoverer': 'LEMMON', 'mag1davg': '7.0', 'mag2davg': '7.2'})])
+    storage.close()
+    return path
+
+
+def test_save_keeps_fields_another_process_changed(databasePath):
+    worker = SqliteCometStorage(databasePath)
+    discovery = SqliteCometStorage(databasePath)
+
+    [workerCopy] = worker.load()
+    [discoveryCopy] = discovery.load()
+
+    discoveryCopy.name = 'Lemmon'
+    discovery.save([discoveryCopy])
+
+    workerCopy.mag1davg = 5.8
+    worker.save([workerCopy])
+
+    [comet] = SqliteCometStorage(databasePath).load()
+    assert comet.name == 'Lemmon'
+    assert comet.mag1davg == 5.8
+    assert comet.mag2davg == 7.2
+
+
+def test_unchanged_comets_are_not_written(databasePath):
+    storage = SqliteCometStorage(databasePath)
+    comets = storage.load()
+
+    assert storage.changes(comets) == []
+
+    comets[0].mag2davg = 6.1
+    [(row, fields)] = storage.changes(comets)
+    assert row[0] == 'C/2025 A6'
+    assert fields == ('mag2davg',)
+
+
+def test_save_table_writes_only_dirty_columns(databasePath):
+    daemon = SqliteCometStorage(databasePath)
+    discovery = SqliteCometStorage(databasePath)
+
+    table = daemon.loadTable()
+    [discoveryCopy] = discovery.load()
+
+    discoveryCopy.name = 'Lemmon'
+    discovery.save([discoveryCopy])
+
+    row = table.rows['C/2025 A6']
+    table.set(row, 'mag1davg', 5.8)
+    # Setting a field to the value it already has is not a change
+    table.set(row, 'name', '')
+    daemon.saveTable(table)
+
+    [comet] = SqliteCometStorage(databasePath).load()
+    assert comet.name == 'Lemmon'
+    assert comet.mag1davg == 5.8
+    assert table.dirty == {}
+
+
+def test_new_table_rows_are_written_whole(databasePath):
+    storage = SqliteCometStorage(databasePath)
+    table = CometTable()
+    table.put(Comet({'designation': 'C/2025 K1', 'name': 'ATLAS', 'discoverer': 'ATLAS', 'mag1davg': '15.11'}))
+
+    storage.saveTable(table)
+
+    comets = { comet.designation: comet for comet in SqliteCometStorage(databasePath).load() }
+    assert comets['C/2025 K1'].name == 'ATLAS'
+    assert comets['C/2025 K1'].mag1davg == 15.11
+    assert comets['C/2025 A6'].discoverer == 'LEMMON'
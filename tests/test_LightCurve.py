@@ -0,0 +1,90 @@
+import math
+
+import pandas as pd
+import pytest
+
+from LightCurve import LightCurve
+from MagnitudeAnalysis import aggregateMagnitudes
+
+START = pd.Timestamp('2025-10-01', tz='UTC').timestamp()
+
+
+def observations(count: int, days: float, first: float, last: float):
+    """count observations spread evenly over days, fading linearly from first to last."""
+    obstimes = [START + round(index * days * 86400 / (count - 1)) for index in range(count)]
+    mags = [first + (last - first) * index / (count - 1) for index in range(count)]
+    stations = [f"T{index % 100:02d}" for index in range(count)]
+    return obstimes, mags, stations
+
+
+def reference(obstimes, mags):
+    frame = aggregateMagnitudes(pd.DataFrame({
+        'designation': 'C/2025 A6',
+        'obstime': pd.to_datetime(obstimes, unit='s', utc=True),
+        'mag': mags
+    }))
+    return frame.loc['C/2025 A6']
+
+
+def assertMatches(curve: LightCurve, obstimes, mags):
+    expected = reference(obstimes, mags)
+    assert curve.mean(1) == pytest.approx(expected['mag1davg'])
+    assert curve.mean(2) == pytest.approx(expected['mag2davg'])
+
+
+def test_many_observations_match_the_full_history():
+    obstimes, mags, stations = observations(2000, 2, 9, 5)
+
+    curve = LightCurve()
+    curve.update(obstimes, mags, stations)
+
+    assertMatches(curve, obstimes, mags)
+    assert (curve.mean(1), curve.mean(2)) == (6.0, 7.0)
+
+
+def test_many_observations_survive_a_save_and_reload():
+    obstimes, mags, stations = observations(2000, 2, 9, 5)
+
+    curve = LightCurve()
+    curve.update(obstimes[:1500], mags[:1500], stations[:1500])
+    curve = LightCurve.decode(curve.encode())
+    curve.update(obstimes, mags, stations)
+
+    assertMatches(curve, obstimes, mags)
+
+
+def test_observation_reported_late_is_taken_in():
+    obstimes, mags, stations = observations(48, 2, 12, 10)
+
+    curve = LightCurve()
+    curve.update(obstimes, mags, stations)
+
+    # MPC receives a bright observation from half a day ago after the rest
+    late = (obstimes[-1] - 43200, 8.0, 'I41')
+    allTimes, allMags, allStations = obstimes + [late[0]], mags + [late[1]], stations + [late[2]]
+
+    curve = LightCurve.decode(curve.encode())
+    assert curve.update(allTimes, allMags, allStations) == 1
+
+    assertMatches(curve, allTimes, allMags)
+
+
+def test_repeated_history_is_not_counted_twice():
+    obstimes, mags, stations = observations(100, 3, 11, 10)
+
+    curve = LightCurve()
+    curve.update(obstimes, mags, stations)
+    means = (curve.mean(1), curve.mean(2))
+
+    assert LightCurve.decode(curve.encode()).update(obstimes, mags, stations) == 0
+    assert curve.update(obstimes, mags, stations) == 0
+    assert (curve.mean(1), curve.mean(2)) == means
+
+
+def test_observation_without_magnitude_moves_the_windows():
+    curve = LightCurve()
+    curve.update([START, START + 3600], [10.0, 11.0])
+    curve.update([START + 86400 + 1800], [math.nan])
+
+    assert curve.mean(1) == 11.0
+    assert curve.lastobs == START + 86400 + 1800
@@ -0,0 +1,105 @@
+import io
+import json
+import threading
+
+import requests
+
+from MinorPlanetaryCenter import DesignationIdentifierApi, ObservationsApi
+from RateLimiter import RateLimiter
+
+
+def response(status: int, body) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps(body).encode()
+    response.raw = io.BytesIO(response._content)
+    return response
+
+
+def entry(mag: str) -> dict:
+    return { 'ADES_DF': [{ 'obstime': '2025-10-01T00:00:00Z', 'mag': mag, 'stn': 'T05' }] }
+
+
+class FakeTransport:
+    """Answers get-obs requests from a function of the requested designations."""
+
+    def __init__(self, answer):
+        self.answer = answer
+        self.requests = []
+
+    def get(self, url, json=None, data=None, headers=None, stream=False):
+        desigs = json['desigs'] if 'desigs' in json else json['ids']
+        self.requests.append(desigs)
+        return self.answer(desigs)
+
+
+def test_rejected_chunk_is_retried_one_designation_at_a_time():
+    def answer(desigs):
+        if 'C/2099 Z9' in desigs:
+            return response(400, { 'error': 'unknown designation' })
+        return response(200, [entry('11.2') for _ in desigs])
+
+    transport = FakeTransport(answer)
+    results = ObservationsApi(transport=transport).queryChunk(['C/2025 A6', 'C/2099 Z9', 'C/2025 K1'])
+
+    assert sorted(results) == ['C/2025 A6', 'C/2025 K1']
+    assert len(transport.requests) == 4
+
+
+def test_misaligned_entries_are_retried_one_designation_at_a_time():
+    def answer(desigs):
+        return response(200, [entry('11.2')])
+
+    transport = FakeTransport(answer)
+    results = ObservationsApi(transport=transport).queryChunk(['C/2025 A6', 'C/2025 K1'])
+
+    assert sorted(results) == ['C/2025 A6', 'C/2025 K1']
+    assert len(transport.requests) == 3
+
+
+def test_server_error_skips_the_chunk():
+    transport = FakeTransport(lambda desigs: response(503, { 'error': 'unavailable' }))
+
+    assert ObservationsApi(transport=transport).queryChunk(['C/2025 A6', 'C/2025 K1']) == {}
+    assert len(transport.requests) == 1
+
+
+def test_connection_error_skips_the_chunk():
+    def answer(desigs):
+        raise requests.ConnectionError('connection reset')
+
+    transport = FakeTransport(answer)
+
+    assert ObservationsApi(transport=transport).queryChunk(['C/2025 A6', 'C/2025 K1']) == {}
+    assert len(transport.requests) == 1
+
+
+def identity(designation: str) -> dict:
+    return { 'found': 1, 'object_type': ['Comet', 11], 'orbfit_name': '', 'name': '', 'iau_designation': designation,
+             'permid': '', 'packed_permid': '', 'packed_primary_provisional_designation': '',
+             'packed_secondary_provisional_designations': [], 'unpacked_primary_provisional_designation': designation,
+             'unpacked_secondary_provisional_designations': [], 'disambiguation_list': [] }
+
+
+class CountingRateLimiter(RateLimiter):
+    def __init__(self):
+        super().__init__(requestsPerSecond=0, maxInFlight=4)
+        self.acquired = 0
+        self.countLock = threading.Lock()
+
+    def acquire(self):
+        super().acquire()
+        with self.countLock:
+            self.acquired += 1
+
+
+def test_identifier_chunks_share_the_rate_limiter():
+    transport = FakeTransport(lambda ids: response(200, { designation: identity(designation) for designation in ids }))
+    rateLimiter = CountingRateLimiter()
+    designations = [f"C/2025 A{index}" for index in range(1, 8)]
+
+    api = DesignationIdentifierApi(transport=transport, chunkSize=2, maxWorkers=4, rateLimiter=rateLimiter)
+    resolved = api.queryMultipleById(designations)
+
+    assert sorted(resolved) == sorted(designations)
+    assert rateLimiter.acquired == len(transport.requests) == 4
@@ -0,0 +1,71 @@
+import pytest
+
+from NotificationOutbox import CLAIM_TTL, MAX_ATTEMPTS, RETRY_BASE, RETRY_MAX, NotificationOutbox
+
+EMBED = { 'title': 'Comet magnitude change: C/2025 A6 (LEMMON)' }
+NOW = 1_760_000_000.0
+
+
+@pytest.fixture
+def outbox():
+    outbox = NotificationOutbox(':memory:')
+    yield outbox
+    outbox.close()
+
+
+def test_same_notification_is_recorded_once(outbox):
+    assert outbox.add('C/2025 A6', 'binoc', '7.65', EMBED)
+    assert not outbox.add('C/2025 A6', 'binoc', '7.65', EMBED)
+
+    # Another value, kind or subscriber is a different notification
+    assert outbox.add('C/2025 A6', 'binoc', '7.40', EMBED)
+    assert outbox.add('C/2025 A6', 'nakedeye', '7.65', EMBED)
+    assert outbox.add('C/2025 A6', 'binoc', '7.65', EMBED, 'club')
+
+    assert outbox.counts()['pending'] == 4
+
+
+def test_sent_notification_is_still_recognised(outbox):
+    outbox.add('C/2025 A6', 'binoc', '7.65', EMBED)
+    outbox.markSent([row.id for row in outbox.claim(now=NOW)], now=NOW)
+
+    assert not outbox.add('C/2025 A6', 'binoc', '7.65', EMBED)
+    assert outbox.counts() == { 'pending': 0, 'sent': 1, 'givenUp': 0 }
+
+
+def test_claim_hides_rows_until_the_claim_expires(outbox):
+    outbox.add('C/2025 A6', 'binoc', '7.65', EMBED)
+    outbox.add('C/2025 K1', 'discovery', '', EMBED, 'club')
+
+    rows = outbox.claim(now=NOW)
+    assert [row.designation for row in rows] == ['C/2025 A6', 'C/2025 K1']
+    assert rows[0].embed == EMBED
+
+    assert outbox.claim(now=NOW + 1) == []
+    assert len(outbox.claim(now=NOW + CLAIM_TTL)) == 2
+
+
+def test_claim_is_limited_to_subscribers(outbox):
+    outbox.add('C/2025 A6', 'binoc', '7.65', EMBED)
+    outbox.add('C/2025 A6', 'binoc', '7.65', EMBED, 'club')
+
+    assert [row.subscriber for row in outbox.claim(now=NOW, subscribers=['club'])] == ['club']
+    assert [row.subscriber for row in outbox.claim(now=NOW)] == ['default']
+
+
+def test_failures_back_off_exponentially_then_give_up(outbox):
+    outbox.add('C/2025 A6', 'binoc', '7.65', EMBED)
+    now = NOW
+
+    for attempt in range(MAX_ATTEMPTS):
+        rows = outbox.claim(now=now)
+        assert len(rows) == 1 and rows[0].attempts == attempt
+
+        outbox.markFailed(rows, 'Webhook post failed', now=now)
+        delay = min(RETRY_BASE * 2 ** attempt, RETRY_MAX)
+
+        assert outbox.claim(now=now + delay - 1) == []
+        now += delay
+
+    assert outbox.claim(now=now + RETRY_MAX) == []
+    assert outbox.counts() == { 'pending': 0, 'sent': 0, 'givenUp': 1 }
@@ -0,0 +1,132 @@
+import json
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ObservationParser import AdesStreamParser, fieldToFloat, obs80Lines, parseAdesStream, parseObs80
+
+DESIGNATIONS = ['C/2025 A6', 'C/2025 K1', 'C/2025 R2']
+
+ENTRIES = [
+    { 'ADES_DF': [ { 'obstime': '2025-10-01T01:00:00.120Z', 'mag': '11.2', 'stn': 'T05', 'rmsMag': None },
+                   { 'obstime': '2025-10-02T01:00:00Z', 'mag': None, 'stn': 'T08', 'rmsMag': '0.1' } ] },
+    # A comet MPC has no observations of yet
+    { 'ADES_DF': [] },
+    # Column oriented, as pandas writes a frame, with a character outside ASCII
+    { 'ADES_DF': { 'obstime': { '0': '2025-10-03T01:00:00Z' }, 'mag': { '0': '10.8' }, 'stn': { '0': 'I41' }, 'remarks': { '0': 'Kometa Lemmon, jasná' } } }
+]
+
+BODY = json.dumps(ENTRIES, ensure_ascii=False, indent=1).encode('utf-8')
+
+
+def chunked(body: bytes, size: int):
+    return [body[start:start + size] for start in range(0, len(body), size)]
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 64, len(BODY)])
+def test_rows_are_the_same_however_the_body_is_split(size):
+    frames = parseAdesStream(chunked(BODY, size), DESIGNATIONS)
+
+    assert list(frames) == DESIGNATIONS
+
+    lemmon = frames['C/2025 A6']
+    assert list(lemmon['obstime']) == [pd.Timestamp('2025-10-01T01:00:00.120Z'), pd.Timestamp('2025-10-02T01:00:00Z')]
+    assert lemmon['mag'][0] == pytest.approx(11.2)
+    assert math.isnan(lemmon['mag'][1])
+    assert list(lemmon['stn']) == ['T05', 'T08']
+
+    assert frames['C/2025 K1'].empty
+
+    r2 = frames['C/2025 R2']
+    assert list(r2['stn']) == ['I41']
+    assert r2['mag'][0] == pytest.approx(10.8)
+
+
+@pytest.mark.parametrize('size', [1, 5])
+def test_marker_and_multibyte_characters_split_across_chunks(size):
+    parser = AdesStreamParser()
+    rows = []
+
+    for chunk in chunked(BODY, size):
+        rows.extend(parser.feed(chunk))
+    rows.extend(parser.close())
+
+    assert [entry for entry, _ in rows] == [0, 0, 2]
+    assert rows[-1][1]['remarks'] == 'Kometa Lemmon, jasná'
+    assert parser.entryCount == 3
+
+
+def test_truncated_body_is_an_error():
+    with pytest.raises(ValueError):
+        parseAdesStream(chunked(BODY[:len(BODY) // 3], 16), DESIGNATIONS)
+
+
+@pytest.mark.parametrize('designations', [DESIGNATIONS[:2], DESIGNATIONS + ['C/2025 Z9']])
+def test_entries_not_lining_up_with_the_designations_are_an_error(designations):
+    with pytest.raises(ValueError):
+        parseAdesStream(chunked(BODY, 64), designations)
+
+
+def obs80(date: str, mag: str, stn: str, note: str = 'C') -> str:
+    """An 80-column observation line of C/2025 A6 with the given fields."""
+    line = f"    CK25A060  {note}{date:<17}10 20 30.12 +20 30 40.1          {mag:<5}{'N':<7}{stn}"
+    assert len(line) == 80
+    return line
+
+
+OBS80_LINES = [
+    obs80('2025 10 01.50000', '11.2', 'T05'),
+    obs80('2025 10 02.25', '', 'T08'),
+    # Satellite observation, with its position on a second line
+    obs80('2025 10 02.75000', '10.9', 'C51', note='S'),
+    obs80('2025 10 02.75000', '', 'C51', note='s'),
+    obs80('2025 10 03.00000', '-1.5', 'I41'),
+]
+
+
+def check_obs80_frame(frame: pd.DataFrame):
+    assert list(frame['obstime']) == [pd.Timestamp('2025-10-01T12:00:00Z'), pd.Timestamp('2025-10-02T06:00:00Z'),
+                                      pd.Timestamp('2025-10-02T18:00:00Z'), pd.Timestamp('2025-10-03T00:00:00Z')]
+    assert list(frame['stn']) == ['T05', 'T08', 'C51', 'I41']
+    assert frame['mag'][0] == pytest.approx(11.2)
+    assert math.isnan(frame['mag'][1])
+    assert frame['mag'][2] == pytest.approx(10.9)
+    assert frame['mag'][3] == pytest.approx(-1.5)
+
+
+def test_obs80_fixed_width_lines():
+    check_obs80_frame(parseObs80('\n'.join(OBS80_LINES) + '\n'))
+
+
+@pytest.mark.parametrize('separator', ['\r\n', '\n'])
+def test_obs80_ragged_lines_are_padded(separator):
+    # CRLF endings and a line with its trailing blanks trimmed both take the padded path
+    lines = OBS80_LINES[:1] + [OBS80_LINES[1].rstrip()] + OBS80_LINES[2:] if separator == '\n' else OBS80_LINES
+    text = separator.join(lines).encode('ascii')
+
+    check_obs80_frame(parseObs80(text))
+
+
+def test_obs80_fixed_and_ragged_lines_agree():
+    fixed = obs80Lines(('\n'.join(OBS80_LINES) + '\n').encode('ascii'))
+    ragged = obs80Lines('\r\n'.join(OBS80_LINES).encode('ascii'))
+
+    assert fixed.shape == (len(OBS80_LINES), 80)
+    assert (fixed == ragged).all()
+    assert bytes(fixed[4, 77:80]) == b'I41'
+
+
+def test_obs80_empty_text():
+    assert obs80Lines(b'\r\n').shape == (0, 80)
+    assert parseObs80('').empty
+
+
+def test_field_to_float():
+    fields = np.frombuffer(b' 9.8 ' b'-1.25' b'12   ' b'     ' b' 0.05', dtype=np.uint8).reshape(-1, 5)
+    values = fieldToFloat(fields)
+
+    assert values[:3] == pytest.approx([9.8, -1.25, 12.0])
+    assert math.isnan(values[3])
+    assert values[4] == pytest.approx(0.05)
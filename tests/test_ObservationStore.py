@@ -0,0 +1,54 @@
+import pandas as pd
+import pytest
+
+from Comet import Comet
+from CometRegistry import CometRegistry
+from ObservationStore import ObservationStore
+
+DESIGNATION = 'C/2025 A6'
+
+
+def observations(rows):
+    return pd.DataFrame(rows, columns=['obstime', 'mag', 'stn'])
+
+
+def registry():
+    registry = CometRegistry()
+    registry.add(Comet({ 'designation': DESIGNATION }))
+    return registry
+
+
+def test_append_stores_only_new_observations():
+    store = ObservationStore(registry())
+    rows = [('2025-10-01T00:00:00Z', '11.2', 'T05'),
+            ('2025-10-02T00:00:00Z', '10.8', 'T05')]
+
+    assert store.append(DESIGNATION, observations(rows)) == 2
+    assert store.append(DESIGNATION, observations(rows)) == 0
+    assert store.append(DESIGNATION, observations(rows + [('2025-10-02T06:00:00Z', '10.6', 'I41')])) == 1
+    assert store.latestObsTime(DESIGNATION) == pd.Timestamp('2025-10-02T06:00:00Z').to_pydatetime()
+
+
+def test_observations_persist_with_the_comet():
+    comets = registry()
+    ObservationStore(comets).append(DESIGNATION, observations([('2025-10-01T00:00:00Z', '11.2', 'T05'),
+                                                               ('2025-10-02T00:00:00Z', '10.8', 'T05')]))
+
+    # A later run reads the stored window back from the comet's lightcurve
+    store = ObservationStore(comets)
+    window = store.window(DESIGNATION, 1)
+
+    # Magnitudes are stored as float32
+    assert list(window['mag']) == pytest.approx([11.2, 10.8])
+    assert list(window['stn']) == ['T05', 'T05']
+    assert store.append(DESIGNATION, observations([('2025-10-01T00:00:00Z', '11.2', 'T05')])) == 0
+
+
+def test_window_is_measured_from_the_latest_observation():
+    store = ObservationStore(registry())
+    store.append(DESIGNATION, observations([('2025-10-01T00:00:00Z', '11.2', 'T05'),
+                                            ('2025-10-02T12:00:00Z', '10.8', 'T05'),
+                                            ('2025-10-03T00:00:00Z', '10.4', 'I41')]))
+
+    assert list(store.window(DESIGNATION, 1)['mag']) == [10.8, 10.4]
+    assert list(store.window(DESIGNATION, 2)['mag']) == [11.2, 10.8, 10.4]
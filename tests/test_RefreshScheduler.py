@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from Comet import Comet
+from LightCurve import LightCurve
+from RefreshScheduler import MAGNITUDE_INTERVALS, RefreshScheduler
+
+NOW = datetime(2025, 10, 8, tzinfo=timezone.utc)
+
+
+def comet(magnitude: float, observationsPerDay: float = None) -> Comet:
+    lastobs = NOW - timedelta(hours=1)
+    comet = Comet({ 'designation': 'C/2025 A6', 'mag1davg': str(magnitude), 'mag2davg': str(magnitude),
+                    'lastobs': lastobs.strftime('%Y-%m-%d %H:%M:%S') })
+
+    if observationsPerDay is not None:
+        # A week of observations at the given rate, ending at lastobs
+        count = int(observationsPerDay * 7)
+        obstimes = [lastobs.timestamp() - index * 7 * 86400 / max(count, 1) for index in range(count)]
+        curve = LightCurve()
+        curve.update(obstimes or [lastobs.timestamp()], [magnitude] * count or [float('nan')])
+        comet.lightcurve = curve.encode()
+
+    return comet
+
+
+def test_sample_count_without_decoding():
+    curve = LightCurve()
+    curve.update([0.0, 3600.0, 7200.0], [11.0, 10.9, float('nan')], ['T05', 'T05', 'I41'])
+
+    assert LightCurve.sampleCount(curve.encode()) == 2
+    assert LightCurve.sampleCount('') is None
+    assert LightCurve.sampleCount('not a light curve') is None
+
+
+@pytest.mark.parametrize('observationsPerDay, interval', [
+    # No light curve yet, the brightness alone decides
+    (None, timedelta(hours=2)),
+    (0, timedelta(hours=4)),
+    (0.5, timedelta(hours=4)),
+    (4, timedelta(hours=2)),
+    (24, timedelta(hours=1)),
+])
+def test_observation_rate_scales_the_interval(observationsPerDay, interval):
+    assert RefreshScheduler().refreshInterval(comet(10, observationsPerDay), NOW) == interval
+
+
+def test_busy_comets_are_not_refreshed_faster_than_the_fastest_rate():
+    fastest = MAGNITUDE_INTERVALS[0][1]
+
+    assert RefreshScheduler().refreshInterval(comet(6, 48), NOW) == fastest
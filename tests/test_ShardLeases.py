@@ -0,0 +1,76 @@
+import time
+
+import pytest
+
+from ShardLeases import ShardLeases, shardOf
+
+
+@pytest.fixture
+def leases(tmp_path):
+    leases = ShardLeases(str(tmp_path / 'leases.db'), 3)
+    yield leases
+    leases.close()
+
+
+def test_workers_claim_different_shards(leases):
+    cycle = leases.currentCycle()
+
+    assert cycle == 1
+    assert [leases.claim(f"worker-{i}", cycle, ttl=60) for i in range(4)] == [0, 1, 2, None]
+
+
+def test_completing_every_shard_starts_the_next_cycle(leases):
+    written = []
+
+    for shard in range(3):
+        assert leases.claim('worker-a', 1, ttl=60) == shard
+        assert leases.complete(shard, 'worker-a', 1, lambda connection, shard=shard: written.append(shard))
+
+    assert written == [0, 1, 2]
+    assert leases.claim('worker-a', 1, ttl=60) is None
+    assert leases.currentCycle() == 2
+    assert all(owner == '' and completed == 1 for _, owner, _, completed, _ in leases.status())
+
+
+def test_released_shard_can_be_claimed_again(leases):
+    shard = leases.claim('worker-a', 1, ttl=60)
+    leases.release(shard, 'worker-a')
+
+    assert leases.claim('worker-b', 1, ttl=60) == shard
+
+
+def test_lost_lease_cannot_complete(leases):
+    # worker-a's lease ran out while it was still working
+    shard = leases.claim('worker-a', 1, ttl=1, now=time.time() - 10)
+    assert leases.claim('worker-b', 1, ttl=60) == shard
+
+    written = []
+    assert not leases.renew(shard, 'worker-a', ttl=60)
+    assert not leases.complete(shard, 'worker-a', 1, lambda connection: written.append('worker-a'))
+    assert written == []
+
+    assert leases.complete(shard, 'worker-b', 1, lambda connection: written.append('worker-b'))
+    assert written == ['worker-b']
+
+
+def test_failed_write_leaves_the_shard_incomplete(leases):
+    shard = leases.claim('worker-a', 1, ttl=60)
+
+    def write(connection):
+        connection.execute("UPDATE shard_leases SET finished = 1 WHERE shard = ?", (shard,))
+        raise RuntimeError('merge failed')
+
+    with pytest.raises(RuntimeError):
+        leases.complete(shard, 'worker-a', 1, write)
+
+    assert leases.status()[shard][3:] == (0, None)
+
+
+def test_shard_count_cannot_change(leases):
+    with pytest.raises(ValueError):
+        ShardLeases(leases.filePath, 4)
+
+
+def test_shards_are_stable():
+    assert shardOf('C/2025 A6', 8) == shardOf('C/2025 A6', 8)
+    assert {shardOf(f"C/2025 A{index}", 4) for index in range(1, 50)} == {0, 1, 2, 3}
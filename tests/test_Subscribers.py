@@ -0,0 +1,85 @@
+import pytest
+
+from Comet import Comet
+from CometList import BINOC_MAGNITUDE, NAKED_EYE_MAGNITUDE, SUDDEN_INCREASE_MAGNITUDE, MagnitudeChange
+from Subscribers import Subscriber, SubscriberRegistry
+
+LEMMON = Comet({ 'designation': 'C/2025 A6', 'name': 'Lemmon' })
+ATLAS = Comet({ 'designation': 'C/2025 K1', 'name': 'ATLAS' })
+
+
+def subscriber(name: str, **options) -> Subscriber:
+    # Sudden increases are left out unless a test asks for them, so the
+    # threshold tests only see thresholds
+    options.setdefault('suddenIncrease', None)
+    return Subscriber(name, f"https://discord.com/api/webhooks/{name}", **options)
+
+
+@pytest.mark.parametrize('prior, current, crossed', [
+    # Crossed once prior is above the threshold and current at or below it
+    (BINOC_MAGNITUDE + 0.5, BINOC_MAGNITUDE, True),
+    (BINOC_MAGNITUDE + 0.5, BINOC_MAGNITUDE - 0.5, True),
+    (BINOC_MAGNITUDE + 0.5, BINOC_MAGNITUDE + 0.25, False),
+    # Already at the threshold, so it was crossed before
+    (BINOC_MAGNITUDE, BINOC_MAGNITUDE - 0.5, False),
+    # Fading back past it is not a crossing
+    (BINOC_MAGNITUDE - 0.5, BINOC_MAGNITUDE + 0.5, False),
+])
+def test_threshold_boundaries(prior, current, crossed):
+    registry = SubscriberRegistry([subscriber('club')])
+
+    matches = registry.matchChange(MagnitudeChange(LEMMON, prior, current))
+
+    assert matches.get('binoc') == (['club'] if crossed else None)
+
+
+def test_each_subscriber_has_its_own_thresholds():
+    registry = SubscriberRegistry([subscriber('club'), subscriber('observatory', thresholds={ 'binoc': 11 })])
+
+    assert registry.matchChange(MagnitudeChange(LEMMON, 11.5, 10.5)) == { 'binoc': ['observatory'] }
+    assert registry.matchChange(MagnitudeChange(LEMMON, 9.0, 8.0)) == { 'binoc': ['club'] }
+    assert registry.matchChange(MagnitudeChange(LEMMON, 12.0, 8.0)) == { 'binoc': ['club', 'observatory'] }
+
+
+def test_only_the_brightest_threshold_crossed_is_reported():
+    registry = SubscriberRegistry([
+        subscriber('club'),
+        subscriber('binoculars', thresholds={ 'nakedeye': None }),
+        subscriber('no-nakedeye-events', events=['binoc'])
+    ])
+
+    matches = registry.matchChange(MagnitudeChange(LEMMON, BINOC_MAGNITUDE + 0.5, NAKED_EYE_MAGNITUDE - 0.5))
+
+    assert matches == { 'nakedeye': ['club'], 'binoc': ['binoculars', 'no-nakedeye-events'] }
+
+
+def test_sudden_increase_cut():
+    registry = SubscriberRegistry([
+        subscriber('sensitive', suddenIncrease=0.5),
+        subscriber('club', suddenIncrease=SUDDEN_INCREASE_MAGNITUDE),
+        subscriber('strict', suddenIncrease=2.0),
+        subscriber('quiet', suddenIncrease=0.5, events=['binoc'])
+    ])
+
+    # The default cut of 1.5 magnitudes is met exactly, well short of any threshold
+    assert registry.matchChange(MagnitudeChange(LEMMON, 12.0, 10.5)) == { 'suddenincrease': ['sensitive', 'club'] }
+    assert registry.matchChange(MagnitudeChange(LEMMON, 12.0, 11.5)) == { 'suddenincrease': ['sensitive'] }
+    assert registry.matchChange(MagnitudeChange(LEMMON, 12.0, 12.5)) == {}
+
+
+def test_watchlists_only_limit_their_own_subscribers():
+    registry = SubscriberRegistry([
+        subscriber('club'),
+        subscriber('lemmon-fans', watchlist=['lemmon']),
+        subscriber('atlas-fans', watchlist=['C/2025 K1'])
+    ])
+
+    assert registry.matchChange(MagnitudeChange(LEMMON, 8.5, 7.5)) == { 'binoc': ['club', 'lemmon-fans'] }
+    assert registry.matchChange(MagnitudeChange(ATLAS, 8.5, 7.5)) == { 'binoc': ['atlas-fans', 'club'] }
+    assert registry.matchChange(MagnitudeChange(Comet({ 'designation': 'C/2025 R2' }), 8.5, 7.5)) == { 'binoc': ['club'] }
+
+
+def test_no_prior_average_matches_nothing():
+    registry = SubscriberRegistry([subscriber('club')])
+
+    assert registry.matchChange(MagnitudeChange(LEMMON, None, 5.0)) == {}